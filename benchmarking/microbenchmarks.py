@@ -0,0 +1,384 @@
+"""
+Microbenchmarks of the hot paths of the simulation engine.
+
+Each benchmark times one operation for a number of sources (Nsrcs), without running
+a full simulation. Results are appended to a history file (one json object per line),
+along with the git commit, so that runs on different commits can be compared.
+"""
+
+import datetime
+import json
+import os
+import socket
+import subprocess
+import time
+from statistics import median
+
+import numpy as np
+from astropy import units
+from astropy.coordinates import EarthLocation
+from astropy.time import Time
+from pyuvdata import UVBeam
+from pyuvdata.data import DATA_PATH
+
+import pyuvsim
+from pyuvsim import mpi, simsetup
+
+default_Nsrcs = [10, 100, 1000, 10000]
+
+
+def _make_sky(Nsrcs, time):
+    sky, _ = pyuvsim.create_mock_catalog(time, arrangement='random', Nsrcs=Nsrcs, rseed=2458098)
+    return sky
+
+
+def _cst_beam():
+    beam = UVBeam()
+    beam.freq_interp_kind = 'linear'
+    cst_files = ['HERA_NicCST_150MHz.txt', 'HERA_NicCST_123MHz.txt']
+    beam_files = [os.path.join(DATA_PATH, 'NicCSTbeams', f) for f in cst_files]
+    beam.read_cst_beam(
+        beam_files, beam_type='efield', frequency=[150e6, 123e6],
+        telescope_name='HERA', feed_name='PAPER', feed_version='0.1', feed_pol=['x'],
+        model_name='E-field pattern - Rigging height 4.9m', model_version='1.0'
+    )
+    beam.peak_normalize()
+    return beam
+
+
+def _make_engine(Nsrcs, beam, power_beam=False):
+    location = EarthLocation(lat='-30d43m17.5s', lon='21d25m41.9s', height=1073.)
+    time = Time(2458098.27471265, format='jd', location=location)
+    sky = _make_sky(Nsrcs, time)
+    antenna1 = pyuvsim.Antenna('ant1', 1, np.array([0, 0, 0]), 0)
+    antenna2 = pyuvsim.Antenna('ant2', 2, np.array([107, 0, 0]), 0)
+    baseline = pyuvsim.Baseline(antenna1, antenna2)
+    beam_list = pyuvsim.BeamList([beam])
+    if power_beam:
+        beam_list.beam_type = 'power'
+        beam_list.set_obj_mode()
+    telescope = pyuvsim.Telescope('telescope_name', location, beam_list)
+    task = pyuvsim.UVTask(sky, time, 123e6 * units.Hz, baseline, telescope)
+    return pyuvsim.UVEngine(task, power_beam=power_beam)
+
+
+def setup_make_visibility(Nsrcs):
+    engine = _make_engine(Nsrcs, pyuvsim.AnalyticBeam('airy', diameter=14.0))
+
+    def run():
+        # Force a full calculation each time.
+        engine.task.sources.time = None
+        engine.update_positions = True
+        engine.update_beams = True
+        engine.update_local_coherency = True
+        engine.make_visibility()
+
+    return run
+
+
+def setup_apply_beam(Nsrcs, power_beam=False):
+    engine = _make_engine(Nsrcs, pyuvsim.AnalyticBeam('airy', diameter=14.0),
+                          power_beam=power_beam)
+    engine.task.sources.update_positions(engine.task.time, engine.task.telescope.location)
+
+    def run():
+        engine.update_local_coherency = True
+        engine.apply_beam()
+
+    return run
+
+
+def setup_apply_beam_power(Nsrcs):
+    return setup_apply_beam(Nsrcs, power_beam=True)
+
+
+def _setup_get_beam_jones(Nsrcs, beam, lookup=False):
+    engine = _make_engine(Nsrcs, beam)
+    task = engine.task
+    if lookup:
+        task.telescope.beam_list.compile_lookup_tables([task.freq.to('Hz').value])
+    sky = task.sources
+    sky.update_positions(task.time, task.telescope.location)
+    alt_az = sky.alt_az[..., sky.above_horizon]
+    antenna = task.baseline.antenna1
+
+    def run():
+        antenna.get_beam_jones(task.telescope, alt_az, task.freq, reuse_spline=True)
+
+    return run
+
+
+def setup_get_beam_jones_analytic(Nsrcs):
+    return _setup_get_beam_jones(Nsrcs, pyuvsim.AnalyticBeam('airy', diameter=14.0))
+
+
+def setup_get_beam_jones_uvbeam(Nsrcs):
+    return _setup_get_beam_jones(Nsrcs, _cst_beam())
+
+
+def setup_get_beam_jones_uvbeam_lookup(Nsrcs):
+    return _setup_get_beam_jones(Nsrcs, _cst_beam(), lookup=True)
+
+
+def setup_update_positions(Nsrcs):
+    engine = _make_engine(Nsrcs, pyuvsim.AnalyticBeam('uniform'))
+    task = engine.task
+
+    def run():
+        # SkyModel skips the calculation if the time has not changed.
+        task.sources.time = None
+        task.sources.update_positions(task.time, task.telescope.location)
+
+    return run
+
+
+def setup_coherency_calc(Nsrcs):
+    engine = _make_engine(Nsrcs, pyuvsim.AnalyticBeam('uniform'))
+    task = engine.task
+    task.sources.update_positions(task.time, task.telescope.location)
+
+    def run():
+        task.sources.coherency_calc()
+
+    return run
+
+
+def setup_skymodeldata_subselect(Nsrcs):
+    time = Time(2458098.27471265, format='jd')
+    skydata = simsetup.SkyModelData(_make_sky(Nsrcs, time))
+    inds = range(Nsrcs // 4, Nsrcs // 2 + 1)
+
+    def run():
+        skydata.subselect(inds)
+
+    return run
+
+
+def setup_skymodeldata_get_skymodel(Nsrcs):
+    time = Time(2458098.27471265, format='jd')
+    skydata = simsetup.SkyModelData(_make_sky(Nsrcs, time))
+
+    def run():
+        skydata.get_skymodel()
+
+    return run
+
+
+def setup_big_gather(Nsrcs):
+    # Gather one visibility per source, standing in for the finished tasks.
+    mpi.start_mpi()
+    objs = [(ii, np.ones(4, dtype=complex)) for ii in range(Nsrcs)]
+
+    def run():
+        mpi.big_gather(mpi.world_comm, objs, root=0)
+
+    return run
+
+
+benchmarks = {
+    'make_visibility': setup_make_visibility,
+    'apply_beam': setup_apply_beam,
+    'apply_beam_power': setup_apply_beam_power,
+    'get_beam_jones_analytic': setup_get_beam_jones_analytic,
+    'get_beam_jones_uvbeam': setup_get_beam_jones_uvbeam,
+    'get_beam_jones_uvbeam_lookup': setup_get_beam_jones_uvbeam_lookup,
+    'update_positions': setup_update_positions,
+    'coherency_calc': setup_coherency_calc,
+    'skymodeldata_subselect': setup_skymodeldata_subselect,
+    'skymodeldata_get_skymodel': setup_skymodeldata_get_skymodel,
+    'big_gather': setup_big_gather,
+}
+
+
+def time_function(func, Nrepeat=5, min_time=0.2):
+    """
+    Time a function.
+
+    The function is run once to warm up. It is then run in batches of enough calls to
+    take at least `min_time` seconds, and the time per call is recorded for each batch.
+
+    Parameters
+    ----------
+    func: callable
+        Function to time, with no arguments.
+    Nrepeat: int
+        Number of batches.
+    min_time: float
+        Minimum time per batch in seconds.
+
+    Returns
+    -------
+    dict
+        Time per call in seconds ("min", "median", "max") and the number of calls per
+        batch ("Ncalls").
+    """
+    t0 = time.perf_counter()
+    func()
+    dt = time.perf_counter() - t0
+    Ncalls = max(int(np.ceil(min_time / max(dt, 1e-9))), 1)
+
+    per_call = []
+    for _ in range(Nrepeat):
+        t0 = time.perf_counter()
+        for _ in range(Ncalls):
+            func()
+        per_call.append((time.perf_counter() - t0) / Ncalls)
+
+    return {'min': min(per_call), 'median': median(per_call), 'max': max(per_call),
+            'Ncalls': Ncalls}
+
+
+def run_suite(names=None, Nsrcs_list=default_Nsrcs, Nrepeat=5, min_time=0.2, verbose=True):
+    """
+    Run a set of microbenchmarks.
+
+    Parameters
+    ----------
+    names: list of str
+        Benchmarks to run (keys of `benchmarks`). Defaults to all of them.
+    Nsrcs_list: list of int
+        Numbers of sources to run each benchmark for.
+    Nrepeat, min_time:
+        Passed to :func:`time_function`.
+    verbose: bool
+        Print results as they come in.
+
+    Returns
+    -------
+    dict
+        Keys are benchmark names, values are dicts with Nsrcs (as strings, for json)
+        as keys and the output of :func:`time_function` as values.
+    """
+    if names is None:
+        names = list(benchmarks.keys())
+    results = {}
+    for name in names:
+        results[name] = {}
+        for Nsrcs in Nsrcs_list:
+            func = benchmarks[name](Nsrcs)
+            res = time_function(func, Nrepeat=Nrepeat, min_time=min_time)
+            results[name][str(Nsrcs)] = res
+            if verbose:
+                print("{:<28} Nsrcs={:<8d} {:12.3e} s".format(name, Nsrcs, res['median']),
+                      flush=True)
+    return results
+
+
+def get_git_info():
+    """Get the current git commit hash and whether the working tree has changes."""
+    repo_dir = os.path.dirname(os.path.abspath(pyuvsim.__file__))
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=repo_dir, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        status = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir,
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None, False
+    return commit, status != ''
+
+
+def record_results(results, history_file):
+    """
+    Append results to the history file, with the commit and machine information.
+
+    Returns
+    -------
+    dict
+        The history entry.
+    """
+    commit, dirty = get_git_info()
+    entry = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'hostname': socket.gethostname(),
+        'pyuvsim_version': pyuvsim.__version__,
+        'numpy_version': np.__version__,
+        'results': results,
+    }
+    with open(history_file, 'a') as hfile:
+        hfile.write(json.dumps(entry) + '\n')
+    return entry
+
+
+def read_history(history_file):
+    """Read all entries in the history file, oldest first."""
+    with open(history_file, 'r') as hfile:
+        return [json.loads(line) for line in hfile if line.strip() != '']
+
+
+def find_entry(history, ref=None, default_index=-1):
+    """
+    Find the latest history entry for a commit.
+
+    Parameters
+    ----------
+    history: list of dict
+        Entries from :func:`read_history`.
+    ref: str
+        A git commit hash (or unique prefix), or anything else git rev-parse understands
+        (e.g., a branch name). If None, use history[default_index].
+    default_index: int
+        Entry to use if `ref` is None.
+    """
+    if ref is None:
+        return history[default_index]
+    try:
+        repo_dir = os.path.dirname(os.path.abspath(pyuvsim.__file__))
+        ref = subprocess.check_output(
+            ['git', 'rev-parse', ref], cwd=repo_dir, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        pass
+    for entry in reversed(history):
+        if entry['commit'] is not None and entry['commit'].startswith(ref):
+            return entry
+    raise ValueError("No benchmark results found for {}".format(ref))
+
+
+def compare_results(base, new, threshold=0.1):
+    """
+    Compare two sets of results.
+
+    Median times are compared for each benchmark and Nsrcs present in both.
+
+    Parameters
+    ----------
+    base, new: dict
+        Results, as returned by :func:`run_suite`.
+    threshold: float
+        Fractional slowdown above which a change is flagged as a regression.
+
+    Returns
+    -------
+    list of tuple
+        (name, Nsrcs, base time, new time, ratio, is_regression) for each comparison.
+    """
+    rows = []
+    for name, per_nsrcs in new.items():
+        if name not in base:
+            continue
+        for Nsrcs, res in per_nsrcs.items():
+            if Nsrcs not in base[name]:
+                continue
+            tbase = base[name][Nsrcs]['median']
+            tnew = res['median']
+            ratio = tnew / tbase
+            rows.append((name, int(Nsrcs), tbase, tnew, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_comparison(rows, base_label='base', new_label='new'):
+    """Format the output of :func:`compare_results` as a table."""
+    header = "{:<28} {:>8} {:>12} {:>12} {:>8}\n".format(
+        "Benchmark", "Nsrcs", base_label[:12], new_label[:12], "Ratio"
+    )
+    lines = [header, '-' * (len(header) - 1) + '\n']
+    for name, Nsrcs, tbase, tnew, ratio, regressed in rows:
+        lines.append("{:<28} {:>8d} {:>12.3e} {:>12.3e} {:>8.2f}{}\n".format(
+            name, Nsrcs, tbase, tnew, ratio, '  REGRESSION' if regressed else ''
+        ))
+    return ''.join(lines)
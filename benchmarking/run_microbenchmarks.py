@@ -0,0 +1,56 @@
+#!/bin/env python
+# Script to run microbenchmarks and compare them across commits.
+
+import argparse
+import sys
+
+import microbenchmarks as mbk
+
+parser = argparse.ArgumentParser(
+    description="Run microbenchmarks of pyuvsim engine functions, or compare recorded runs."
+)
+parser.add_argument('--run', action='store_true',
+                    help='Run the microbenchmarks and append the results to the history file.')
+parser.add_argument('--compare', action='store_true',
+                    help='Compare two runs in the history file. By default, the last two.')
+parser.add_argument('--history', type=str, default='MICROBENCHMARKS.jsonl',
+                    help='History file (json lines). Default: MICROBENCHMARKS.jsonl')
+parser.add_argument('--benchmarks', type=str, nargs='+', default=None,
+                    choices=list(mbk.benchmarks.keys()),
+                    help='Benchmarks to run. Default: all.')
+parser.add_argument('--Nsrcs', type=int, nargs='+', default=mbk.default_Nsrcs,
+                    help='Numbers of sources to run each benchmark with.')
+parser.add_argument('--Nrepeat', type=int, default=5,
+                    help='Number of timing batches per benchmark.')
+parser.add_argument('--base', type=str, default=None,
+                    help='Commit (or branch) to compare against. Default: next-to-last run.')
+parser.add_argument('--new', type=str, default=None,
+                    help='Commit (or branch) to compare. Default: last run.')
+parser.add_argument('--threshold', type=float, default=0.1,
+                    help='Fractional slowdown flagged as a regression. Default: 0.1')
+
+args = parser.parse_args()
+
+if not (args.run or args.compare):
+    parser.error("Specify --run and/or --compare.")
+
+if args.run:
+    results = mbk.run_suite(names=args.benchmarks, Nsrcs_list=args.Nsrcs,
+                            Nrepeat=args.Nrepeat)
+    entry = mbk.record_results(results, args.history)
+    if entry['dirty']:
+        print("Warning: the working tree has uncommitted changes.")
+
+if args.compare:
+    history = mbk.read_history(args.history)
+    if len(history) < 2 and args.base is None:
+        raise ValueError("Need at least two runs in the history file to compare.")
+    base = mbk.find_entry(history, args.base, default_index=-2)
+    new = mbk.find_entry(history, args.new, default_index=-1)
+    rows = mbk.compare_results(base['results'], new['results'], threshold=args.threshold)
+    print(mbk.format_comparison(rows, base_label=str(base['commit'])[:8],
+                                new_label=str(new['commit'])[:8]))
+    Nregressions = sum(row[-1] for row in rows)
+    if Nregressions > 0:
+        print("{:d} regressions beyond {:.0f}%.".format(Nregressions, 100 * args.threshold))
+        sys.exit(1)
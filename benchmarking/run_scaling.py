@@ -0,0 +1,59 @@
+#!/bin/env python
+# Script to run strong/weak scaling measurements and fit a runtime model.
+
+import argparse
+import json
+import os
+
+from pyuvsim.planning import predict_runtime
+
+import scaling
+
+parser = argparse.ArgumentParser(
+    description="Measure strong and weak scaling of pyuvsim, and fit per-axis costs."
+)
+parser.add_argument('yaml_file', type=str, nargs='?', default='scaling_settings.yaml',
+                    help='Settings file. Default: scaling_settings.yaml')
+parser.add_argument('--run', action='store_true', help='Run the measurements.')
+parser.add_argument('--report', action='store_true',
+                    help='Fit the cost model and write the report and plots.')
+parser.add_argument('--predict', type=int, nargs=5, default=None,
+                    metavar=('NBLS', 'NTIMES', 'NFREQS', 'NSRCS', 'NPUS'),
+                    help='Predict the runtime of a simulation from the fitted costs.')
+parser.add_argument('--backend', type=str, default='mpirun', choices=['mpirun', 'serial'],
+                    help='Run with mpirun, or serially (Npus=1 only). Default: mpirun')
+parser.add_argument('--mpirun', type=str, default='mpirun', help='MPI launcher command.')
+parser.add_argument('-o', '--outdir', type=str, default='scaling',
+                    help='Directory for results, report, and plots. Default: scaling')
+
+args = parser.parse_args()
+
+if not (args.run or args.report or args.predict):
+    parser.error("Specify at least one of --run, --report, or --predict.")
+
+if not os.path.exists(args.outdir):
+    os.makedirs(args.outdir)
+results_file = os.path.join(args.outdir, 'scaling_results.jsonl')
+coeffs_file = os.path.join(args.outdir, 'scaling_costs.json')
+
+if args.run:
+    settings = scaling.load_settings(args.yaml_file)
+    scaling.run_sweep(settings, results_file, backend=args.backend, mpirun=args.mpirun)
+
+if args.report:
+    results = scaling.read_results(results_file)
+    coeffs = scaling.fit_costs(results)
+    with open(coeffs_file, 'w') as cfile:
+        json.dump(coeffs, cfile, indent=1)
+    report = scaling.format_report(results, coeffs)
+    with open(os.path.join(args.outdir, 'scaling_report.txt'), 'w') as rfile:
+        rfile.write(report)
+    print(report)
+    for fname in scaling.make_plots(results, args.outdir):
+        print("Wrote", fname)
+
+if args.predict:
+    with open(coeffs_file, 'r') as cfile:
+        coeffs = json.load(cfile)
+    runtime = predict_runtime(coeffs, *args.predict)
+    print("Predicted runtime: {:.1f} s".format(runtime))
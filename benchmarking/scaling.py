@@ -0,0 +1,349 @@
+"""
+Strong and weak scaling measurements, and a per-axis cost model fit to them.
+
+Each measurement runs `run_uvdata_uvsim` on a synthetic problem of a given size (Nbls,
+Ntimes, Nfreqs, Nsrcs) with a given number of MPI processes (Npus), in a separate
+process started with mpirun (or directly, for the serial backend). The wall-clock time
+is recorded along with the per-phase timings.
+
+The runtime is modeled as a sum of terms for the work done per time (source positions),
+per time and frequency (beam evaluation), per task (task overhead), per task and source
+(the visibility calculation), per task on the root process (gathering results), and per
+process (startup and communication), as defined in `pyuvsim.planning.cost_terms`. Terms
+that are split among processes are divided by Npus. The coefficients are fit with
+non-negative least squares, and can be passed to the `--plan` mode of
+run_param_pyuvsim.py.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import yaml
+from scipy.optimize import nnls
+
+import pyuvsim
+from pyuvsim import mpi, simsetup, timing, uvsim
+from pyuvsim.planning import cost_terms, predict_runtime
+
+axes = ['Nbls', 'Ntimes', 'Nfreqs', 'Nsrcs']
+
+
+def make_problem(Nbls, Ntimes, Nfreqs, Nsrcs, beam='gaussian', seed=2458116):
+    """
+    Make the inputs for a synthetic simulation of the given size.
+
+    Antennas are placed at random within 200 m, like the benchmarking simulation.
+
+    Returns
+    -------
+    input_uv : :class:`pyuvdata.UVData`
+    beam_list : :class:`pyuvsim.BeamList`
+    catalog : :class:`pyuvsim.simsetup.SkyModelData`
+    """
+    rng = np.random.RandomState(seed)
+    Nants = int(np.ceil((1 + np.sqrt(1 + 8 * Nbls)) / 2))
+    antpos = rng.uniform(-200, 200, (Nants, 3))
+    antpos[:, 2] = 0.0
+    array_layout = {ii: antpos[ii] for ii in range(Nants)}
+    bls = [(a1, a2) for a1 in range(Nants) for a2 in range(a1 + 1, Nants)][:Nbls]
+
+    start_time = 2458116.24485307
+    input_uv = simsetup.initialize_uvdata_from_keywords(
+        array_layout=array_layout, telescope_location=(-30.72153, 21.42831, 1073.0),
+        telescope_name='test_array', Nfreqs=Nfreqs, start_freq=1e8, channel_width=195312.5,
+        Ntimes=Ntimes, integration_time=11.0, start_time=start_time, bls=bls,
+        polarization_array=['xx', 'yy', 'xy', 'yx'], write_files=False, complete=True
+    )
+
+    if beam == 'gaussian':
+        beam_obj = pyuvsim.AnalyticBeam('gaussian', sigma=0.08449)
+    elif beam == 'airy':
+        beam_obj = pyuvsim.AnalyticBeam('airy', diameter=14.0)
+    else:
+        beam_obj = pyuvsim.AnalyticBeam(beam)
+    beam_list = pyuvsim.BeamList([beam_obj])
+
+    sky, _ = simsetup.create_mock_catalog(
+        start_time, arrangement='random', Nsrcs=Nsrcs, rseed=seed
+    )
+    return input_uv, beam_list, simsetup.SkyModelData(sky)
+
+
+def run_point(spec):
+    """
+    Run one measurement. Must be called on all ranks, from within the MPI job.
+
+    Parameters
+    ----------
+    spec : dict
+        Problem size (Nbls, Ntimes, Nfreqs, Nsrcs), "beam", and optional "sweep" label.
+
+    Returns
+    -------
+    dict or None
+        On the root process, `spec` updated with Npus, the runtime in seconds (max over
+        ranks), and the max time over ranks for each phase. None on other processes.
+    """
+    mpi.start_mpi()
+    comm = mpi.get_comm()
+    rank = mpi.get_rank()
+
+    input_uv = beam_list = None
+    catalog = simsetup.SkyModelData()
+    if rank == 0:
+        input_uv, beam_list, catalog = make_problem(
+            spec['Nbls'], spec['Ntimes'], spec['Nfreqs'], spec['Nsrcs'],
+            beam=spec.get('beam', 'gaussian')
+        )
+    input_uv = comm.bcast(input_uv, root=0)
+    beam_list = comm.bcast(beam_list, root=0)
+    catalog.share(root=0)
+
+    timing.phase_timer.reset()
+    comm.Barrier()
+    t0 = time.perf_counter()
+    uvsim.run_uvdata_uvsim(input_uv, beam_list, catalog=catalog, quiet=True)
+    runtime = comm.reduce(time.perf_counter() - t0, op=mpi.MPI.MAX, root=0)
+    phases = comm.gather(timing.phase_timer.to_dict(), root=0)
+
+    if rank != 0:
+        return None
+
+    result = dict(spec)
+    result['Npus'] = mpi.get_Npus()
+    result['runtime'] = runtime
+    result['phases'] = {}
+    for rank_phases in phases:
+        for name, vals in rank_phases.items():
+            result['phases'][name] = max(result['phases'].get(name, 0.0), vals['total'])
+    return result
+
+
+def sweep_points(settings):
+    """
+    List the measurements described by a settings dictionary.
+
+    Settings keys:
+        - base: dict with the base problem size (Nbls, Ntimes, Nfreqs, Nsrcs).
+        - Npus: list of process counts for strong and weak scaling.
+        - weak_axis: axis to scale with Npus for weak scaling.
+        - axis_sweeps: dict of axis name to list of sizes, each run at the base size
+          for the other axes with `sweep_Npus` processes (default 1).
+        - beam: analytic beam type (default "gaussian").
+
+    Returns
+    -------
+    list of (Npus, spec) tuples
+    """
+    base = {ax: int(settings['base'][ax]) for ax in axes}
+    beam = settings.get('beam', 'gaussian')
+    points = []
+    for Npus in settings.get('Npus', [1]):
+        spec = dict(base, beam=beam, sweep='strong')
+        points.append((int(Npus), spec))
+    weak_axis = settings.get('weak_axis', None)
+    if weak_axis is not None:
+        for Npus in settings.get('Npus', [1]):
+            spec = dict(base, beam=beam, sweep='weak')
+            spec[weak_axis] = base[weak_axis] * int(Npus)
+            points.append((int(Npus), spec))
+    sweep_Npus = int(settings.get('sweep_Npus', 1))
+    for ax, sizes in settings.get('axis_sweeps', {}).items():
+        for size in sizes:
+            spec = dict(base, beam=beam, sweep='axis_' + ax)
+            spec[ax] = int(size)
+            points.append((sweep_Npus, spec))
+    return points
+
+
+def run_sweep(settings, results_file, backend='mpirun', mpirun='mpirun', verbose=True):
+    """
+    Run all measurements in a settings dictionary, appending results to a file.
+
+    Each measurement runs in its own process, with `mpirun -n <Npus>` or, for the
+    "serial" backend, with the Python interpreter directly (only for Npus = 1).
+
+    Parameters
+    ----------
+    settings : dict
+        See :func:`sweep_points`.
+    results_file : str
+        File to append results to (one json object per line).
+    backend : str
+        Either "mpirun" or "serial".
+    mpirun : str
+        MPI launcher command.
+    """
+    if backend not in ['mpirun', 'serial']:
+        raise ValueError("backend must be 'mpirun' or 'serial'.")
+    for Npus, spec in sweep_points(settings):
+        if backend == 'serial':
+            if Npus > 1:
+                if verbose:
+                    print("Skipping Npus={} with the serial backend.".format(Npus))
+                continue
+            cmd = [sys.executable]
+        else:
+            cmd = [mpirun, '-n', str(Npus), sys.executable]
+        cmd += [os.path.abspath(__file__), '--worker', json.dumps(spec),
+                '--results', results_file]
+        if verbose:
+            print(' '.join(cmd[:-3]), json.dumps(spec), flush=True)
+        subprocess.check_call(cmd)
+
+
+def read_results(results_file):
+    """Read all results from a results file."""
+    with open(results_file, 'r') as rfile:
+        return [json.loads(line) for line in rfile if line.strip() != '']
+
+
+def _design_matrix(points):
+    return np.array([[func(*[pt[ax] for ax in axes], pt['Npus'])
+                      for func in cost_terms.values()] for pt in points], dtype=float)
+
+
+def fit_costs(results):
+    """
+    Fit the cost model coefficients to measured runtimes.
+
+    Rows are weighted by the inverse runtime, so that the fit minimizes relative errors.
+
+    Returns
+    -------
+    dict
+        Keys are cost term names, values are coefficients in seconds per unit.
+    """
+    amat = _design_matrix(results)
+    runtimes = np.array([res['runtime'] for res in results])
+    weights = 1.0 / runtimes
+    coeffs, _ = nnls(amat * weights[:, None], runtimes * weights)
+    return {name: float(val) for name, val in zip(cost_terms.keys(), coeffs)}
+
+
+def scaling_table(results, sweep):
+    """
+    Make rows of a strong or weak scaling table.
+
+    Speedup is T(Npus_min) * Npus_min / T(Npus) for strong scaling. Efficiency is
+    speedup / Npus for strong scaling, and T(Npus_min) / T(Npus) for weak scaling.
+
+    Returns
+    -------
+    list of dict
+        With keys Npus, problem size, runtime, speedup, and efficiency.
+    """
+    points = sorted([res for res in results if res.get('sweep') == sweep],
+                    key=lambda res: res['Npus'])
+    if len(points) == 0:
+        return []
+    ref = points[0]
+    rows = []
+    for res in points:
+        row = {ax: res[ax] for ax in axes}
+        row['Npus'] = res['Npus']
+        row['runtime'] = res['runtime']
+        if sweep == 'strong':
+            row['speedup'] = ref['runtime'] * ref['Npus'] / res['runtime']
+            row['efficiency'] = row['speedup'] / res['Npus']
+        else:
+            row['speedup'] = ref['runtime'] / res['runtime'] * res['Npus'] / ref['Npus']
+            row['efficiency'] = ref['runtime'] / res['runtime']
+        rows.append(row)
+    return rows
+
+
+def format_report(results, coeffs):
+    """Format scaling tables, fitted costs, and model residuals as text."""
+    lines = []
+    for sweep in ['strong', 'weak']:
+        rows = scaling_table(results, sweep)
+        if len(rows) == 0:
+            continue
+        lines.append("{} scaling\n".format(sweep.capitalize()))
+        header = "{:>6} {:>8} {:>8} {:>8} {:>8} {:>12} {:>9} {:>10}\n".format(
+            'Npus', *axes, 'Runtime [s]', 'Speedup', 'Efficiency')
+        lines += [header, '-' * (len(header) - 1) + '\n']
+        for row in rows:
+            lines.append("{:>6d} {:>8d} {:>8d} {:>8d} {:>8d} {:>12.3f} {:>9.2f} {:>10.2f}\n".format(
+                row['Npus'], *[row[ax] for ax in axes], row['runtime'], row['speedup'],
+                row['efficiency']))
+        lines.append('\n')
+
+    lines.append("Fitted costs [s per unit]\n")
+    for name, val in coeffs.items():
+        lines.append("  {:<22} {:.4e}\n".format(name, val))
+
+    lines.append("\nMeasured vs. modeled runtimes\n")
+    header = "{:<14} {:>6} {:>8} {:>8} {:>8} {:>8} {:>12} {:>12}\n".format(
+        'Sweep', 'Npus', *axes, 'Measured [s]', 'Model [s]')
+    lines += [header, '-' * (len(header) - 1) + '\n']
+    for res in results:
+        lines.append("{:<14} {:>6d} {:>8d} {:>8d} {:>8d} {:>8d} {:>12.3f} {:>12.3f}\n".format(
+            res.get('sweep', ''), res['Npus'], *[res[ax] for ax in axes], res['runtime'],
+            predict_runtime(coeffs, *[res[ax] for ax in axes], res['Npus'])))
+    return ''.join(lines)
+
+
+def make_plots(results, outdir):
+    """
+    Plot strong and weak scaling efficiency against Npus.
+
+    Returns
+    -------
+    list of str
+        Paths of the plots written, or an empty list if matplotlib is not installed.
+    """
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return []
+
+    written = []
+    for sweep in ['strong', 'weak']:
+        rows = scaling_table(results, sweep)
+        if len(rows) == 0:
+            continue
+        fig, ax = plt.subplots()
+        Npus = [row['Npus'] for row in rows]
+        ax.plot(Npus, [row['efficiency'] for row in rows], 'o-')
+        ax.axhline(1.0, color='k', ls=':')
+        ax.set_xscale('log', base=2)
+        ax.set_xlabel('Npus')
+        ax.set_ylabel('Parallel efficiency')
+        ax.set_ylim(0, 1.1 * max(1.0, max(row['efficiency'] for row in rows)))
+        ax.set_title('{} scaling'.format(sweep.capitalize()))
+        fname = os.path.join(outdir, '{}_scaling_efficiency.png'.format(sweep))
+        fig.savefig(fname)
+        plt.close(fig)
+        written.append(fname)
+    return written
+
+
+def load_settings(settings_file):
+    """Read a scaling settings yaml file."""
+    with open(settings_file, 'r') as yfile:
+        return yaml.safe_load(yfile)
+
+
+if __name__ == '__main__':
+    # Worker mode, run within each MPI job started by run_sweep.
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run one scaling measurement.")
+    parser.add_argument('--worker', type=str, required=True,
+                        help='json dictionary with the problem size.')
+    parser.add_argument('--results', type=str, required=True,
+                        help='File to append the result to.')
+    args = parser.parse_args()
+
+    result = run_point(json.loads(args.worker))
+    if result is not None:
+        with open(args.results, 'a') as rfile:
+            rfile.write(json.dumps(result) + '\n')
@@ -25,7 +25,13 @@ except (LookupError, ImportError):
 from .profiling import *  # noqa
 from .uvsim import *  # noqa
 from .simsetup import *  # noqa
+from .planning import *  # noqa
+from .task_order import *  # noqa
+from .decomposition import *  # noqa
 from .analyticbeam import *  # noqa
+from .beam_lookup import *  # noqa
+from .spline_cache import *  # noqa
+from .beam_cache import *  # noqa
 from .antenna import *  # noqa
 from .baseline import *  # noqa
 from .telescope import *  # noqa
@@ -69,6 +69,10 @@ class AnalyticBeam(object):
 
     supported_types = ['uniform', 'gaussian', 'airy']
 
+    # Spacing of the Airy pattern table in its argument, x = pi * diameter * sin(za) * f / c.
+    # Linear interpolation between table points is accurate to ~3e-8 (relative to the peak).
+    airy_table_step = 1e-3
+
     def __init__(self, type, sigma=None, diameter=None, spectral_index=0.0, ref_freq=None):
         if type in self.supported_types:
             self.type = type
@@ -91,6 +95,7 @@ class AnalyticBeam(object):
         self.data_normalization = 'peak'
         self.freq_interp_kind = 'linear'
         self.beam_type = 'efield'
+        self._airy_table = None
 
     def peak_normalize(self):
         pass
@@ -104,71 +109,116 @@ class AnalyticBeam(object):
         pol_strings = ['XX', 'XY', 'YX', 'YY']
         self.polarization_array = np.array([uvutils.polstr2num(ps.upper()) for ps in pol_strings])
 
-    def interp(self, az_array, za_array, freq_array, reuse_spline=None, spline_opts=None):
+    def _airy_values(self, xvals):
+        # Evaluate 2 J1(x) / x from a table over x >= 0, extended as needed.
+        xvals = np.abs(xvals)
+        xmax = np.max(xvals) if xvals.size > 0 else 0.
+        step = self.airy_table_step
+        table = getattr(self, '_airy_table', None)
+        if table is None or xmax >= (table.size - 2) * step:
+            # Round up, with some room for nearby frequencies.
+            Npoints = int(np.ceil(1.1 * xmax / step)) + 3
+            xgrid = np.arange(Npoints) * step
+            table = np.ones(Npoints)
+            table[1:] = 2. * j1(xgrid[1:]) / xgrid[1:]
+            self._airy_table = table
+        pos = xvals / step
+        inds = pos.astype(int)
+        frac = pos - inds
+        return table[inds] * (1 - frac) + table[inds + 1] * frac
+
+    def _radial_values(self, za_array, freq_array, tabulate=False):
         """
-        Evaluate the primary beam at given az, za locations (in radians).
+        Evaluate the E-field response of each feed along its own axis.
 
-        (similar to UVBeam.interp)
+        All of the analytic beams are azimuthally symmetric, with the X feed responding
+        only to the azimuthal component and the Y feed only to the zenith angle component,
+        each by the same amount.
 
         Args:
-            az_array: az values to evaluate at in radians (same length as za_array)
-                The azimuth here has the UVBeam convention: North of East(East=0, North=pi/2)
-            za_array: za values to evaluate at in radians (same length as az_array)
-            freq_array: frequency values to evaluate at
-            reuse_spline: Does nothing for analytic beams. Here for compatibility with UVBeam.
+            za_array: za values to evaluate at in radians
+            freq_array: frequency values to evaluate at, in Hz
+            tabulate: Evaluate Airy beams from a table of the Airy pattern, which is
+                much faster than evaluating the Bessel function.
 
         Returns:
-            an array of beam values, shape (Naxes_vec, Nspws, Nfeeds or Npols,
-                Nfreqs or freq_array.size if freq_array is passed,
-                Npixels/(Naxis1, Naxis2) or az_array.size if az/za_arrays are passed)
-            an array of interpolated basis vectors (or self.basis_vector_array
-                if az/za_arrays are not passed), shape: (Naxes_vec, Ncomponents_vec,
-                Npixels/(Naxis1, Naxis2) or az_array.size if az/za_arrays are passed)
+            an array of beam values, shape (freq_array.size, za_array.size)
         """
-
+        za_array = np.asarray(za_array).ravel()
         if self.type == 'uniform':
-            interp_data = np.zeros((2, 1, 2, freq_array.size, az_array.size), dtype=np.float)
-            interp_data[1, 0, 0, :, :] = 1
-            interp_data[0, 0, 1, :, :] = 1
-            interp_data[1, 0, 1, :, :] = 0
-            interp_data[0, 0, 0, :, :] = 0
-
-            # If beam_type == "power", we need to know the shape of "values"
-            values = interp_data[0, 0, 0]
-
-            interp_basis_vector = None
+            return np.ones((freq_array.size, za_array.size))
         elif self.type == 'gaussian':
             if (self.diameter is None) and (self.sigma is None):
                 raise ValueError("Dish diameter needed for gaussian beam -- units: meters")
-            interp_data = np.zeros((2, 1, 2, freq_array.size, az_array.size), dtype=np.float)
             # gaussian beam only depends on Zenith Angle (symmetric is azimuth)
             # standard deviation of sigma is referring to the standard deviation of e-field beam!
-            # copy along freq. axis
             if self.diameter is not None:
                 sigmas = diameter_to_sigma(self.diameter, freq_array)
             elif self.sigma is not None:
                 sigmas = self.sigma * (freq_array / self.ref_freq) ** self.spectral_index
-            values = np.exp(-(za_array[np.newaxis, ...] ** 2) / (2 * sigmas[:, np.newaxis] ** 2))
-            interp_data[1, 0, 0, :, :] = values
-            interp_data[0, 0, 1, :, :] = values
-            interp_basis_vector = None
+            return np.exp(-(za_array[np.newaxis, ...] ** 2) / (2 * sigmas[:, np.newaxis] ** 2))
         elif self.type == 'airy':
             if self.diameter is None:
                 raise ValueError("Dish diameter needed for airy beam -- units: meters")
-            interp_data = np.zeros((2, 1, 2, freq_array.size, az_array.size), dtype=np.float)
-            za_grid, f_grid = np.meshgrid(za_array, freq_array)
-            xvals = self.diameter / 2. * np.sin(za_grid) * 2. * np.pi * f_grid / c_ms
+            xvals = (self.diameter / 2. * 2. * np.pi / c_ms * freq_array[:, np.newaxis]
+                     * np.sin(za_array)[np.newaxis, :])
+            if tabulate:
+                return self._airy_values(xvals)
             values = np.zeros_like(xvals)
             nz = xvals != 0.
             ze = xvals == 0.
             values[nz] = 2. * j1(xvals[nz]) / xvals[nz]
             values[ze] = 1.
-            interp_data[1, 0, 0, :, :] = values
-            interp_data[0, 0, 1, :, :] = values
-            interp_basis_vector = None
+            return values
         else:
             raise ValueError('no interp for this type: {}'.format(self.type))
 
+    def radial_response(self, za_array, freq):
+        """
+        Evaluate the E-field response of each feed at one frequency, in a compact form.
+
+        The E-field Jones matrix of these beams is diagonal, with both entries equal
+        to the values returned here. Airy beams are evaluated from a table of the
+        Airy pattern (see `airy_table_step`), which is accurate to ~3e-8 relative to
+        the peak.
+
+        Args:
+            za_array: za values to evaluate at in radians
+            freq: frequency in Hz
+
+        Returns:
+            an array of beam values, shape (za_array.size,)
+        """
+        return self._radial_values(za_array, np.array([freq]), tabulate=True)[0]
+
+    def interp(self, az_array, za_array, freq_array, reuse_spline=None, spline_opts=None):
+        """
+        Evaluate the primary beam at given az, za locations (in radians).
+
+        (similar to UVBeam.interp)
+
+        Args:
+            az_array: az values to evaluate at in radians (same length as za_array)
+                The azimuth here has the UVBeam convention: North of East(East=0, North=pi/2)
+            za_array: za values to evaluate at in radians (same length as az_array)
+            freq_array: frequency values to evaluate at
+            reuse_spline: Does nothing for analytic beams. Here for compatibility with UVBeam.
+
+        Returns:
+            an array of beam values, shape (Naxes_vec, Nspws, Nfeeds or Npols,
+                Nfreqs or freq_array.size if freq_array is passed,
+                Npixels/(Naxis1, Naxis2) or az_array.size if az/za_arrays are passed)
+            an array of interpolated basis vectors (or self.basis_vector_array
+                if az/za_arrays are not passed), shape: (Naxes_vec, Ncomponents_vec,
+                Npixels/(Naxis1, Naxis2) or az_array.size if az/za_arrays are passed)
+        """
+
+        values = self._radial_values(za_array, freq_array)
+        interp_data = np.zeros((2, 1, 2, freq_array.size, az_array.size), dtype=np.float)
+        interp_data[1, 0, 0, :, :] = values
+        interp_data[0, 0, 1, :, :] = values
+        interp_basis_vector = None
+
         if self.beam_type == 'power':
             # Cross-multiplying feeds, adding vector components
             pairs = [(i, j) for i in range(2) for j in range(2)]
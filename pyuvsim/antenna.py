@@ -6,7 +6,16 @@ import astropy.units as units
 import numpy as np
 
 from . import utils as simutils
+from . import timing
 from .telescope import BeamList
+from .analyticbeam import AnalyticBeam
+
+
+def _freq_hz(frequency):
+    # Get a frequency in Hz from a Quantity or a float (assumed to be in Hz).
+    if isinstance(frequency, units.Quantity):
+        return frequency.to('Hz').value
+    return frequency
 
 
 class Antenna(object):
@@ -25,11 +34,115 @@ class Antenna(object):
         # index of beam for this antenna from array.beam_list
         self.beam_id = beam_id
 
+    def _interp_beam(self, array, source_alt_az, frequency, reuse_spline=True,
+                     interpolation_function='az_za_simple', freq_interp_kind=None):
+        """
+        Evaluate this antenna's beam at a set of positions and one frequency.
+
+        The beam is evaluated from a lookup table if the beam list has one for this beam
+        at this frequency (see :meth:`pyuvsim.BeamList.compile_lookup_tables`), and with
+        its own interpolation otherwise. If the beam list has a response cache (see
+        :meth:`pyuvsim.BeamList.set_response_cache`), responses are loaded from and saved
+        to it. Parameters are as for :meth:`get_beam_jones`.
+
+        Returns
+        -------
+        interp_data : ndarray
+            Beam values, with shape (Naxes_vec, Nfeeds or Npols, Ncomponents).
+        """
+        # convert to UVBeam az/za convention
+        source_za, source_az = simutils.altaz_to_zenithangle_azimuth(
+            source_alt_az[0], source_alt_az[1]
+        )
+
+        freq = np.array([_freq_hz(frequency)])
+
+        beam = array.beam_list[self.beam_id]
+        Ncomponents = source_za.shape[-1]
+
+        # Use the lookup table for this beam if there is one covering these positions.
+        table = None
+        response_cache = None
+        if isinstance(array.beam_list, BeamList):
+            table = array.beam_list.lookup_tables.get(self.beam_id, None)
+            response_cache = array.beam_list.response_cache
+        if table is not None:
+            freq_ind = table.freq_index(freq[0])
+            if freq_ind is None or (Ncomponents > 0 and np.max(source_za) > table.za_max):
+                table = None
+
+        cache_key = None
+        if response_cache is not None:
+            cache_key = response_cache.get_key(
+                self.beam_id, freq[0], source_alt_az, use_table=table is not None,
+                interp_settings=(reuse_spline, interpolation_function, freq_interp_kind)
+            )
+        if cache_key is not None:
+            with timing.trace('beam_cache_load', cat='io', beam_id=int(self.beam_id)):
+                interp_data = response_cache.load(cache_key)
+            if interp_data is not None:
+                return interp_data
+
+        interp_data = self._evaluate_beam(
+            beam, table, source_az, source_za, freq, array.beam_list, reuse_spline,
+            interpolation_function, freq_interp_kind
+        )
+        if cache_key is not None:
+            with timing.trace('beam_cache_save', cat='io', beam_id=int(self.beam_id)):
+                response_cache.save(cache_key, interp_data)
+        return interp_data
+
+    def _evaluate_beam(self, beam, table, source_az, source_za, freq, beam_list,
+                       reuse_spline, interpolation_function, freq_interp_kind):
+        # Evaluate the beam from its lookup table (if not None) or by interpolation.
+        # Returns an array of shape (Naxes_vec, Nfeeds or Npols, Ncomponents).
+        if table is not None:
+            freq_ind = table.freq_index(freq[0])
+            with timing.trace('beam_lookup', cat='compute', beam_id=int(self.beam_id)):
+                return table.interp(source_az, source_za, freq_ind)
+
+        if beam.data_normalization != 'peak':
+            beam.peak_normalize()
+
+        if freq_interp_kind is not None:
+            beam.freq_interp_kind = freq_interp_kind
+
+        if interpolation_function is not None:
+            beam.interpolation_function = interpolation_function
+
+        spline_opts = None
+        if isinstance(beam_list, BeamList):
+            spline_opts = beam_list.spline_interp_opts
+
+        interp_kwargs = {'az_array' : source_az, 'za_array' : source_za,
+                         'freq_array' : freq, 'reuse_spline' : reuse_spline}
+
+        if spline_opts is not None:
+            interp_kwargs['spline_opts'] = spline_opts
+
+        try:
+            with timing.trace('beam_interp', cat='compute', beam_id=int(self.beam_id)):
+                interp_data, interp_basis_vector = beam.interp(**interp_kwargs)
+        except TypeError as err:   # pragma: nocover
+            raise TypeError(
+                "pyuvdata version >=2.0.1 required to use spline_interp_opts"
+            ) from err
+
+        # interp_data has shape:
+        #   (Naxes_vec, Nspws, Nfeeds or Npols, 1 (freq),  Ncomponents (source positions))
+        return interp_data[:, 0, :, 0]
+
     def get_beam_jones(self, array, source_alt_az, frequency, reuse_spline=True,
                        interpolation_function='az_za_simple', freq_interp_kind=None):
         """
         2x2 array of Efield vectors in Az/Alt
 
+        If the beam list has a lookup table for this beam at this frequency (see
+        :meth:`pyuvsim.BeamList.compile_lookup_tables`), the beam is evaluated from the
+        table instead of with spline interpolation. AnalyticBeams are evaluated with
+        :meth:`pyuvsim.AnalyticBeam.radial_response`, since their Jones matrices are
+        diagonal.
+
         Parameters
         ----------
         array : Telescope object
@@ -61,56 +174,81 @@ class Antenna(object):
         # get_direction_jones needs to be defined on UVBeam
         # 2x2 array of Efield vectors in alt/az
 
-        # convert to UVBeam az/za convention
-        source_za, source_az = simutils.altaz_to_zenithangle_azimuth(
-            source_alt_az[0], source_alt_az[1]
-        )
+        beam = array.beam_list[self.beam_id]
+        if isinstance(beam, AnalyticBeam) and beam.beam_type == 'efield':
+            values = beam.radial_response(np.pi / 2 - np.asarray(source_alt_az[0]),
+                                          _freq_hz(frequency))
+            jones_matrix = np.zeros((2, 2, values.size), dtype=np.complex)
+            jones_matrix[0, 0] = values
+            jones_matrix[1, 1] = values
+            return jones_matrix
 
-        if isinstance(frequency, units.Quantity):
-            freq = np.array([frequency.to('Hz').value])
-        else:
-            freq = np.array([frequency])
+        # interp_data has shape: (Naxes_vec, Nfeeds, Ncomponents)
+        interp_data = self._interp_beam(
+            array, source_alt_az, frequency, reuse_spline=reuse_spline,
+            interpolation_function=interpolation_function, freq_interp_kind=freq_interp_kind
+        )
+        Ncomponents = interp_data.shape[-1]
 
-        if array.beam_list[self.beam_id].data_normalization != 'peak':
-            array.beam_list[self.beam_id].peak_normalize()
+        jones_matrix = np.zeros((2, 2, Ncomponents), dtype=np.complex)
 
-        if freq_interp_kind is not None:
-            array.beam_list[self.beam_id].freq_interp_kind = freq_interp_kind
+        # first axis is feed, second axis is theta, phi (opposite order of beam!)
+        jones_matrix[0, 0] = interp_data[1, 0, :]
+        jones_matrix[1, 1] = interp_data[0, 1, :]
+        jones_matrix[0, 1] = interp_data[0, 0, :]
+        jones_matrix[1, 0] = interp_data[1, 1, :]
 
-        if interpolation_function is not None:
-            array.beam_list[self.beam_id].interpolation_function = interpolation_function
+        return jones_matrix
 
-        spline_opts = None
-        if isinstance(array.beam_list, BeamList):
-            spline_opts = array.beam_list.spline_interp_opts
+    def get_beam_power(self, array, source_alt_az, frequency, reuse_spline=True,
+                       interpolation_function='az_za_simple', freq_interp_kind=None):
+        """
+        Power beam values for the instrumental polarizations XX, YY, XY, YX.
 
-        interp_kwargs = {'az_array' : source_az, 'za_array' : source_za,
-                         'freq_array' : freq, 'reuse_spline' : reuse_spline}
+        The antenna's beam must be a power beam (see `BeamList.beam_type`).
+        Parameters are as for :meth:`get_beam_jones`.
 
-        if spline_opts is not None:
-            interp_kwargs['spline_opts'] = spline_opts
+        Returns
+        -------
+        beam_power : ndarray of complex
+            Shape (4, Ncomponents), with polarizations in the order XX, YY, XY, YX.
+            Cross polarizations missing from the beam are set to zero.
 
-        try:
-            interp_data, interp_basis_vector = \
-                array.beam_list[self.beam_id].interp(**interp_kwargs)
-        except TypeError as err:   # pragma: nocover
-            raise TypeError(
-                "pyuvdata version >=2.0.1 required to use spline_interp_opts"
-            ) from err
+        Raises
+        ------
+        ValueError
+            If the beam is not a power beam, or lacks the XX or YY polarization.
+        """
+        beam = array.beam_list[self.beam_id]
+        if beam.beam_type != 'power':
+            raise ValueError("Beam {} is not a power beam.".format(self.beam_id))
 
-        Ncomponents = source_za.shape[-1]
+        if isinstance(beam, AnalyticBeam):
+            # Each feed responds to one vector component only, so there is no cross power.
+            values = beam.radial_response(np.pi / 2 - np.asarray(source_alt_az[0]),
+                                          _freq_hz(frequency))
+            beam_power = np.zeros((4, values.size), dtype=complex)
+            beam_power[0] = values**2
+            beam_power[1] = values**2
+            return beam_power
 
-        # interp_data has shape:
-        #   (Naxes_vec, Nspws, Nfeeds, 1 (freq),  Ncomponents (source positions))
-        jones_matrix = np.zeros((2, 2, Ncomponents), dtype=np.complex)
+        # interp_data has shape: (1, Npols, Ncomponents)
+        interp_data = self._interp_beam(
+            array, source_alt_az, frequency, reuse_spline=reuse_spline,
+            interpolation_function=interpolation_function, freq_interp_kind=freq_interp_kind
+        )
+        Ncomponents = interp_data.shape[-1]
 
-        # first axis is feed, second axis is theta, phi (opposite order of beam!)
-        jones_matrix[0, 0] = interp_data[1, 0, 0, 0, :]
-        jones_matrix[1, 1] = interp_data[0, 0, 1, 0, :]
-        jones_matrix[0, 1] = interp_data[0, 0, 0, 0, :]
-        jones_matrix[1, 0] = interp_data[1, 0, 1, 0, :]
+        pols = list(beam.polarization_array)
+        beam_power = np.zeros((4, Ncomponents), dtype=complex)
+        # Polarization numbers for XX, YY, XY, YX
+        for pi, pol in enumerate([-5, -6, -7, -8]):
+            if pol in pols:
+                beam_power[pi] = interp_data[0, pols.index(pol)]
+            elif pi < 2:
+                raise ValueError("Power beams must have the XX and YY polarizations.")
 
-        return jones_matrix
+        return beam_power
 
     def __eq__(self, other):
         return ((self.name == other.name)
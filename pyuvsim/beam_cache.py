@@ -0,0 +1,226 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+An on-disk cache of UVBeam responses, reused across simulation runs.
+
+Simulations of the same telescope, sky and LST grid evaluate the beams at the same
+source positions every time they are run. A :class:`BeamResponseCache` saves each
+UVBeam evaluation in a directory, as a numpy file, keyed by a hash of the beam, the
+frequency and the source positions. Later runs load the saved responses (memory
+mapped) instead of interpolating the beams again.
+
+The keys cover everything the response depends on, so that a change to the beam,
+its interpolation settings, the catalog or the time and location gives new keys,
+and stale files are never used. Old files are not removed (see
+:meth:`BeamResponseCache.clear`).
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pyuvdata
+from pyuvdata import UVBeam
+
+__all__ = ['BeamResponseCache', 'hash_uvbeam']
+
+
+def _update_hash(hasher, *items):
+    # Add arrays and other objects (by their repr) to a hash.
+    for item in items:
+        if isinstance(item, np.ndarray):
+            hasher.update(str((item.dtype, item.shape)).encode())
+            # Hash the array buffer in place, or one slice along the first axis at a
+            # time if it is not contiguous, rather than a copy of the whole array.
+            if item.ndim == 0 or item.flags.c_contiguous:
+                hasher.update(memoryview(np.ascontiguousarray(item)).cast('B'))
+            else:
+                for sub in item:
+                    hasher.update(memoryview(np.ascontiguousarray(sub)).cast('B'))
+        else:
+            hasher.update(repr(item).encode())
+
+
+def hash_uvbeam(beam, spline_opts=None, lookup_table=None):
+    """
+    Hash everything that the interpolated values of a UVBeam depend on.
+
+    This covers the beam data and coordinates, its interpolation settings, the
+    lookup table (if any) and the pyuvdata version.
+
+    Parameters
+    ----------
+    beam : :class:`pyuvdata.UVBeam`
+        The beam.
+    spline_opts : dict
+        Options passed to the spline interpolation of the beam.
+    lookup_table : :class:`pyuvsim.BeamLookupTable`
+        Lookup table used for this beam, if any.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest.
+    """
+    hasher = hashlib.sha1()
+    _update_hash(hasher, pyuvdata.__version__, beam.beam_type, beam.data_normalization,
+                 beam.pixel_coordinate_system, getattr(beam, 'interpolation_function', None),
+                 getattr(beam, 'freq_interp_kind', None), spline_opts)
+    for array in [beam.data_array, beam.freq_array, beam.axis1_array, beam.axis2_array,
+                  beam.pixel_array, beam.feed_array, beam.polarization_array,
+                  beam.basis_vector_array]:
+        if array is not None:
+            _update_hash(hasher, np.asarray(array))
+    _update_hash(hasher, beam.nside, beam.ordering)
+    if lookup_table is not None:
+        _update_hash(hasher, lookup_table.kind, lookup_table.za_max, lookup_table.data)
+    return hasher.hexdigest()
+
+
+class BeamResponseCache:
+    """
+    Directory of saved UVBeam responses.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory for the cache files. It is made if it does not exist.
+
+    Attributes
+    ----------
+    beam_hashes : dict
+        Hash of each cached beam (see :func:`hash_uvbeam`), keyed by beam index.
+        Responses are only cached for beams in this dictionary.
+    hits : int
+        Number of responses loaded from the cache.
+    misses : int
+        Number of responses not found in the cache (and saved to it).
+    nbytes_written : int
+        Size of the responses saved to the cache by this process, in bytes.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.beam_hashes = {}
+        self.hits = 0
+        self.misses = 0
+        self.nbytes_written = 0
+
+    def set_beam_hashes(self, beam_list):
+        """
+        Hash the UVBeams in an object mode BeamList.
+
+        Parameters
+        ----------
+        beam_list : :class:`pyuvsim.BeamList`
+            The beams, which must be in object mode.
+        """
+        self.beam_hashes = {}
+        for ind, beam in enumerate(beam_list):
+            if isinstance(beam, UVBeam):
+                self.beam_hashes[ind] = hash_uvbeam(
+                    beam, spline_opts=beam_list.spline_interp_opts,
+                    lookup_table=beam_list.lookup_tables.get(ind, None)
+                )
+
+    def get_key(self, beam_id, freq, source_alt_az, use_table=False, interp_settings=None):
+        """
+        Get the cache key for a beam evaluation.
+
+        Parameters
+        ----------
+        beam_id : int
+            Index of the beam in the BeamList.
+        freq : float
+            Frequency in Hz.
+        source_alt_az : array_like of float
+            Source altitudes and azimuths in radians, shape (2, Ncomponents).
+        use_table : bool
+            Whether the beam is evaluated from its lookup table.
+        interp_settings : tuple
+            Interpolation settings passed along with this evaluation, which may override
+            those set on the beam.
+
+        Returns
+        -------
+        str or None
+            The key, or None if responses of this beam are not cached.
+        """
+        if beam_id not in self.beam_hashes:
+            return None
+        hasher = hashlib.sha1()
+        _update_hash(hasher, self.beam_hashes[beam_id], float(freq), bool(use_table),
+                     interp_settings, np.asarray(source_alt_az, dtype=float))
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def load(self, key):
+        """
+        Load a saved response.
+
+        Parameters
+        ----------
+        key : str
+            Key from :meth:`get_key`.
+
+        Returns
+        -------
+        ndarray or None
+            The response, memory mapped read-only, or None if it is not in the cache.
+        """
+        try:
+            data = np.load(self._path(key), mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            # A missing file, or one left incomplete by an interrupted run.
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def save(self, key, data):
+        """
+        Save a response.
+
+        The file is written under a temporary name and then renamed, so that
+        processes reading the cache (or writing the same key) never see a partial file.
+
+        Parameters
+        ----------
+        key : str
+            Key from :meth:`get_key`.
+        data : ndarray
+            The response.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.save(tmp_file, np.asarray(data))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.nbytes_written += np.asarray(data).nbytes
+
+    def clear(self):
+        """Delete all files in the cache directory."""
+        for fname in os.listdir(self.cache_dir):
+            if fname.endswith('.npy') or fname.endswith('.tmp'):
+                os.remove(os.path.join(self.cache_dir, fname))
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns
+        -------
+        dict
+            Keys are "hits", "misses" and "nbytes_written".
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'nbytes_written': self.nbytes_written}
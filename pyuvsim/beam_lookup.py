@@ -0,0 +1,275 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+Precomputed lookup tables for UVBeam interpolation.
+
+Evaluating a UVBeam with spline interpolation at every beam update is one of the
+most expensive steps of a simulation. A :class:`BeamLookupTable` holds the beam
+sampled once, on a regular azimuth / zenith angle grid at each of the simulation
+frequencies, so that evaluating it at the source positions is a vectorized
+bilinear or bicubic lookup.
+"""
+
+import numpy as np
+
+__all__ = ['BeamLookupTable']
+
+
+def _kernel(frac, kind):
+    """
+    Get the grid offsets and weights of the interpolation kernel.
+
+    Parameters
+    ----------
+    frac : ndarray of float
+        Fractional position of each point between the grid points below and above it.
+    kind : str
+        "linear" or "cubic" (Catmull-Rom cubic convolution).
+
+    Returns
+    -------
+    offsets : list of int
+        Offsets from the grid point below each point.
+    weights : list of ndarray
+        Weight of the grid point at each offset, for each point.
+    """
+    if kind == 'linear':
+        return [0, 1], [1 - frac, frac]
+    frac2 = frac**2
+    frac3 = frac2 * frac
+    weights = [
+        (-frac3 + 2 * frac2 - frac) / 2,
+        (3 * frac3 - 5 * frac2 + 2) / 2,
+        (-3 * frac3 + 4 * frac2 + frac) / 2,
+        (frac3 - frac2) / 2,
+    ]
+    return [-1, 0, 1, 2], weights
+
+
+def _interp_uvbeam(beam, **interp_kwargs):
+    """
+    Run UVBeam.interp, skipping the check that the positions are covered by the beam.
+
+    The check is expensive, and is not needed for positions on the sky. It can only
+    be skipped with newer versions of pyuvdata.
+    """
+    try:
+        return beam.interp(check_azza_domain=False, **interp_kwargs)
+    except TypeError:
+        return beam.interp(**interp_kwargs)
+
+
+class BeamLookupTable:
+    """
+    A beam sampled on a regular azimuth / zenith angle grid, at a set of frequencies.
+
+    The azimuth grid covers the full circle (and wraps around), with spacing
+    `az_step`. The zenith angle grid runs from zero to `za_max` inclusive, with
+    spacing `za_step`. Zenith angles beyond the ends of the grid take the value at
+    the nearest end.
+
+    Parameters
+    ----------
+    data : ndarray of complex
+        Beam values, with shape (Naxes_vec, Nfeeds, Nfreqs, Nza, Naz).
+    freq_array : array_like of float
+        Frequencies of the table in Hz, shape (Nfreqs,).
+    za_max : float
+        Largest zenith angle of the grid, in radians.
+    kind : str
+        Interpolation between grid points, either "linear" (bilinear) or
+        "cubic" (bicubic, Catmull-Rom).
+
+    Attributes
+    ----------
+    az_step, za_step : float
+        Grid spacings in radians.
+    max_error : float
+        Largest absolute difference from spline interpolation found by
+        :meth:`check_accuracy` (None if it has not been run).
+    """
+
+    def __init__(self, data, freq_array, za_max=np.pi / 2, kind='cubic'):
+        if kind not in ['linear', 'cubic']:
+            raise ValueError("kind must be 'linear' or 'cubic', not {}".format(kind))
+        self.data = data
+        self.freq_array = np.asarray(freq_array, dtype=float)
+        self.za_max = za_max
+        self.kind = kind
+        self.max_error = None
+
+    @property
+    def Naz(self):
+        return self.data.shape[-1]
+
+    @property
+    def Nza(self):
+        return self.data.shape[-2]
+
+    @property
+    def az_step(self):
+        return 2 * np.pi / self.Naz
+
+    @property
+    def za_step(self):
+        return self.za_max / (self.Nza - 1)
+
+    @classmethod
+    def from_uvbeam(cls, beam, freq_array, resolution=None, za_max=np.pi / 2, kind='cubic',
+                    spline_opts=None):
+        """
+        Sample a UVBeam on a regular grid at the given frequencies.
+
+        The beam is evaluated with its own interpolation settings
+        (`interpolation_function` and `freq_interp_kind`).
+
+        Parameters
+        ----------
+        beam : :class:`pyuvdata.UVBeam`
+            An efield beam, which should be peak normalized.
+        freq_array : array_like of float
+            Frequencies in Hz.
+        resolution : float
+            Grid spacing in radians. Defaults to the pixel spacing of the beam.
+        za_max : float
+            Largest zenith angle to sample, in radians. Defaults to the horizon.
+        kind : str
+            Interpolation between grid points ("linear" or "cubic").
+        spline_opts : dict
+            Options passed to the spline interpolation of the beam.
+
+        Returns
+        -------
+        BeamLookupTable
+        """
+        freq_array = np.atleast_1d(np.asarray(freq_array, dtype=float))
+        if resolution is None:
+            resolution = cls.native_resolution(beam)
+        # Allow for rounding errors when the resolution divides the range evenly.
+        Naz = int(np.ceil(2 * np.pi / resolution - 1e-6))
+        Nza = int(np.ceil(za_max / resolution - 1e-6)) + 1
+        az_grid = np.arange(Naz) * 2 * np.pi / Naz
+        za_grid = np.linspace(0, za_max, Nza)
+        za_vals, az_vals = np.meshgrid(za_grid, az_grid, indexing='ij')
+
+        interp_kwargs = {'az_array': az_vals.ravel(), 'za_array': za_vals.ravel(),
+                         'reuse_spline': True}
+        if spline_opts is not None:
+            interp_kwargs['spline_opts'] = spline_opts
+
+        data = None
+        for fi, freq in enumerate(freq_array):
+            interp_data, _ = _interp_uvbeam(beam, freq_array=np.array([freq]), **interp_kwargs)
+            # interp_data has shape (Naxes_vec, Nspws, Nfeeds, 1, Npoints)
+            interp_data = interp_data[:, 0, :, 0]
+            if data is None:
+                data = np.zeros(interp_data.shape[:2] + (freq_array.size, Nza, Naz),
+                                dtype=complex)
+            data[:, :, fi] = interp_data.reshape(interp_data.shape[:2] + (Nza, Naz))
+
+        return cls(data, freq_array, za_max=za_max, kind=kind)
+
+    @staticmethod
+    def native_resolution(beam):
+        """Get the pixel spacing of a UVBeam in radians."""
+        if beam.pixel_coordinate_system == 'healpix':
+            return np.sqrt(4 * np.pi / (12 * beam.nside**2))
+        return min(np.min(np.abs(np.diff(beam.axis1_array))),
+                   np.min(np.abs(np.diff(beam.axis2_array))))
+
+    def freq_index(self, freq):
+        """
+        Get the index of a frequency in the table.
+
+        Parameters
+        ----------
+        freq : float
+            Frequency in Hz.
+
+        Returns
+        -------
+        int or None
+            Index along the frequency axis, or None if the table does not have this frequency.
+        """
+        inds = np.nonzero(np.isclose(self.freq_array, freq, rtol=1e-12, atol=0))[0]
+        if inds.size == 0:
+            return None
+        return int(inds[0])
+
+    def interp(self, az_array, za_array, freq_index):
+        """
+        Evaluate the beam at a set of positions.
+
+        Parameters
+        ----------
+        az_array, za_array : ndarray of float
+            Azimuths and zenith angles in radians, in the UVBeam convention.
+        freq_index : int
+            Index of the frequency in the table (see :meth:`freq_index`).
+
+        Returns
+        -------
+        ndarray of complex
+            Beam values, with shape (Naxes_vec, Nfeeds, Npoints).
+        """
+        table = self.data[:, :, freq_index]
+
+        az_pos = np.mod(az_array, 2 * np.pi) / self.az_step
+        za_pos = np.asarray(za_array) / self.za_step
+        az_ind = np.floor(az_pos)
+        za_ind = np.floor(za_pos)
+        az_offsets, az_weights = _kernel(az_pos - az_ind, self.kind)
+        za_offsets, za_weights = _kernel(za_pos - za_ind, self.kind)
+        az_ind = az_ind.astype(int)
+        za_ind = za_ind.astype(int)
+
+        result = np.zeros(table.shape[:2] + az_ind.shape, dtype=table.dtype)
+        for za_off, za_wt in zip(za_offsets, za_weights):
+            za_inds = np.clip(za_ind + za_off, 0, self.Nza - 1)
+            for az_off, az_wt in zip(az_offsets, az_weights):
+                az_inds = np.mod(az_ind + az_off, self.Naz)
+                result += za_wt * az_wt * table[:, :, za_inds, az_inds]
+        return result
+
+    def check_accuracy(self, beam, Npoints=1000, spline_opts=None, seed=None):
+        """
+        Compare the table against spline interpolation of the beam.
+
+        The beam is evaluated at random positions within the table's zenith angle
+        range, at up to three of the table frequencies (the first, middle and last).
+
+        Parameters
+        ----------
+        beam : :class:`pyuvdata.UVBeam`
+            The beam this table was made from.
+        Npoints : int
+            Number of random positions.
+        spline_opts : dict
+            Options passed to the spline interpolation of the beam.
+        seed : int
+            Seed for the random positions.
+
+        Returns
+        -------
+        float
+            The largest absolute difference between the two, also stored as `max_error`.
+            For peak normalized beams, this is relative to the peak.
+        """
+        rng = np.random.RandomState(seed)
+        az_array = rng.uniform(0, 2 * np.pi, Npoints)
+        za_array = rng.uniform(0, self.za_max, Npoints)
+        interp_kwargs = {'az_array': az_array, 'za_array': za_array}
+        if spline_opts is not None:
+            interp_kwargs['spline_opts'] = spline_opts
+
+        max_error = 0.0
+        for fi in sorted(set([0, self.freq_array.size // 2, self.freq_array.size - 1])):
+            spline_data, _ = _interp_uvbeam(
+                beam, freq_array=self.freq_array[fi:fi + 1], **interp_kwargs
+            )
+            table_data = self.interp(az_array, za_array, fi)
+            max_error = max(max_error, np.max(np.abs(table_data - spline_data[:, 0, :, 0])))
+        self.max_error = float(max_error)
+        return self.max_error
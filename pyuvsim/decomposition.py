@@ -0,0 +1,142 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+Split the work of a simulation among MPI processes.
+
+The work is a grid of tasks (baseline, time and frequency) by sources. The
+processes are arranged in a grid of ``Ntask_blocks`` by ``Nsrc_blocks``, and each
+one simulates a block of contiguous tasks for a block of sources. The visibilities
+of each task are summed over the source blocks when they are gathered.
+
+Splitting the tasks alone leaves processes idle when there are fewer tasks than
+processes, and has every process compute the positions and beam responses of all
+sources at the times (and frequencies) in its block. Splitting the sources alone
+sends every task from every process to the root. :func:`choose_block_grid` picks the
+grid with the lowest predicted cost, counting the position and beam work on the
+busiest process and the volume of the gather.
+"""
+
+import numpy as np
+
+from . import utils as simutils
+
+__all__ = ['decomposition_costs', 'choose_block_grid', 'make_block_inds']
+
+# Seconds per unit of work, matching the default costs in pyuvsim.planning:
+# source positions per time, beam responses per time and frequency, each
+# task-source pair, and each task received on the root.
+decomposition_costs = {
+    'position': 2e-6,
+    'beam': 5e-7,
+    'task_source': 5e-8,
+    'reduce': 2e-5,
+}
+
+
+def _block_span(start, end, Ninner):
+    # Number of distinct values of index // Ninner among the flat indices [start, end).
+    if end <= start:
+        return 0
+    return (end - 1) // Ninner - start // Ninner + 1
+
+
+def _grid_cost(Nbls, Ntimes, Nfreqs, Nsrcs, Ntask_blocks, Nsrc_blocks, costs):
+    Nbltf = Nbls * Ntimes * Nfreqs
+    Nsrcs_block = int(np.ceil(Nsrcs / Nsrc_blocks))
+    rank_cost = 0
+    for block in range(Ntask_blocks):
+        tasks, Ntasks = simutils.iter_array_split(block, Nbltf, Ntask_blocks)
+        # Tasks are flattened with time slowest and baseline fastest.
+        Ntimes_block = _block_span(tasks.start, tasks.stop, Nfreqs * Nbls)
+        Ntf_block = _block_span(tasks.start, tasks.stop, Nbls)
+        cost = Nsrcs_block * (costs['position'] * Ntimes_block + costs['beam'] * Ntf_block
+                              + costs['task_source'] * Ntasks)
+        rank_cost = max(rank_cost, cost)
+    return rank_cost + costs['reduce'] * Nbltf * Nsrc_blocks
+
+
+def choose_block_grid(Nbls, Ntimes, Nfreqs, Nsrcs, Npus, costs=None):
+    """
+    Choose the number of task and source blocks to split the work into.
+
+    Parameters
+    ----------
+    Nbls, Ntimes, Nfreqs, Nsrcs : int
+        Problem size.
+    Npus : int
+        Number of MPI processes.
+    costs : dict
+        Seconds per unit of work, with the keys of `decomposition_costs`.
+
+    Returns
+    -------
+    Ntask_blocks, Nsrc_blocks : int
+        Grid shape. Its size may be smaller than Npus, leaving some processes idle,
+        if there are too few tasks and sources.
+    """
+    if costs is None:
+        costs = decomposition_costs
+    Nbltf = Nbls * Ntimes * Nfreqs
+
+    best = None
+    for Nsrc_blocks in range(1, min(Npus, Nsrcs) + 1):
+        Ntask_blocks = min(Npus // Nsrc_blocks, Nbltf)
+        cost = _grid_cost(Nbls, Ntimes, Nfreqs, Nsrcs, Ntask_blocks, Nsrc_blocks, costs)
+        # Fewer source blocks are preferred for equal costs.
+        if best is None or cost < best[0]:
+            best = (cost, Ntask_blocks, Nsrc_blocks)
+    return best[1], best[2]
+
+
+def make_block_inds(Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, grid=None, node_ids=None):
+    """
+    Get the tasks and sources simulated on a process.
+
+    Parameters
+    ----------
+    Nbls, Ntimes, Nfreqs, Nsrcs : int
+        Problem size.
+    rank : int
+        The process.
+    Npus : int
+        Number of MPI processes.
+    grid : tuple of int
+        (Ntask_blocks, Nsrc_blocks). Defaults to :func:`choose_block_grid`.
+    node_ids : list
+        Node of each process, indexed by rank. The processes are placed on the grid
+        in the order of their nodes, filling each source block before the next, so
+        that the processes on a node share a source block whenever there are at least
+        as many task blocks as processes per node. Defaults to placing processes in
+        the order of their ranks.
+
+    Returns
+    -------
+    task_inds : range
+        Flat task indices in the (Ntimes, Nfreqs, Nbls) grid.
+    src_inds : range
+        Source indices.
+    Ntasks_local, Nsrcs_local : int
+        Numbers of tasks and sources.
+    """
+    Nbltf = Nbls * Ntimes * Nfreqs
+    if grid is None:
+        grid = choose_block_grid(Nbls, Ntimes, Nfreqs, Nsrcs, Npus)
+    Ntask_blocks, Nsrc_blocks = grid
+
+    if node_ids is None:
+        cell = rank
+    else:
+        # Stable, so ranks on a node keep their order.
+        cell = int(np.argsort(np.asarray(node_ids), kind='stable').tolist().index(rank))
+
+    src_block, task_block = divmod(cell, Ntask_blocks)
+    src_inds, Nsrcs_local = simutils.iter_array_split(min(src_block, Nsrc_blocks - 1),
+                                                      Nsrcs, Nsrc_blocks)
+    if src_block >= Nsrc_blocks:
+        # Processes outside the grid have no tasks (but keep some sources, so that
+        # the sky chunks are not empty).
+        return range(0), src_inds, 0, Nsrcs_local
+    task_inds, Ntasks_local = simutils.iter_array_split(task_block, Nbltf, Ntask_blocks)
+    return task_inds, src_inds, Ntasks_local, Nsrcs_local
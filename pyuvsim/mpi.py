@@ -7,11 +7,14 @@ from array import array as _array
 import struct as _struct
 import resource
 import atexit
+import functools
 from pickle import loads, dumps
 
 import mpi4py
 import numpy as np
 
+from . import timing
+
 mpi4py.rc.initialize = False  # noqa
 from mpi4py import MPI
 
@@ -21,6 +24,9 @@ world_comm = None
 node_comm = None
 rank_comm = None
 
+# Total bytes allocated in shared memory windows on this node by shared_mem_bcast.
+shared_mem_allocated = 0
+
 
 # Split serialized objects into chunks of 2 GiB
 INT_MAX = 2**31 - 1
@@ -37,6 +43,17 @@ def set_mpi_excepthook(mpi_comm):
     sys.excepthook = mpi_excepthook
 
 
+def _traced(func):
+    """Record each call to a collective operation on the trace timeline, if tracing."""
+
+    @functools.wraps(func)
+    def traced_func(*args, **kwargs):
+        with timing.trace(func.__name__, cat='mpi'):
+            return func(*args, **kwargs)
+
+    return traced_func
+
+
 def start_mpi(block_nonroot_stdout=True):
     """
     Check if MPI has already been initialized. If so, just set the communicators,
@@ -69,6 +86,7 @@ def start_mpi(block_nonroot_stdout=True):
         sys.stdout = open('/dev/null', 'w')
 
 
+@_traced
 def shared_mem_bcast(arr, root=0):
     """
     Allocate shared memory on each node and place contents of arr in it.
@@ -102,7 +120,7 @@ def shared_mem_bcast(arr, root=0):
         dtype = arr.dtype
         Nitems = arr.size
         shape = arr.shape
-        itemsize = sys.getsizeof(arr.flatten()[0])
+        itemsize = arr.itemsize
         nbytes = itemsize * Nitems
 
     itemsize = node_comm.bcast(itemsize, root=root)
@@ -114,6 +132,9 @@ def shared_mem_bcast(arr, root=0):
     # Otherwise, make a handle to the window.
     # This will allocate nbytes on each node.
 
+    global shared_mem_allocated
+    shared_mem_allocated += itemsize * Nitems
+
     win = MPI.Win.Allocate_shared(nbytes, itemsize, comm=node_comm)
     buf, itemsize = win.Shared_query(0)
     sh_arr = np.ndarray(buffer=buf, dtype=dtype, shape=shape)
@@ -130,6 +151,7 @@ def shared_mem_bcast(arr, root=0):
     return sh_arr
 
 
+@_traced
 def quantity_shared_bcast(obj, root=0):
     """
     Broadcast to shared memory for classes derived from astropy.units.Quantity.
@@ -153,6 +175,7 @@ def quantity_shared_bcast(obj, root=0):
     return sclass(value, copy=False, unit=unit)
 
 
+@_traced
 def big_bcast(comm, objs, root=0, return_split_info=False, MAX_BYTES=INT_MAX):
     """
     Broadcast operation that can exceed the MPI limit of ~4 GiB.
@@ -239,6 +262,7 @@ def big_bcast(comm, objs, root=0, return_split_info=False, MAX_BYTES=INT_MAX):
     return result
 
 
+@_traced
 def big_gather(comm, objs, root=0, return_split_info=False, MAX_BYTES=INT_MAX):
     """
     Gather operation that can exceed the MPI limit of ~4 GiB.
@@ -337,12 +361,126 @@ def big_gather(comm, objs, root=0, return_split_info=False, MAX_BYTES=INT_MAX):
     return per_proc
 
 
+def _span_covers(spans):
+    # Split the rows covered by a list of (start, stop) spans at every span edge. Returns
+    # (start, stop, covers) for each piece of rows that is covered, where covers lists
+    # the indices of the spans containing it.
+    edges = sorted({edge for span in spans if span[1] > span[0] for edge in span})
+    pieces = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        covers = [ind for ind, span in enumerate(spans) if span[0] <= start and stop <= span[1]]
+        if covers:
+            pieces.append((start, stop, covers))
+    return pieces
+
+
+@_traced
+def node_block_sum(arr, offset, group=None, MAX_BYTES=INT_MAX):
+    """
+    Sum blocks of rows of an array from all processes, reducing on each node first.
+
+    Each process adds its block into an array in shared memory on its node. The
+    first processes on the nodes then sum the rows that several nodes hold with
+    a reduction to the root process, and gather the rows held by one node only,
+    so that the root receives each row of the sum once.
+
+    Must be called from all PUs.
+
+    Parameters
+    ----------
+    arr: ndarray
+        Partial sums for rows `offset` to `offset + len(arr)` of the full array.
+        May be empty, but must have the same trailing shape and dtype on all processes.
+    offset: int
+        Row of the full array where `arr` starts.
+    group: int
+        Processes on a node in the same group must have disjoint rows, and add
+        their blocks at the same time. Defaults to a group per process.
+    MAX_BYTES: int
+        Maximum bytes per reduction.
+        Defaults to the INT_MAX of 32 bit integers. Used for testing.
+
+    Returns
+    -------
+    list of tuple:
+        (offset, block) of disjoint blocks of rows of the sum, filled on the root
+        process only. Other processes get None.
+    """
+    if group is None:
+        group = world_comm.rank
+    spans = node_comm.allgather((offset, offset + len(arr), group) if len(arr) else None)
+    spans = [span for span in spans if span is not None]
+    node_start = min((span[0] for span in spans), default=0)
+    node_stop = max((span[1] for span in spans), default=0)
+    shape = (node_stop - node_start,) + arr.shape[1:]
+
+    nbytes = 0
+    if node_comm.rank == 0:
+        nbytes = int(np.prod(shape)) * arr.itemsize
+    win = MPI.Win.Allocate_shared(nbytes, arr.itemsize, comm=node_comm)
+    buf, itemsize = win.Shared_query(0)
+    node_arr = np.ndarray(buffer=buf, dtype=arr.dtype, shape=shape)
+    if node_comm.rank == 0:
+        node_arr[()] = 0
+    node_comm.Barrier()
+
+    # Take turns by group, so that no two processes add to the same rows at once.
+    for turn in dict.fromkeys(span[2] for span in spans):
+        if len(arr) and group == turn:
+            node_arr[offset - node_start:offset - node_start + len(arr)] += arr
+        node_comm.Barrier()
+
+    blocks = None
+    if node_comm.rank == 0:
+        blocks = []
+        single = []
+        row_bytes = max(int(np.prod(shape[1:])) * arr.itemsize, 1)
+        step = max(MAX_BYTES // row_bytes, 1)
+        node_spans = rank_comm.allgather((node_start, node_stop))
+        for start, stop, covers in _span_covers(node_spans):
+            rows = slice(start - node_start, stop - node_start)
+            if len(covers) == 1:
+                if covers[0] == rank_comm.rank:
+                    single.append((start, node_arr[rows]))
+                continue
+            # Sum the rows held by several nodes, always including the root.
+            member = rank_comm.rank == 0 or rank_comm.rank in covers
+            sub_comm = rank_comm.Split(0 if member else MPI.UNDEFINED, key=rank_comm.rank)
+            if not member:
+                continue
+            if rank_comm.rank in covers:
+                part = np.array(node_arr[rows])
+            else:
+                part = np.zeros((stop - start,) + shape[1:], dtype=arr.dtype)
+            for row in range(0, stop - start, step):
+                chunk = part[row:row + step]
+                if sub_comm.rank == 0:
+                    sub_comm.Reduce(MPI.IN_PLACE, chunk, op=MPI.SUM, root=0)
+                else:
+                    sub_comm.Reduce(chunk, None, op=MPI.SUM, root=0)
+            sub_comm.Free()
+            if rank_comm.rank == 0:
+                blocks.append((start, part))
+        # The gathered blocks are copies, so the window can be freed afterwards.
+        gathered = big_gather(rank_comm, single, root=0)
+        if rank_comm.rank == 0:
+            blocks.extend(block for node_single in gathered for block in node_single)
+        else:
+            blocks = None
+    win.Free()
+
+    return blocks
+
+
 class Counter:
     """
     A basic parallelized counter class.
 
     Adapted from the mpi4py nxtval-mpi3.py demo.
     https://github.com/mpi4py/mpi4py/blob/master/demo/nxtval/nxtval-mpi3.py
+
+    The count is a 64-bit integer, so it does not overflow when counting progress
+    through large simulations.
     """
 
     def __init__(self, comm=None, count_rank=0):
@@ -350,7 +488,7 @@ class Counter:
         if comm is None:
             comm = world_comm
         rank = comm.Get_rank()
-        itemsize = MPI.INT.Get_size()
+        itemsize = MPI.LONG_LONG.Get_size()
         nint = 0
         if rank == count_rank:
             nint = 1
@@ -358,7 +496,7 @@ class Counter:
                                     MPI.INFO_NULL, comm)
         if rank == 0:
             mem = self.win.tomemory()
-            mem[:] = _struct.pack('i', 0)
+            mem[:] = _struct.pack('q', 0)
 
         self.win.Fence()
 
@@ -366,23 +504,87 @@ class Counter:
         self.win.Free()
 
     def next(self, increment=1):
-        incr = _array('i', [increment])
-        nval = _array('i', [0])
+        incr = _array('q', [increment])
+        nval = _array('q', [0])
         self.win.Lock(0)
-        self.win.Get_accumulate([incr, 1, MPI.INT],
-                                [nval, 1, MPI.INT],
+        self.win.Get_accumulate([incr, 1, MPI.LONG_LONG],
+                                [nval, 1, MPI.LONG_LONG],
                                 0, op=MPI.SUM)
         self.win.Unlock(0)
         return nval[0]
 
     def current_value(self):
         self.win.Lock(0)
-        nval = _array('i', [0])
-        self.win.Get([nval, 1, MPI.INT], 0)
+        nval = _array('q', [0])
+        self.win.Get([nval, 1, MPI.LONG_LONG], 0)
         self.win.Unlock(0)
         return nval[0]
 
 
+class StatusBoard:
+    """
+    A table of numbers, one row per rank, held on a single rank.
+
+    Each rank can post its row at any time with one-sided communication, and the
+    holding rank can read the whole table without involving the other ranks.
+    Creating and freeing the board are collective operations.
+
+    Parameters
+    ----------
+    Nfields : int
+        Number of values in each row.
+    comm : mpi4py.MPI.Comm
+        Communicator. Defaults to the world communicator.
+    board_rank : int
+        Rank holding the table.
+    """
+
+    def __init__(self, Nfields, comm=None, board_rank=0):
+        if comm is None:
+            comm = world_comm
+        self.Nfields = Nfields
+        self.board_rank = board_rank
+        self.rank = comm.Get_rank()
+        self.Nranks = comm.Get_size()
+        itemsize = MPI.DOUBLE.Get_size()
+        Nitems = 0
+        if self.rank == board_rank:
+            Nitems = self.Nranks * Nfields
+        self.win = MPI.Win.Allocate(Nitems * itemsize, itemsize, MPI.INFO_NULL, comm)
+        if self.rank == board_rank:
+            table = np.frombuffer(self.win.tomemory(), dtype=np.float64)
+            table[:] = 0
+
+        self.win.Fence()
+
+    def free(self):
+        self.win.Free()
+
+    def post(self, values):
+        """Write this rank's row."""
+        row = np.ascontiguousarray(values, dtype=np.float64)
+        self.win.Lock(self.board_rank)
+        self.win.Put([row, self.Nfields, MPI.DOUBLE], self.board_rank,
+                     target=self.rank * self.Nfields)
+        self.win.Unlock(self.board_rank)
+
+    def read(self):
+        """
+        Read the whole table.
+
+        Returns
+        -------
+        ndarray of float
+            Table of shape (Nranks, Nfields).
+        """
+        table = np.zeros((self.Nranks, self.Nfields), dtype=np.float64)
+        self.win.Lock(self.board_rank, MPI.LOCK_SHARED)
+        self.win.Get([table, table.size, MPI.DOUBLE], self.board_rank)
+        self.win.Unlock(self.board_rank)
+        return table
+
+
+@_traced
 def get_max_node_rss(return_per_node=False):
     """
     Find the maximum memory usage on any node in the job in GiB.
@@ -0,0 +1,351 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+Plan a simulation without running it.
+
+The planner reads a parameter file, builds the same task decomposition as
+:func:`pyuvsim.uvsim.run_uvdata_uvsim`, and predicts the peak memory per rank,
+per node, and on the root process, the number of sky chunks, and the runtime.
+
+Memory is estimated from the sizes of the numpy arrays that will be created.
+The runtime comes from a model with per-operation costs, which may be calibrated
+for a given machine with ``benchmarking/run_scaling.py``.
+"""
+
+import json
+
+import numpy as np
+from pyuvdata import UVBeam, parameter
+
+from . import simsetup
+from . import utils as simutils
+from .decomposition import choose_block_grid
+from .uvsim import _make_task_inds
+
+__all__ = ['cost_terms', 'default_costs', 'load_costs', 'predict_runtime',
+           'plan_uvdata_simulation', 'plan_simulation', 'format_plan']
+
+# Terms of the runtime model, as functions of the problem size.
+# Terms for work that is split among processes are divided by Npus.
+cost_terms = {
+    'overhead': lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: 1.0,
+    'per_time_source': lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: Ntimes * Nsrcs / Npus,
+    'per_time_freq_source':
+        lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: Ntimes * Nfreqs * Nsrcs / Npus,
+    'per_task': lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: Nbls * Ntimes * Nfreqs / Npus,
+    'per_task_source':
+        lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: Nbls * Ntimes * Nfreqs * Nsrcs / Npus,
+    'per_task_root': lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: Nbls * Ntimes * Nfreqs,
+    'per_process': lambda Nbls, Ntimes, Nfreqs, Nsrcs, Npus: Npus,
+}
+
+# Seconds per unit of each cost term, for a typical cluster node with analytic beams.
+# These are rough; fit costs for your own machine with benchmarking/run_scaling.py.
+default_costs = {
+    'overhead': 5.0,
+    'per_time_source': 2e-6,
+    'per_time_freq_source': 5e-7,
+    'per_task': 1e-3,
+    'per_task_source': 5e-8,
+    'per_task_root': 2e-5,
+    'per_process': 0.05,
+}
+
+
+def load_costs(costs_file):
+    """
+    Read fitted cost coefficients from a json file.
+
+    Terms missing from the file are taken from `default_costs`.
+    """
+    with open(costs_file, 'r') as cfile:
+        costs = json.load(cfile)
+    unknown = set(costs.keys()) - set(cost_terms.keys())
+    if len(unknown) > 0:
+        raise ValueError("Unknown cost terms in {}: {}".format(costs_file, sorted(unknown)))
+    return dict(default_costs, **costs)
+
+
+def predict_runtime(costs, Nbls, Ntimes, Nfreqs, Nsrcs, Npus):
+    """
+    Predict the runtime of a simulation in seconds.
+
+    Parameters
+    ----------
+    costs : dict
+        Seconds per unit of each term in `cost_terms`.
+    Nbls, Ntimes, Nfreqs, Nsrcs, Npus : int
+        Problem size and number of MPI processes.
+    """
+    return float(sum(costs[name] * func(Nbls, Ntimes, Nfreqs, Nsrcs, Npus)
+                     for name, func in cost_terms.items()))
+
+
+def _uvparameter_nbytes(obj, skip=()):
+    # Total size of the numpy arrays held in UVParameters on a UVBase object.
+    nbytes = 0
+    for key, attr in obj.__dict__.items():
+        if key in skip or not isinstance(attr, parameter.UVParameter):
+            continue
+        if isinstance(attr.value, np.ndarray):
+            nbytes += attr.value.nbytes
+    return nbytes
+
+
+def _catalog_nbytes(catalog):
+    # Sizes of the SkyModelData arrays that are shared per node and copied per rank.
+    shared = 0
+    per_rank = 0
+    for key, val in catalog.__dict__.items():
+        if not isinstance(val, np.ndarray):
+            continue
+        if key in catalog.put_in_shared:
+            shared += val.nbytes
+        else:
+            per_rank += val.nbytes
+    return shared, per_rank
+
+
+def _beam_nbytes(beam_list):
+    # Beam data arrays are shared per node, the rest is copied to each rank.
+    shared = 0
+    per_rank = 0
+    for beam in beam_list:
+        if isinstance(beam, UVBeam):
+            shared += beam.data_array.nbytes
+            per_rank += _uvparameter_nbytes(beam, skip=('_data_array',))
+    return shared, per_rank
+
+
+def _get_baseline_mem():
+    # Memory used by the interpreter and libraries.
+    try:
+        return simutils.get_current_rss()
+    except ImportError:
+        return 0
+
+
+def plan_uvdata_simulation(input_uv, beam_list, catalog, Npus=1, Npus_node=None,
+                           mem_per_node=None, costs=None, baseline_mem=None,
+                           lazy_spectra=False):
+    """
+    Predict the resource usage of a simulation of a UVData object, without running it.
+
+    Parameters
+    ----------
+    input_uv : :class:`pyuvdata.UVData`
+        Provides baseline/time/frequency information.
+    beam_list : :class:`pyuvsim.BeamList`
+        Beams used in the simulation. UVBeams are read if the list is in string mode.
+    catalog : :class:`pyuvsim.simsetup.SkyModelData`
+        Source components.
+    Npus : int
+        Number of MPI processes the simulation will run with.
+    Npus_node : int
+        Number of MPI processes per node. Defaults to `Npus` (a single node).
+    mem_per_node : float
+        Memory per node in bytes. Defaults to the memory available on this node
+        (see :func:`pyuvsim.utils.get_avail_memory`).
+    costs : dict
+        Seconds per unit of each term in `cost_terms`. Defaults to `default_costs`.
+    baseline_mem : float
+        Memory used by each process before any data are read, in bytes.
+        Defaults to the current resident memory of this process.
+    lazy_spectra : bool
+        Whether the simulation evaluates the fluxes of "spectral_index" and "subband"
+        catalogs lazily (see :func:`pyuvsim.uvsim.run_uvdata_uvsim`).
+
+    Returns
+    -------
+    dict
+        Problem size ("Nbls", "Ntimes", "Nfreqs", "Nsrcs"), decomposition ("Npus",
+        "Npus_node", "Nnodes", "Ntask_blocks", "Nsrc_blocks", "Ntasks_local_max",
+        "Nsrcs_local_max", "Nsky_parts"),
+        memory in bytes ("rank_mem", "root_mem", "node_mem", "mem_per_node", and a
+        breakdown of each in "rank_mem_parts", "root_mem_parts", "node_mem_parts"),
+        "fits" (whether the job fits in memory), and "runtime" in seconds.
+    """
+    Npus = int(Npus)
+    if Npus_node is None:
+        Npus_node = Npus
+    Npus_node = min(int(Npus_node), Npus)
+    Nnodes = int(np.ceil(Npus / Npus_node))
+    if mem_per_node is None:
+        mem_per_node = simutils.get_avail_memory()
+    if costs is None:
+        costs = default_costs
+    if baseline_mem is None:
+        baseline_mem = _get_baseline_mem()
+    if beam_list.string_mode:
+        beam_list.set_obj_mode(freq_array=input_uv.freq_array[0])
+
+    Nbls = input_uv.Nbls
+    Ntimes = input_uv.Ntimes
+    Nfreqs = input_uv.Nfreqs
+    Nsrcs = catalog.Ncomponents
+
+    grid = choose_block_grid(Nbls, Ntimes, Nfreqs, Nsrcs, Npus)
+    Ntask_blocks, Nsrc_blocks = grid
+    # Ranks are assumed to fill each node in turn.
+    node_ids = [rank // Npus_node for rank in range(Npus)]
+    decomp = [_make_task_inds(Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, node_ids=node_ids,
+                              grid=grid)
+              for rank in range(Npus)]
+    Ntasks_local_max = max(Ntasks for _, _, Ntasks, _ in decomp)
+    Nsrcs_local_max = max(Nsrcs_loc for _, _, _, Nsrcs_loc in decomp)
+
+    # Each node sums its ranks' visibilities over the span of their tasks.
+    node_spans = {}
+    for node, (task_inds, _, Ntasks, _) in zip(node_ids, decomp):
+        if Ntasks:
+            start, stop = node_spans.get(node, (task_inds.start, task_inds.stop))
+            node_spans[node] = (min(start, task_inds.start), max(stop, task_inds.stop))
+    node_Ntasks = [stop - start for start, stop in node_spans.values()]
+    # Rows held by several nodes are summed on the way to the root, so the root
+    # receives each row of the union of the spans once.
+    root_Ntasks = 0
+    covered = 0
+    for start, stop in sorted(node_spans.values()):
+        root_Ntasks += max(stop - max(start, covered), 0)
+        covered = max(covered, stop)
+
+    # Data held on every rank before the task loop.
+    catalog_shared, catalog_rank = _catalog_nbytes(catalog)
+    beam_shared, beam_rank = _beam_nbytes(beam_list)
+    input_uv_bytes = _uvparameter_nbytes(input_uv)
+    static_rank = baseline_mem + input_uv_bytes + catalog_rank + beam_rank
+    node_shared = catalog_shared + beam_shared
+
+    # Choose the number of sky chunks the same way run_uvdata_uvsim does.
+    lazy = lazy_spectra and catalog.spectral_type in ['spectral_index', 'subband']
+    Nfreqs_est = catalog.Nfreqs
+    if catalog.spectral_type in ['spectral_index', 'subband'] and not lazy:
+        Nfreqs_est = max(Nfreqs_est, Nfreqs)
+    mem_avail = mem_per_node - (Npus_node * static_rank + node_shared)
+    skymodel_mem_footprint = (
+        simutils.estimate_skymodel_memory_usage(Nsrcs, Nfreqs_est) * Npus_node
+    )
+    if mem_avail > 0:
+        Nsky_parts = max(int(np.ceil(skymodel_mem_footprint / (0.5 * mem_avail))), 1)
+    else:
+        Nsky_parts = np.inf
+    fits = Nsky_parts <= Nsrcs
+    Nsky_parts = min(Nsky_parts, Nsrcs)
+
+    # Non-flat spectra are evaluated at all simulated frequencies in each chunk,
+    # unless they are evaluated lazily.
+    Nfreqs_sky = catalog.Nfreqs if catalog.spectral_type == 'flat' or lazy else Nfreqs
+    Nsrcs_chunk = int(np.ceil(Nsrcs_local_max / Nsky_parts))
+    chunk_bytes = simutils.estimate_skymodel_memory_usage(Nsrcs_chunk, Nfreqs_sky)
+
+    vis_bytes = input_uv.Npols * np.dtype(complex).itemsize
+    rank_mem_parts = {
+        'baseline': baseline_mem,
+        'input_uv': input_uv_bytes,
+        'catalog': catalog_rank,
+        'beams': beam_rank,
+        'sky_chunk': chunk_bytes,
+        'task_results': Ntasks_local_max * vis_bytes,
+    }
+    rank_mem = sum(rank_mem_parts.values())
+
+    Ntasks_tot = Nbls * Ntimes * Nfreqs
+    # The output of runs writing to file copies the metadata of the input, and only
+    # allocates its data array.
+    output_bytes = (
+        _uvparameter_nbytes(input_uv, skip=('_data_array', '_flag_array', '_nsample_array'))
+        + input_uv.Nblts * Nfreqs * input_uv.Npols * np.dtype(complex).itemsize
+    )
+    root_mem_parts = dict(rank_mem_parts)
+    root_mem_parts['output'] = output_bytes
+    # Received and unpickled blocks.
+    root_mem_parts['gather_buffers'] = 2 * root_Ntasks * vis_bytes
+    root_mem = sum(root_mem_parts.values())
+
+    node_mem_parts = {
+        'shared_catalog': catalog_shared,
+        'shared_beams': beam_shared,
+        'shared_results': max(node_Ntasks, default=0) * vis_bytes,
+        'ranks': (Npus_node - 1) * rank_mem,
+        'root': root_mem,
+    }
+    node_mem = sum(node_mem_parts.values())
+
+    return {
+        'Nbls': Nbls, 'Ntimes': Ntimes, 'Nfreqs': Nfreqs, 'Nsrcs': Nsrcs,
+        'Ntasks': Ntasks_tot, 'Npus': Npus, 'Npus_node': Npus_node, 'Nnodes': Nnodes,
+        'Ntask_blocks': Ntask_blocks, 'Nsrc_blocks': Nsrc_blocks,
+        'Ntasks_local_max': Ntasks_local_max, 'Nsrcs_local_max': Nsrcs_local_max,
+        'Nsky_parts': int(Nsky_parts),
+        'rank_mem': rank_mem, 'rank_mem_parts': rank_mem_parts,
+        'root_mem': root_mem, 'root_mem_parts': root_mem_parts,
+        'node_mem': node_mem, 'node_mem_parts': node_mem_parts,
+        'mem_per_node': mem_per_node,
+        'fits': bool(fits and node_mem <= mem_per_node),
+        'runtime': predict_runtime(costs, Nbls, Ntimes, Nfreqs, Nsrcs, Npus),
+    }
+
+
+def plan_simulation(params, Npus=1, Npus_node=None, mem_per_node=None, costs=None):
+    """
+    Predict the resource usage of a simulation from a parameter file, without running it.
+
+    The parameter file, catalog, and beams are read, so this should be run in
+    a single process (not within the MPI job).
+
+    Parameters
+    ----------
+    params : str or dict
+        Path to a parameter yaml file, or a dictionary of parameters.
+    Npus, Npus_node, mem_per_node, costs
+        Passed to :func:`plan_uvdata_simulation`.
+
+    Returns
+    -------
+    dict
+        See :func:`plan_uvdata_simulation`.
+    """
+    # Measured before reading any data.
+    baseline_mem = _get_baseline_mem()
+    input_uv, beam_list, beam_dict = simsetup.initialize_uvdata_from_params(params)
+    sky, _ = simsetup.initialize_catalog_from_params(params, input_uv, return_recarray=False)
+    lazy_spectra = simsetup.parse_simulation_params(params).get('lazy_spectra', False)
+    return plan_uvdata_simulation(
+        input_uv, beam_list, simsetup.SkyModelData(sky), Npus=Npus, Npus_node=Npus_node,
+        mem_per_node=mem_per_node, costs=costs, baseline_mem=baseline_mem,
+        lazy_spectra=lazy_spectra
+    )
+
+
+def _fmt_bytes(nbytes):
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if abs(nbytes) < 1024:
+            return "{:.1f} {}".format(nbytes, unit)
+        nbytes /= 1024.
+    return "{:.1f} TiB".format(nbytes)
+
+
+def format_plan(plan):
+    """Format the output of :func:`plan_simulation` as text."""
+    lines = [
+        "Nbls: {Nbls}  Ntimes: {Ntimes}  Nfreqs: {Nfreqs}  Nsrcs: {Nsrcs}".format(**plan),
+        "Tasks: {Ntasks}  Npus: {Npus} ({Npus_node} per node, {Nnodes} nodes)".format(**plan),
+        "Blocks: {Ntask_blocks} of tasks x {Nsrc_blocks} of sources".format(**plan),
+        "Max tasks per rank: {Ntasks_local_max}  Max sources per rank: {Nsrcs_local_max}"
+        "  Sky chunks: {Nsky_parts}".format(**plan),
+        "",
+    ]
+    for label, key in [('Per rank', 'rank_mem'), ('Root', 'root_mem'), ('Per node', 'node_mem')]:
+        lines.append("{} memory: {}".format(label, _fmt_bytes(plan[key])))
+        for name, val in plan[key + '_parts'].items():
+            lines.append("    {:<16} {:>12}".format(name, _fmt_bytes(val)))
+    lines.append("Memory per node: {}".format(_fmt_bytes(plan['mem_per_node'])))
+    if not plan['fits']:
+        lines.append("WARNING: The simulation is not expected to fit in memory.")
+    lines.append("")
+    hours, rem = divmod(plan['runtime'], 3600)
+    lines.append("Estimated runtime: {:d}:{:02d}:{:04.1f}".format(
+        int(hours), int(rem // 60), rem % 60))
+    return '\n'.join(lines) + '\n'
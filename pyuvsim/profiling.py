@@ -3,16 +3,32 @@
 # Licensed under the 3-clause BSD License
 
 """
-Use the line profiler when requested.
+Use the line profiler or the sampling profiler when requested, and report per-phase timings.
+
+Also provides a memory monitor, which tracks memory usage over time on each rank,
+and live metrics, which report the progress of a running simulation to a file.
 """
 
 import atexit
+import datetime
+import json
+import os
+import resource
+import signal
+import socket
+import sys
+import threading
+import time
+import tracemalloc
 from inspect import isclass, isfunction
 from itertools import chain
 import warnings
 
+import numpy as np
 import pyuvsim as _pyuvsim
 import pyradiosky as _pyradiosky
+from . import timing
+from . import utils as simutils
 try:
     from . import mpi
 except ImportError:
@@ -118,3 +134,1213 @@ def set_profiler(func_list=default_profile_funcs, rank=0, outfile_prefix='time_p
 
 def get_profiler():  # pragma: nocover
     return prof
+
+
+def _get_rank_info():
+    """Get the rank and number of processes, whether or not MPI is available/started."""
+    if mpi is None or mpi.world_comm is None:
+        return 0, 1
+    return mpi.get_rank(), mpi.get_Npus()
+
+
+def write_phase_timings(outfile_prefix):
+    """
+    Write out the phase timings from all ranks, and merge them on the root process.
+
+    Every rank writes its own phase timings (see :mod:`pyuvsim.timing`) to
+    <outfile_prefix>_rank<N>.json. The root process then merges these files into
+    a table of the min/mean/max time spent in each phase across ranks, written to
+    <outfile_prefix>_summary.out. Any other statistics recorded on the phase timer
+    (e.g., spline cache hits and misses) are merged into a second table.
+
+    This must be called from all ranks if MPI has been started.
+
+    Parameters
+    ----------
+    outfile_prefix: str
+        Filename prefix for the timing files.
+
+    Returns
+    -------
+    dict or None
+        The merged timings (see :func:`merge_phase_timings`) on the root process.
+        None on other processes.
+    """
+    if outfile_prefix.endswith(".out"):
+        outfile_prefix = outfile_prefix[:-4]    # Strip extension
+
+    rank, Npus = _get_rank_info()
+
+    rank_data = {
+        'rank': rank,
+        'Npus': Npus,
+        'hostname': socket.gethostname(),
+        'phases': timing.phase_timer.to_dict(),
+        'stats': timing.phase_timer.stats,
+    }
+    with open("{}_rank{:d}.json".format(outfile_prefix, rank), 'w') as jfile:
+        json.dump(rank_data, jfile, indent=1)
+
+    if Npus > 1:
+        mpi.world_comm.Barrier()
+
+    if rank != 0:
+        return None
+
+    files = ["{}_rank{:d}.json".format(outfile_prefix, rr) for rr in range(Npus)]
+    summary = merge_phase_timings(files)
+    stats = merge_stats(files)
+    with open(outfile_prefix + '_summary.out', 'w') as ofile:
+        ofile.write(format_phase_table(summary))
+        if len(stats) > 0:
+            ofile.write('\n' + format_stats_table(stats))
+
+    return summary
+
+
+def merge_phase_timings(files):
+    """
+    Merge per-rank phase timing files.
+
+    Parameters
+    ----------
+    files: list of str
+        Paths to per-rank json files written by :func:`write_phase_timings`.
+
+    Returns
+    -------
+    dict
+        Keys are phase names, in order of first appearance. Values are dictionaries with:
+        - Nranks: Number of ranks that ran this phase.
+        - calls: Total number of times the phase was entered, summed over ranks.
+        - min, mean, max: Statistics of the total time spent in this phase on each rank.
+        - category: One of "compute", "comm", "io", or "other".
+    """
+    per_phase = {}
+    calls = {}
+    for fname in files:
+        with open(fname, 'r') as jfile:
+            rank_data = json.load(jfile)
+        for name, vals in rank_data['phases'].items():
+            per_phase.setdefault(name, []).append(vals['total'])
+            calls[name] = calls.get(name, 0) + vals['count']
+
+    summary = {}
+    for name, totals in per_phase.items():
+        summary[name] = {
+            'Nranks': len(totals),
+            'calls': calls[name],
+            'min': float(np.min(totals)),
+            'mean': float(np.mean(totals)),
+            'max': float(np.max(totals)),
+            'category': timing.get_phase_category(name)
+        }
+    return summary
+
+
+def merge_stats(files):
+    """
+    Merge the statistics recorded on the phase timers of each rank.
+
+    Parameters
+    ----------
+    files: list of str
+        Paths to per-rank json files written by :func:`write_phase_timings`.
+
+    Returns
+    -------
+    dict
+        Keys are "<name>.<statistic>" (e.g. "spline_cache.hits"), in order of first
+        appearance. Values are dictionaries with:
+        - Nranks: Number of ranks that recorded this statistic.
+        - min, mean, max, total: Statistics of the values across ranks.
+    """
+    per_stat = {}
+    for fname in files:
+        with open(fname, 'r') as jfile:
+            rank_data = json.load(jfile)
+        for name, values in rank_data.get('stats', {}).items():
+            for key, val in values.items():
+                per_stat.setdefault(name + '.' + key, []).append(val)
+
+    return {
+        name: {'Nranks': len(vals), 'min': float(np.min(vals)), 'mean': float(np.mean(vals)),
+               'max': float(np.max(vals)), 'total': float(np.sum(vals))}
+        for name, vals in per_stat.items()
+    }
+
+
+def format_stats_table(stats):
+    """
+    Format merged statistics as a human-readable table.
+
+    Parameters
+    ----------
+    stats: dict
+        Merged statistics, as returned by :func:`merge_stats`.
+
+    Returns
+    -------
+    str
+    """
+    header = "{:<28} {:>6} {:>12} {:>12} {:>12} {:>12}\n".format(
+        "Statistic", "Nranks", "Min", "Mean", "Max", "Total"
+    )
+    lines = [header, '-' * (len(header) - 1) + '\n']
+    for name, vals in stats.items():
+        lines.append("{:<28} {:>6d} {:>12.4g} {:>12.4g} {:>12.4g} {:>12.4g}\n".format(
+            name, vals['Nranks'], vals['min'], vals['mean'], vals['max'], vals['total']
+        ))
+    return ''.join(lines)
+
+
+def format_phase_table(summary):
+    """
+    Format merged phase timings as a human-readable table.
+
+    Sub-phases (with names like "<phase>.<subphase>") are indented below their parent,
+    and their times are included in the parent's time. The table is followed by the
+    share of time in each category, which shows whether the job is dominated by
+    computation, communication, or file I/O.
+
+    Parameters
+    ----------
+    summary: dict
+        Merged phase timings, as returned by :func:`merge_phase_timings`.
+
+    Returns
+    -------
+    str
+    """
+    header = "{:<28} {:<8} {:>6} {:>10} {:>12} {:>12} {:>12}\n".format(
+        "Phase", "Category", "Nranks", "Calls", "Min [s]", "Mean [s]", "Max [s]"
+    )
+    lines = [header, '-' * (len(header) - 1) + '\n']
+
+    # Order sub-phases below their parents.
+    top_level = [name for name in summary if '.' not in name]
+    ordered = []
+    for name in top_level:
+        ordered.append(name)
+        ordered.extend(sub for sub in summary if sub.startswith(name + '.'))
+    ordered.extend(name for name in summary if name not in ordered)
+
+    for name in ordered:
+        vals = summary[name]
+        label = name if '.' not in name else '  ' + name
+        lines.append("{:<28} {:<8} {:>6d} {:>10d} {:>12.3f} {:>12.3f} {:>12.3f}\n".format(
+            label, vals['category'], vals['Nranks'], vals['calls'],
+            vals['min'], vals['mean'], vals['max']
+        ))
+
+    # Share of time per category, using the slowest rank for each top-level phase.
+    cat_totals = {}
+    for name in top_level:
+        cat = summary[name]['category']
+        cat_totals[cat] = cat_totals.get(cat, 0.0) + summary[name]['max']
+    grand_total = sum(cat_totals.values())
+    if grand_total > 0:
+        lines.append('\nTime by category (max over ranks, top-level phases):\n')
+        for cat, tot in sorted(cat_totals.items(), key=lambda it: -it[1]):
+            lines.append("  {:<8} {:>12.3f} s  ({:5.1f}%)\n".format(
+                cat, tot, 100 * tot / grand_total))
+
+    return ''.join(lines)
+
+
+def set_tracer():
+    """
+    Start recording a timeline of events on this rank, for viewing in Perfetto or Chrome.
+
+    Records the simulation phases, sky chunk switches, beam interpolation calls, and
+    MPI collective operations. Write out the timeline with :func:`write_trace`.
+
+    Returns
+    -------
+    :class:`pyuvsim.timing.TraceRecorder`
+        The active trace recorder on this rank.
+    """
+    if mpi is not None:
+        mpi.start_mpi()
+    rank, _ = _get_rank_info()
+    return timing.start_tracing(
+        pid=rank, process_name="rank {:d} ({})".format(rank, socket.gethostname())
+    )
+
+
+def write_trace(outfile_prefix):
+    """
+    Write out the trace events from all ranks, and merge them on the root process.
+
+    Every rank writes its own events to <outfile_prefix>_rank<N>.trace.json. The root
+    process then merges them into <outfile_prefix>.trace.json, in the Chrome trace-event
+    format, with one track per rank. This file can be opened in https://ui.perfetto.dev
+    or chrome://tracing.
+
+    This must be called from all ranks if MPI has been started. Tracing is stopped.
+
+    Parameters
+    ----------
+    outfile_prefix: str
+        Filename prefix for the trace files.
+
+    Returns
+    -------
+    str or None
+        Path to the merged trace file on the root process. None on other processes.
+    """
+    if outfile_prefix.endswith(".json"):
+        outfile_prefix = outfile_prefix[:-5]    # Strip extension
+    if outfile_prefix.endswith(".trace"):
+        outfile_prefix = outfile_prefix[:-6]
+
+    rank, Npus = _get_rank_info()
+    recorder = timing.stop_tracing()
+    events = [] if recorder is None else recorder.events
+    with open("{}_rank{:d}.trace.json".format(outfile_prefix, rank), 'w') as jfile:
+        json.dump(events, jfile)
+
+    if Npus > 1:
+        mpi.world_comm.Barrier()
+
+    if rank != 0:
+        return None
+
+    files = ["{}_rank{:d}.trace.json".format(outfile_prefix, rr) for rr in range(Npus)]
+    outfile_name = outfile_prefix + '.trace.json'
+    merge_traces(files, outfile_name)
+
+    return outfile_name
+
+
+def merge_traces(files, outfile_name):
+    """
+    Merge per-rank trace event files into a single Chrome trace-event file.
+
+    Timestamps are shifted so that the earliest event across all ranks is at zero.
+
+    Parameters
+    ----------
+    files: list of str
+        Paths to per-rank json files written by :func:`write_trace`.
+    outfile_name: str
+        Path to the merged output file.
+
+    Returns
+    -------
+    dict
+        The merged trace, with the list of events under "traceEvents".
+    """
+    events = []
+    for fname in files:
+        with open(fname, 'r') as jfile:
+            events.extend(json.load(jfile))
+
+    timestamps = [ev['ts'] for ev in events if 'ts' in ev]
+    t0 = min(timestamps) if len(timestamps) > 0 else 0
+    for ev in events:
+        if 'ts' in ev:
+            ev['ts'] -= t0
+
+    trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    with open(outfile_name, 'w') as jfile:
+        json.dump(trace, jfile)
+
+    return trace
+
+
+class StackSampler:
+    """
+    Statistical profiler that periodically records the Python call stack.
+
+    A timer signal interrupts the process at the requested frequency, and the stack of
+    the main thread is recorded in collapsed form ("outer;...;inner"). Unlike the line
+    profiler, this covers all Python code, at an overhead set by the sampling frequency.
+
+    Signals are only handled between Python bytecodes, so a long call into compiled code
+    (e.g. numpy or MPI) delays the sample until it returns. Each sample is therefore
+    weighted by the time elapsed since the previous one, so that long calls are not
+    under-counted. The time is attributed to the calling Python function.
+
+    Parameters
+    ----------
+    frequency : float
+        Sampling frequency in Hz.
+    clock : str
+        Either "cpu", to sample on process CPU time (SIGPROF), or "wall", to sample
+        on wall-clock time (SIGALRM). With "cpu", time spent idle (e.g. sleeping) is
+        not sampled, and time in multi-threaded code (e.g. BLAS) is summed over
+        threads. MPI implementations usually busy-wait, so waiting on other ranks is
+        captured either way.
+
+    Attributes
+    ----------
+    samples : dict
+        Number of samples (weighted as described above) for each collapsed stack.
+    """
+
+    _clocks = {
+        'cpu': (signal.ITIMER_PROF, signal.SIGPROF, time.process_time),
+        'wall': (signal.ITIMER_REAL, signal.SIGALRM, time.perf_counter),
+    }
+
+    def __init__(self, frequency=100., clock='cpu'):
+        if clock not in self._clocks:
+            raise ValueError("clock must be one of {}".format(list(self._clocks.keys())))
+        if frequency <= 0:
+            raise ValueError("frequency must be positive.")
+        self.frequency = float(frequency)
+        self.interval = 1. / self.frequency
+        self.clock = clock
+        self.samples = {}
+        self._labels = {}
+        self._last = None
+        self._old_handler = None
+
+    def _label(self, code):
+        try:
+            return self._labels[code]
+        except KeyError:
+            label = "{}:{}".format(os.path.basename(code.co_filename), code.co_name)
+            label = label.replace(';', ':')
+            self._labels[code] = label
+            return label
+
+    def _handler(self, signum, frame):
+        if frame is not None and frame.f_code is self._handler.__code__:
+            # Interrupted while recording the previous sample.
+            return
+        now = self._clocks[self.clock][2]()
+        weight = max(int(round((now - self._last) * self.frequency)), 1)
+        self._last = now
+
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        key = ';'.join(reversed(stack))
+        self.samples[key] = self.samples.get(key, 0) + weight
+
+    def start(self):
+        """Start sampling. Must be called from the main thread."""
+        which, signum, now = self._clocks[self.clock]
+        self._last = now()
+        self._old_handler = signal.signal(signum, self._handler)
+        # Restart interrupted system calls, rather than raising errors in MPI or I/O.
+        signal.siginterrupt(signum, False)
+        signal.setitimer(which, self.interval, self.interval)
+
+    def stop(self):
+        """Stop sampling."""
+        which, signum, _ = self._clocks[self.clock]
+        signal.setitimer(which, 0, 0)
+        if self._old_handler is not None:
+            signal.signal(signum, self._old_handler)
+            self._old_handler = None
+
+    def write_collapsed(self, filename):
+        """
+        Write samples in the collapsed stack format used by flamegraph tools.
+
+        Each line has the form "outer;...;inner <count>".
+        """
+        with open(filename, 'w') as cfile:
+            for stack, count in sorted(self.samples.items()):
+                cfile.write("{} {:d}\n".format(stack, count))
+
+
+sampler = None
+
+
+def set_sampler(frequency=100., clock='cpu'):
+    """
+    Start the sampling profiler on this rank.
+
+    Run this on all ranks, and write out the results with :func:`write_samples`.
+
+    Parameters
+    ----------
+    frequency : float
+        Sampling frequency in Hz.
+    clock : str
+        Either "cpu" or "wall". See :class:`StackSampler`.
+
+    Returns
+    -------
+    StackSampler
+        The running sampler.
+    """
+    global sampler
+
+    if mpi is not None:
+        mpi.start_mpi()
+    if sampler is not None:
+        sampler.stop()
+    sampler = StackSampler(frequency=frequency, clock=clock)
+    sampler.start()
+    return sampler
+
+
+def write_samples(outfile_prefix):
+    """
+    Stop the sampling profiler, write out samples from all ranks, and merge them.
+
+    Every rank writes its samples to <outfile_prefix>_rank<N>.collapsed. The root process
+    then writes the samples summed over ranks to <outfile_prefix>.collapsed, which can be
+    passed to flamegraph.pl or loaded in speedscope, and a table of the time in each
+    function across ranks (see :func:`format_sample_table`) to <outfile_prefix>_frames.out.
+
+    This must be called from all ranks if MPI has been started.
+
+    Parameters
+    ----------
+    outfile_prefix: str
+        Filename prefix for the sample files.
+
+    Returns
+    -------
+    dict or None
+        The merged samples (see :func:`merge_samples`) on the root process.
+        None on other processes.
+    """
+    global sampler
+
+    if outfile_prefix.endswith(".collapsed"):
+        outfile_prefix = outfile_prefix[:-10]   # Strip extension
+
+    rank, Npus = _get_rank_info()
+    if sampler is None:
+        raise ValueError("The sampling profiler has not been started. Run set_sampler first.")
+    sampler.stop()
+    frequency = sampler.frequency
+    sampler.write_collapsed("{}_rank{:d}.collapsed".format(outfile_prefix, rank))
+    sampler = None
+
+    if Npus > 1:
+        mpi.world_comm.Barrier()
+
+    if rank != 0:
+        return None
+
+    files = ["{}_rank{:d}.collapsed".format(outfile_prefix, rr) for rr in range(Npus)]
+    merged = merge_samples(files)
+    with open(outfile_prefix + '.collapsed', 'w') as cfile:
+        for stack, counts in merged.items():
+            cfile.write("{} {:d}\n".format(stack, int(np.sum(counts))))
+    with open(outfile_prefix + '_frames.out', 'w') as ofile:
+        ofile.write(format_sample_table(merged, frequency=frequency))
+
+    return merged
+
+
+def read_collapsed(filename):
+    """
+    Read a file in the collapsed stack format.
+
+    Returns
+    -------
+    dict
+        Keys are collapsed stacks, values are sample counts.
+    """
+    samples = {}
+    with open(filename, 'r') as cfile:
+        for line in cfile:
+            line = line.strip()
+            if line == '':
+                continue
+            stack, count = line.rsplit(' ', 1)
+            samples[stack] = samples.get(stack, 0) + int(count)
+    return samples
+
+
+def merge_samples(files):
+    """
+    Merge per-rank sample files.
+
+    Parameters
+    ----------
+    files: list of str
+        Paths to per-rank collapsed stack files written by :func:`write_samples`.
+
+    Returns
+    -------
+    dict
+        Keys are collapsed stacks, values are arrays of sample counts on each rank
+        (in the order of `files`).
+    """
+    merged = {}
+    for ri, fname in enumerate(files):
+        for stack, count in read_collapsed(fname).items():
+            if stack not in merged:
+                merged[stack] = np.zeros(len(files), dtype=int)
+            merged[stack][ri] += count
+    return merged
+
+
+def frame_stats(merged):
+    """
+    Get statistics over ranks of the number of samples in each function.
+
+    Counts are inclusive, meaning that samples in functions called by a function
+    are included in its count.
+
+    Parameters
+    ----------
+    merged: dict
+        Merged samples, as returned by :func:`merge_samples`.
+
+    Returns
+    -------
+    dict
+        Keys are function labels ("file:function"). Values are dictionaries with
+        "min", "mean", "max", and "std" of the sample counts across ranks and
+        "self", the mean number of samples with the function at the top of the stack.
+        Sorted by decreasing mean.
+    """
+    if len(merged) == 0:
+        return {}
+    Nranks = len(next(iter(merged.values())))
+    inclusive = {}
+    own = {}
+    for stack, counts in merged.items():
+        frames = stack.split(';')
+        # Only count recursive functions once per stack.
+        for frame in dict.fromkeys(frames):
+            if frame not in inclusive:
+                inclusive[frame] = np.zeros(Nranks, dtype=int)
+            inclusive[frame] += counts
+        own[frames[-1]] = own.get(frames[-1], 0) + counts
+
+    stats = {}
+    for frame, counts in sorted(inclusive.items(), key=lambda it: -np.mean(it[1])):
+        stats[frame] = {
+            'min': int(np.min(counts)),
+            'mean': float(np.mean(counts)),
+            'max': int(np.max(counts)),
+            'std': float(np.std(counts)),
+            'self': float(np.mean(own.get(frame, 0))),
+        }
+    return stats
+
+
+def format_sample_table(merged, frequency=None, Nrows=50):
+    """
+    Format merged samples as a table of the most expensive functions.
+
+    A large spread across ranks for a function points to load imbalance.
+
+    Parameters
+    ----------
+    merged: dict
+        Merged samples, as returned by :func:`merge_samples`.
+    frequency: float
+        Sampling frequency in Hz. If given, sample counts are converted to seconds.
+    Nrows: int
+        Maximum number of functions to list.
+
+    Returns
+    -------
+    str
+    """
+    stats = frame_stats(merged)
+    scale = 1.0 if frequency is None else 1.0 / frequency
+    unit = 'samples' if frequency is None else 's'
+    Nranks = 0 if len(merged) == 0 else len(next(iter(merged.values())))
+
+    header = "{:<60} {:>10} {:>10} {:>10} {:>10} {:>10}\n".format(
+        "Function (inclusive, {} ranks)".format(Nranks), "Min", "Mean", "Max",
+        "Std", "Self"
+    )
+    lines = ["Units: {}\n".format(unit), header, '-' * (len(header) - 1) + '\n']
+    for frame, vals in list(stats.items())[:Nrows]:
+        lines.append("{:<60} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}\n".format(
+            frame[-60:], vals['min'] * scale, vals['mean'] * scale, vals['max'] * scale,
+            vals['std'] * scale, vals['self'] * scale
+        ))
+    return ''.join(lines)
+
+
+class MemoryMonitor:
+    """
+    Track the memory usage of this process over time.
+
+    A background thread samples the resident memory (RSS), the peak RSS so far, and the
+    size of the shared memory windows on this node at a fixed interval. Samples are also
+    taken at the start and end of every phase on the module phase timer (see
+    :mod:`pyuvsim.timing`), and each sample is tagged with the phase that was running
+    just before it. The growth of the peak RSS between samples shows which phase set
+    the high-water mark.
+
+    Optionally, tracemalloc is used to record the source lines holding the most
+    memory at the end of each top-level phase. This slows down allocations considerably.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between samples from the background thread.
+    trace_allocations : bool
+        Use tracemalloc to attribute memory to source lines.
+    Ntop : int
+        Number of source lines to record for each phase, if tracing allocations.
+
+    Attributes
+    ----------
+    samples : list of dict
+        Each has keys "time" (seconds since start), "rss" and "maxrss" (bytes),
+        "shared" (bytes in shared memory windows on the node), and "phase".
+    allocators : dict
+        Keys are top-level phase names, values are lists of dicts with keys "location",
+        "size" (bytes), and "count" for the top source lines, and the key "peak" (bytes)
+        for the peak traced memory during the phase.
+    """
+
+    def __init__(self, interval=1.0, trace_allocations=False, Ntop=10):
+        self.interval = interval
+        self.trace_allocations = trace_allocations
+        self.Ntop = Ntop
+        self.samples = []
+        self.allocators = {}
+        self._t0 = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        # On linux, getrusage returns in kiB. On Mac systems, getrusage returns in B.
+        self._maxrss_scale = 2**10 if 'linux' in sys.platform else 1
+
+    def sample(self, phase=None):
+        """
+        Record the current memory usage.
+
+        Parameters
+        ----------
+        phase : str
+            Phase to tag the sample with. Defaults to the current phase.
+        """
+        if phase is None:
+            phase = timing.phase_timer.current_phase
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * self._maxrss_scale
+        shared = 0 if mpi is None else mpi.shared_mem_allocated
+        self.samples.append({
+            'time': time.perf_counter() - self._t0,
+            'rss': simutils.get_current_rss(),
+            'maxrss': maxrss,
+            'shared': shared,
+            'phase': phase,
+        })
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def on_phase(self, event, name):
+        """Listener for the phase timer, sampling at every phase boundary."""
+        # Tag the sample with the phase that was running up to now.
+        if event == 'start':
+            stack = timing.phase_timer._stack
+            self.sample(phase=stack[-2][0] if len(stack) > 1 else '(none)')
+        else:
+            self.sample(phase=name)
+        if not self.trace_allocations or '.' in name:
+            return
+        if event == 'start':
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        # Leave out the memory used by the monitor itself.
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, threading.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '*/psutil/*'),
+        ])
+        stats = snapshot.statistics('lineno')[:self.Ntop]
+        self.allocators[name] = {
+            'peak': peak,
+            'top': [{'location': str(stat.traceback), 'size': stat.size, 'count': stat.count}
+                    for stat in stats],
+        }
+
+    def start(self):
+        """Start monitoring."""
+        self._t0 = time.perf_counter()
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        timing.phase_timer.listeners.append(self.on_phase)
+        self.sample()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop monitoring."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        timing.phase_timer.listeners.remove(self.on_phase)
+        self.sample()
+        if self.trace_allocations:
+            tracemalloc.stop()
+
+    def phase_peaks(self):
+        """
+        Summarize the samples by phase.
+
+        Returns
+        -------
+        dict
+            Keys are phase names, in order of first appearance. Values are dicts with
+            "rss": the largest sampled RSS, "maxrss_growth": how much the peak RSS grew
+            during the phase, and "shared": the largest shared window usage (all in bytes).
+        """
+        peaks = {}
+        prev_maxrss = self.samples[0]['maxrss'] if len(self.samples) > 0 else 0
+        for smp in self.samples:
+            name = '(none)' if smp['phase'] is None else smp['phase']
+            entry = peaks.setdefault(name, {'rss': 0, 'maxrss_growth': 0, 'shared': 0})
+            entry['rss'] = max(entry['rss'], smp['rss'])
+            entry['shared'] = max(entry['shared'], smp['shared'])
+            entry['maxrss_growth'] += smp['maxrss'] - prev_maxrss
+            prev_maxrss = smp['maxrss']
+        return peaks
+
+
+monitor = None
+
+
+def set_memory_monitor(interval=1.0, trace_allocations=False, Ntop=10):
+    """
+    Start the memory monitor on this rank.
+
+    Run this on all ranks, and write out the results with :func:`write_memory_timeline`.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between memory samples.
+    trace_allocations : bool
+        Use tracemalloc to find the source lines holding the most memory after each phase.
+        This slows down the simulation.
+    Ntop : int
+        Number of source lines to record per phase, if tracing allocations.
+
+    Returns
+    -------
+    MemoryMonitor
+        The running memory monitor.
+    """
+    global monitor
+
+    if mpi is not None:
+        mpi.start_mpi()
+    if monitor is not None:
+        monitor.stop()
+    monitor = MemoryMonitor(interval=interval, trace_allocations=trace_allocations, Ntop=Ntop)
+    monitor.start()
+    return monitor
+
+
+def write_memory_timeline(outfile_prefix):
+    """
+    Stop the memory monitor, write out the timelines from all ranks, and summarize them.
+
+    Every rank writes its samples to <outfile_prefix>_rank<N>.memory.json. The root
+    process then writes a table of the peak memory in each phase across ranks and
+    nodes to <outfile_prefix>_memory.out.
+
+    This must be called from all ranks if MPI has been started.
+
+    Parameters
+    ----------
+    outfile_prefix: str
+        Filename prefix for the memory files.
+
+    Returns
+    -------
+    dict or None
+        The merged summary (see :func:`merge_memory_timelines`) on the root process.
+        None on other processes.
+    """
+    global monitor
+
+    if outfile_prefix.endswith(".out"):
+        outfile_prefix = outfile_prefix[:-4]    # Strip extension
+
+    rank, Npus = _get_rank_info()
+    if monitor is None:
+        raise ValueError("The memory monitor has not been started. "
+                         "Run set_memory_monitor first.")
+    monitor.stop()
+
+    rank_data = {
+        'rank': rank,
+        'Npus': Npus,
+        'hostname': socket.gethostname(),
+        'samples': monitor.samples,
+        'phases': monitor.phase_peaks(),
+        'allocators': monitor.allocators,
+    }
+    monitor = None
+    with open("{}_rank{:d}.memory.json".format(outfile_prefix, rank), 'w') as jfile:
+        json.dump(rank_data, jfile, indent=1)
+
+    if Npus > 1:
+        mpi.world_comm.Barrier()
+
+    if rank != 0:
+        return None
+
+    files = ["{}_rank{:d}.memory.json".format(outfile_prefix, rr) for rr in range(Npus)]
+    summary = merge_memory_timelines(files)
+    with open(outfile_prefix + '_memory.out', 'w') as ofile:
+        ofile.write(format_memory_table(summary))
+
+    return summary
+
+
+def merge_memory_timelines(files):
+    """
+    Merge per-rank memory timelines.
+
+    Parameters
+    ----------
+    files: list of str
+        Paths to per-rank json files written by :func:`write_memory_timeline`.
+
+    Returns
+    -------
+    dict
+        - phases: Keys are phase names, values are dicts with the min/mean/max over ranks
+          of the peak RSS in the phase ("rss_min", "rss_mean", "rss_max"), the largest
+          sum of per-rank peaks on any node ("node_rss"), the growth of the peak RSS
+          summed over ranks ("maxrss_growth"), and the largest shared memory usage
+          on any node ("shared").
+        - Nnodes: Number of distinct hosts.
+        - top_rank: Rank with the largest peak RSS.
+        - allocators: Top allocators on that rank, if recorded.
+    """
+    per_phase = {}
+    node_phase = {}
+    peak_rss = {}
+    allocators = {}
+    for fname in files:
+        with open(fname, 'r') as jfile:
+            rank_data = json.load(jfile)
+        rank = rank_data['rank']
+        host = rank_data['hostname']
+        allocators[rank] = rank_data['allocators']
+        peak_rss[rank] = max([smp['maxrss'] for smp in rank_data['samples']], default=0)
+        for name, vals in rank_data['phases'].items():
+            entry = per_phase.setdefault(name, {'rss': [], 'maxrss_growth': 0, 'shared': 0})
+            entry['rss'].append(vals['rss'])
+            entry['maxrss_growth'] += vals['maxrss_growth']
+            entry['shared'] = max(entry['shared'], vals['shared'])
+            node_entry = node_phase.setdefault(name, {})
+            node_entry[host] = node_entry.get(host, 0) + vals['rss']
+
+    phases = {}
+    for name, entry in per_phase.items():
+        phases[name] = {
+            'rss_min': int(np.min(entry['rss'])),
+            'rss_mean': float(np.mean(entry['rss'])),
+            'rss_max': int(np.max(entry['rss'])),
+            'node_rss': int(max(node_phase[name].values())),
+            'maxrss_growth': int(entry['maxrss_growth']),
+            'shared': int(entry['shared']),
+        }
+
+    top_rank = max(peak_rss, key=peak_rss.get) if len(peak_rss) > 0 else 0
+    Nnodes = len(set(host for entry in node_phase.values() for host in entry))
+    return {'phases': phases, 'Nnodes': Nnodes, 'top_rank': top_rank,
+            'allocators': allocators.get(top_rank, {})}
+
+
+def format_memory_table(summary):
+    """
+    Format merged memory timelines as a human-readable table.
+
+    Parameters
+    ----------
+    summary: dict
+        Merged memory summary, as returned by :func:`merge_memory_timelines`.
+
+    Returns
+    -------
+    str
+    """
+    GiB = 2.0**30
+    header = "{:<28} {:>10} {:>10} {:>10} {:>10} {:>12} {:>10}\n".format(
+        "Phase", "Min RSS", "Mean RSS", "Max RSS", "Node RSS", "Peak growth", "Shared"
+    )
+    lines = ["Peak memory by phase, in GiB ({:d} nodes). Node RSS is the sum over ranks on "
+             "the busiest node;\nPeak growth is the increase of the high-water mark, "
+             "summed over ranks.\n\n".format(summary['Nnodes']),
+             header, '-' * (len(header) - 1) + '\n']
+    for name, vals in summary['phases'].items():
+        lines.append("{:<28} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>12.3f} {:>10.3f}\n".format(
+            name, vals['rss_min'] / GiB, vals['rss_mean'] / GiB, vals['rss_max'] / GiB,
+            vals['node_rss'] / GiB, vals['maxrss_growth'] / GiB, vals['shared'] / GiB
+        ))
+
+    if len(summary['allocators']) > 0:
+        lines.append("\nTop allocators on rank {:d} (the rank with the largest peak RSS), "
+                     "at the end of each phase:\n".format(summary['top_rank']))
+        for name, vals in summary['allocators'].items():
+            lines.append("  {} (traced peak {:.3f} GiB):\n".format(name, vals['peak'] / GiB))
+            for stat in vals['top']:
+                lines.append("    {:>10.3f} GiB {:>10d} blocks  {}\n".format(
+                    stat['size'] / GiB, stat['count'], stat['location']))
+
+    return ''.join(lines)
+
+
+class LiveMetrics:
+    """
+    Periodically write a snapshot of the progress of a simulation to a file.
+
+    Each rank posts its progress (tasks done, current sky chunk, and RSS) to the root
+    process at most once per `interval` seconds, using one-sided communication, so
+    that no rank waits on another. A background thread on the root process writes
+    out a snapshot every `interval` seconds, including the overall throughput, an
+    estimated time to completion, and the total RSS on each node.
+
+    Set this up with :func:`set_live_metrics` on all ranks, before the simulation.
+
+    Parameters
+    ----------
+    outfile_name : str
+        File to write the metrics to, on the root process.
+    interval : float
+        Seconds between updates.
+    file_format : str
+        Either "jsonl", to append one JSON object per line for each snapshot, or
+        "prometheus", to overwrite the file with each snapshot in the Prometheus text
+        exposition format (e.g. for the textfile collector of the node exporter).
+        Defaults to "prometheus" if `outfile_name` ends in ".prom", "jsonl" otherwise.
+    """
+
+    # Order of values in each rank's row of the status board.
+    _fields = ['tasks_done', 'Ntasks', 'sky_chunk', 'Nsky_chunks', 'rss', 'elapsed', 'posted']
+
+    def __init__(self, outfile_name, interval=60., file_format=None):
+        if file_format is None:
+            file_format = 'prometheus' if outfile_name.endswith('.prom') else 'jsonl'
+        if file_format not in ['jsonl', 'prometheus']:
+            raise ValueError("file_format must be 'jsonl' or 'prometheus'.")
+        self.outfile_name = outfile_name
+        self.interval = interval
+        self.file_format = file_format
+        self.board = None
+        self.hostnames = None
+        self._root_row = None
+        self._row_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._t0 = None
+        self._last_post = None
+
+    def start(self, Ntasks, Nsky_chunks):
+        """
+        Start reporting at the start of the task loop. Must be called on all ranks.
+
+        Parameters
+        ----------
+        Ntasks : int
+            Number of tasks to be run on this rank.
+        Nsky_chunks : int
+            Number of sky chunks.
+        """
+        rank, _ = _get_rank_info()
+        self.Ntasks = Ntasks
+        self.Nsky_chunks = Nsky_chunks
+        self.board = mpi.StatusBoard(len(self._fields))
+        self.hostnames = mpi.world_comm.gather(socket.gethostname(), root=0)
+        self._t0 = time.perf_counter()
+        self._last_post = -np.inf
+        self.update(0, 0, force=True)
+        if rank == 0:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def update(self, tasks_done, sky_chunk, force=False, Ntasks=None, Nsky_chunks=None):
+        """
+        Report progress from this rank. This is cheap unless an update is due.
+
+        Parameters
+        ----------
+        tasks_done : int
+            Number of tasks completed on this rank.
+        sky_chunk : int
+            Index of the sky chunk in use.
+        force : bool
+            Post the update even if one was posted less than `interval` seconds ago.
+        Ntasks : int
+            Updated number of tasks to be run on this rank, if it has changed
+            (e.g., because the sky chunk size was adapted).
+        Nsky_chunks : int
+            Updated number of sky chunks, if it has changed.
+        """
+        if Ntasks is not None:
+            self.Ntasks = Ntasks
+        if Nsky_chunks is not None:
+            self.Nsky_chunks = Nsky_chunks
+        now = time.perf_counter()
+        if not force and now - self._last_post < self.interval:
+            return
+        self._last_post = now
+        row = [tasks_done, self.Ntasks, sky_chunk, self.Nsky_chunks,
+               simutils.get_current_rss(), now - self._t0, 1]
+        if self.board.rank == self.board.board_rank:
+            # The writer thread reads the board on this rank, so keep this row locally.
+            with self._row_lock:
+                self._root_row = row
+        else:
+            self.board.post(row)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write_snapshot()
+
+    def stop(self):
+        """Write the final snapshot and stop reporting. Must be called on all ranks."""
+        mpi.world_comm.Barrier()
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+            self.write_snapshot()
+        mpi.world_comm.Barrier()
+        self.board.free()
+        self.board = None
+
+    def snapshot(self):
+        """
+        Collect the current progress of all ranks. Only valid on the root process.
+
+        Returns
+        -------
+        dict
+            Keys are "time" (ISO format), "tasks_done", "Ntasks", "fraction_done",
+            "throughput" (tasks per second over all ranks, since the start), "eta"
+            (seconds, estimated from the slowest rank, or None until there is enough
+            information), "ranks" (per-rank progress), and "nodes" (RSS summed over the
+            ranks on each host, in bytes).
+        """
+        table = self.board.read()
+        with self._row_lock:
+            table[self.board.board_rank] = self._root_row
+        rows = [dict(zip(self._fields, row)) for row in table]
+
+        elapsed = time.perf_counter() - self._t0
+        eta = 0.0
+        nodes = {}
+        for rank, row in enumerate(rows):
+            host = self.hostnames[rank]
+            nodes[host] = nodes.get(host, 0) + int(row['rss'])
+            remaining = row['Ntasks'] - row['tasks_done']
+            if remaining == 0 and row['posted'] > 0:
+                continue
+            if row['tasks_done'] == 0 or eta is None:
+                # No estimate until every rank with work left has finished a task.
+                eta = None
+                continue
+            rate = row['tasks_done'] / row['elapsed']
+            # Allow for the time since this rank last posted.
+            eta = max(eta, remaining / rate - (elapsed - row['elapsed']), 0.0)
+
+        tasks_done = int(sum(row['tasks_done'] for row in rows))
+        Ntasks = int(sum(row['Ntasks'] for row in rows))
+        return {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'tasks_done': tasks_done,
+            'Ntasks': Ntasks,
+            'fraction_done': tasks_done / Ntasks if Ntasks > 0 else 1.0,
+            'throughput': tasks_done / elapsed if elapsed > 0 else 0.0,
+            'eta': eta,
+            'ranks': [{'rank': rank, 'host': self.hostnames[rank],
+                       'tasks_done': int(row['tasks_done']), 'Ntasks': int(row['Ntasks']),
+                       'sky_chunk': int(row['sky_chunk']), 'Nsky_chunks': int(row['Nsky_chunks']),
+                       'rss': int(row['rss'])}
+                      for rank, row in enumerate(rows)],
+            'nodes': nodes,
+        }
+
+    def write_snapshot(self):
+        """Write out the current progress. Only valid on the root process."""
+        snap = self.snapshot()
+        if self.file_format == 'jsonl':
+            with open(self.outfile_name, 'a') as mfile:
+                mfile.write(json.dumps(snap) + '\n')
+            return
+
+        lines = []
+
+        def _metric(name, helpstr, values):
+            lines.append("# HELP pyuvsim_{} {}\n".format(name, helpstr))
+            lines.append("# TYPE pyuvsim_{} gauge\n".format(name))
+            for labels, value in values:
+                label_str = ','.join('{}="{}"'.format(k, v) for k, v in labels.items())
+                if label_str != '':
+                    label_str = '{' + label_str + '}'
+                lines.append("pyuvsim_{}{} {}\n".format(name, label_str, value))
+
+        ranks = snap['ranks']
+        _metric('tasks_done', 'Tasks completed on each rank.',
+                [({'rank': rr['rank']}, rr['tasks_done']) for rr in ranks])
+        _metric('tasks', 'Tasks assigned to each rank.',
+                [({'rank': rr['rank']}, rr['Ntasks']) for rr in ranks])
+        _metric('sky_chunk', 'Index of the sky chunk in use on each rank.',
+                [({'rank': rr['rank']}, rr['sky_chunk']) for rr in ranks])
+        _metric('sky_chunks', 'Number of sky chunks on each rank (may change as they adapt).',
+                [({'rank': rr['rank']}, rr['Nsky_chunks']) for rr in ranks])
+        _metric('rank_rss_bytes', 'Resident memory of each rank.',
+                [({'rank': rr['rank'], 'host': rr['host']}, rr['rss']) for rr in ranks])
+        _metric('node_rss_bytes', 'Resident memory summed over the ranks on each node.',
+                [({'host': host}, rss) for host, rss in snap['nodes'].items()])
+        _metric('fraction_done', 'Fraction of all tasks completed.',
+                [({}, snap['fraction_done'])])
+        _metric('throughput_tasks_per_second', 'Tasks completed per second, over all ranks.',
+                [({}, snap['throughput'])])
+        _metric('eta_seconds', 'Estimated seconds until all tasks are complete.',
+                [({}, 'NaN' if snap['eta'] is None else snap['eta'])])
+
+        # Replace the file in one step, so that readers never see a partial snapshot.
+        tmpname = self.outfile_name + '.tmp'
+        with open(tmpname, 'w') as mfile:
+            mfile.write(''.join(lines))
+        os.replace(tmpname, self.outfile_name)
+
+
+live_metrics = None
+
+
+def set_live_metrics(outfile_name, interval=60., file_format=None):
+    """
+    Report the progress of the next simulations to a file while they run.
+
+    This must be called on all ranks. See :class:`LiveMetrics` for details.
+
+    Parameters
+    ----------
+    outfile_name : str
+        File to write the metrics to, on the root process.
+    interval : float
+        Seconds between updates.
+    file_format : str
+        Either "jsonl" or "prometheus". Defaults to "prometheus" if `outfile_name`
+        ends in ".prom", "jsonl" otherwise.
+
+    Returns
+    -------
+    LiveMetrics
+    """
+    global live_metrics
+
+    if mpi is None:  # pragma: no cover
+        raise ImportError("You need mpi4py to use live metrics. Install it by running pip "
+                          "install pyuvsim[sim] or pip install pyuvsim[all].")
+    mpi.start_mpi()
+    live_metrics = LiveMetrics(outfile_name, interval=interval, file_format=file_format)
+    return live_metrics
@@ -1221,6 +1221,110 @@ def time_array_to_params(time_array):
     return tdict
 
 
+def parse_simulation_params(obs_params):
+    """
+    Get settings for running the simulation from the "simulation" section of a parameter file.
+
+    Recognized keys:
+        - max_mem_per_node: Memory ceiling per node, in GiB.
+        - adaptive_sky_chunks: Adapt the number of sources simulated at a time to the
+          measured memory use (False by default).
+        - beam_lookup: Evaluate UVBeams from lookup tables compiled at the simulation
+          frequencies. Either True, to use the default settings, or a dictionary of
+          keyword arguments for :meth:`pyuvsim.BeamList.compile_lookup_tables`
+          (resolution, kind, tolerance).
+        - power_beam: Simulate unpolarized skies with power beams instead of E-field
+          beams (False by default).
+        - spline_cache_mem: Memory budget for the UVBeam interpolation splines kept
+          on each process, in GiB.
+        - beam_cache_dir: Directory in which to save UVBeam responses, for reuse in
+          later runs.
+        - lazy_spectra: Evaluate the fluxes of "spectral_index" and "subband" catalogs
+          at each frequency in the engine, rather than for all frequencies up front
+          (False by default).
+        - task_order: Order of the task loop, either "auto" or the axes from the outer
+          to the inner loop (e.g., "freq,time,baseline").
+        - pipeline: Send the visibilities of each time to the root process as soon as
+          they are finished, and write them from a background thread, while the
+          simulation continues (False by default).
+        - phase_center: Simulate visibilities phased to this direction rather than
+          drift scans. Either "zenith" (zenith at the first time), or a dictionary
+          with the ICRS "ra" and "dec" in degrees.
+        - horizon_buffer: For arrays on the Earth, only simulate the sources that may
+          be above the horizon at each time, from their rise and set LSTs widened by
+          this angle in radians (off by default).
+
+    Parameters
+    ----------
+    obs_params: dict or str
+        Either an obs_param file name or a dictionary of parameters read in.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for :func:`pyuvsim.uvsim.run_uvdata_uvsim`.
+        Empty if there is no "simulation" section.
+    """
+    if isinstance(obs_params, str):
+        param_dict = _config_str_to_dict(obs_params)
+    else:
+        param_dict = obs_params
+    sim_params = param_dict.get('simulation', None)
+    if sim_params is None:
+        return {}
+
+    known_keys = ['max_mem_per_node', 'adaptive_sky_chunks', 'beam_lookup', 'power_beam',
+                  'spline_cache_mem', 'beam_cache_dir', 'lazy_spectra', 'task_order',
+                  'pipeline', 'phase_center', 'horizon_buffer']
+    unknown = [key for key in sim_params.keys() if key not in known_keys]
+    if len(unknown) > 0:
+        raise ValueError("Unrecognized simulation parameters: {}".format(', '.join(unknown)))
+
+    sim_kwargs = {}
+    if sim_params.get('max_mem_per_node', None) is not None:
+        sim_kwargs['max_mem_per_node'] = float(sim_params['max_mem_per_node']) * 2**30
+    if sim_params.get('spline_cache_mem', None) is not None:
+        sim_kwargs['spline_cache_mem'] = float(sim_params['spline_cache_mem']) * 2**30
+    if 'adaptive_sky_chunks' in sim_params:
+        sim_kwargs['adaptive_sky_chunks'] = bool(sim_params['adaptive_sky_chunks'])
+    if sim_params.get('beam_cache_dir', None) is not None:
+        sim_kwargs['beam_cache_dir'] = str(sim_params['beam_cache_dir'])
+    if 'power_beam' in sim_params:
+        sim_kwargs['power_beam'] = bool(sim_params['power_beam'])
+    if 'lazy_spectra' in sim_params:
+        sim_kwargs['lazy_spectra'] = bool(sim_params['lazy_spectra'])
+    if 'pipeline' in sim_params:
+        sim_kwargs['pipeline'] = bool(sim_params['pipeline'])
+    if sim_params.get('task_order', None) is not None:
+        sim_kwargs['task_order'] = str(sim_params['task_order'])
+    if sim_params.get('horizon_buffer', None) is not None:
+        sim_kwargs['horizon_buffer'] = float(sim_params['horizon_buffer'])
+    phase_center = sim_params.get('phase_center', None)
+    if phase_center == 'zenith':
+        sim_kwargs['phase_center'] = 'zenith'
+    elif isinstance(phase_center, dict):
+        if sorted(phase_center.keys()) != ['dec', 'ra']:
+            raise ValueError("phase_center must have the keys ra and dec.")
+        sim_kwargs['phase_center'] = SkyCoord(
+            ra=float(phase_center['ra']) * units.deg, dec=float(phase_center['dec']) * units.deg,
+            frame='icrs'
+        )
+    elif phase_center is not None:
+        raise ValueError("phase_center must be 'zenith' or a dictionary with ra and dec.")
+    beam_lookup = sim_params.get('beam_lookup', None)
+    if beam_lookup is True:
+        sim_kwargs['beam_lookup'] = {}
+    elif isinstance(beam_lookup, dict):
+        unknown = [key for key in beam_lookup.keys()
+                   if key not in ['resolution', 'kind', 'tolerance']]
+        if len(unknown) > 0:
+            raise ValueError("Unrecognized beam_lookup parameters: {}".format(', '.join(unknown)))
+        sim_kwargs['beam_lookup'] = dict(beam_lookup)
+    elif beam_lookup not in [None, False]:
+        raise ValueError("beam_lookup must be a boolean or a dictionary.")
+    return sim_kwargs
+
+
 def initialize_uvdata_from_params(obs_params):
     """
     Construct a uvdata object from parameters in a valid yaml file.
@@ -1575,6 +1679,63 @@ def initialize_uvdata_from_keywords(
     return uv_obj
 
 
+def _check_uvdata_template(uv_obj):
+    # The simulation assumes one spectral window, and every baseline at each time,
+    # with time as the slow axis of the baseline-times.
+    if uv_obj.Nspws != 1:
+        raise ValueError("Simulation templates must have a single spectral window.")
+    shape = (uv_obj.Ntimes, uv_obj.Nbls)
+    layout_error = ("Simulation templates must have every baseline at each time, "
+                    "ordered by time and then baseline.")
+    if uv_obj.Nblts != uv_obj.Ntimes * uv_obj.Nbls:
+        raise ValueError(layout_error)
+    times = uv_obj.time_array.reshape(shape)
+    bls = uv_obj.baseline_array.reshape(shape)
+    if not (np.all(times == times[:, :1]) and np.all(np.diff(times[:, 0]) > 0)
+            and np.all(bls == bls[:1])):
+        raise ValueError(layout_error)
+
+
+def read_uvdata_template(filename, **kwargs):
+    """
+    Read the metadata of a data file to use as the template of a simulation.
+
+    The visibilities, flags and nsamples are not read, which saves the time and
+    memory of reading large files whose data would be overwritten by the simulation.
+    Simulations always compute the XX, YY, XY and YX polarizations, which replace
+    those of the file.
+
+    Parameters
+    ----------
+    filename : str
+        File readable by :meth:`pyuvdata.UVData.read` without its data (e.g., uvfits
+        or uvh5 files).
+    kwargs
+        Selections to make, as keywords for :meth:`pyuvdata.UVData.select` (e.g., times
+        or freq_chans).
+
+    Returns
+    -------
+    :class:~`pyuvdata.UVData`
+        Metadata only object, for :func:`pyuvsim.uvsim.run_uvdata_uvsim` or
+        :func:`uvdata_to_config_file`.
+
+    Raises
+    ------
+    ValueError
+        If the file has more than one spectral window, or does not have every baseline
+        at each time, ordered by time and then baseline.
+    """
+    uv_obj = UVData()
+    uv_obj.read(filename, read_data=False)
+    if len(kwargs) > 0:
+        uv_obj.select(**kwargs)
+    _check_uvdata_template(uv_obj)
+    uv_obj.polarization_array = np.array([-5, -6, -7, -8])
+    uv_obj.Npols = 4
+    return uv_obj
+
+
 def uvdata_to_telescope_config(
         uvdata_in, beam_filepath, layout_csv_name=None, telescope_config_name=None,
         return_names=False, path_out='.'):
@@ -1666,7 +1827,8 @@ def uvdata_to_config_file(uvdata_in, param_filename=None, telescope_config_name=
         param_filename = os.path.basename(param_filename)
 
     freq_array = uvdata_in.freq_array[0, :]
-    time_array = uvdata_in.time_array
+    # One entry per time, rather than per baseline-time.
+    time_array = np.unique(uvdata_in.time_array)
     integration_time_array = np.array(uvdata_in.integration_time)
     if np.max(integration_time_array) != np.min(integration_time_array):
         warnings.warn('The integration time is not constant. Using the shortest integration time')
@@ -1698,7 +1860,7 @@ def uvdata_to_config_file(uvdata_in, param_filename=None, telescope_config_name=
         yaml.dump(param_dict, yfile, default_flow_style=False)
 
 
-def _complete_uvdata(uv_in, inplace=False):
+def _complete_uvdata(uv_in, inplace=False, lean=False, metadata_only=False):
     """Fill out all required parameters of a :class:~`pyuvdata.UVData` object such that
     it passes the :func:~`pyuvdata.UVData.check()`.
 
@@ -1709,7 +1871,15 @@ def _complete_uvdata(uv_in, inplace=False):
     uv_in : :class:~`pyuvdata.UVData` instance
         Usually an incomplete object, containing only metadata.
     inplace : bool, optional
-        Whether to perform the filling on the passed object, or a copy.
+        Whether to perform the filling on the passed object, or a copy. Copies
+        leave out the data, flag and nsample arrays of `uv_in`, which are overwritten.
+    lean : bool, optional
+        Only allocate the data array. The flag and nsample arrays (all False and
+        all 1) are read-only broadcasts of a single value, which take no memory
+        until they are copied (e.g., when written to file).
+    metadata_only : bool, optional
+        Leave out the data, flag and nsample arrays, e.g. to phase the object before
+        they are allocated with :func:`_init_uvdata_arrays`.
 
     Returns
     -------
@@ -1717,7 +1887,7 @@ def _complete_uvdata(uv_in, inplace=False):
         the modified input)
     """
     if not inplace:
-        uv_obj = copy.deepcopy(uv_in)
+        uv_obj = uv_in.copy(metadata_only=True)
     else:
         uv_obj = uv_in
 
@@ -1744,13 +1914,36 @@ def _complete_uvdata(uv_in, inplace=False):
         )
 
     # Clear existing data, if any.
-    _shape = (uv_obj.Nblts, uv_obj.Nspws, uv_obj.Nfreqs, uv_obj.Npols)
-    uv_obj.data_array = np.zeros(_shape, dtype=np.complex)
-    uv_obj.flag_array = np.zeros(_shape, dtype=bool)
-    uv_obj.nsample_array = np.ones(_shape, dtype=float)
+    if metadata_only:
+        uv_obj.data_array = None
+        uv_obj.flag_array = None
+        uv_obj.nsample_array = None
+    else:
+        _init_uvdata_arrays(uv_obj, lean=lean)
 
     uv_obj.extra_keywords = {}
 
     uv_obj.check()
 
     return uv_obj
+
+
+def _init_uvdata_arrays(uv_obj, lean=False):
+    """Set the data array of a :class:~`pyuvdata.UVData` object to zeros, with no flags
+    and nsamples of 1.
+
+    Arguments
+    ---------
+    uv_obj : :class:~`pyuvdata.UVData` instance
+        Object to modify.
+    lean : bool, optional
+        Only allocate the data array (see :func:`_complete_uvdata`).
+    """
+    _shape = (uv_obj.Nblts, uv_obj.Nspws, uv_obj.Nfreqs, uv_obj.Npols)
+    uv_obj.data_array = np.zeros(_shape, dtype=np.complex)
+    if lean:
+        uv_obj.flag_array = np.broadcast_to(False, _shape)
+        uv_obj.nsample_array = np.broadcast_to(1., _shape)
+    else:
+        uv_obj.flag_array = np.zeros(_shape, dtype=bool)
+        uv_obj.nsample_array = np.ones(_shape, dtype=float)
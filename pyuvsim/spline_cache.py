@@ -0,0 +1,211 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+A memory-bounded cache for UVBeam interpolation splines.
+
+With ``reuse_spline=True``, ``UVBeam.interp`` keeps the splines it fits in the
+beam's ``saved_interp_functions`` dictionary, keyed by frequency, feed (or
+polarization) and vector axis, and never lets go of them. A long wideband
+simulation, with several beams, accumulates a set of splines for every
+frequency of every beam.
+
+A :class:`SplineCache` takes the place of these dictionaries for all of the
+UVBeams in a :class:`pyuvsim.BeamList`. It holds the splines of all the beams
+within one memory budget, evicting the least recently used splines first,
+and counts hits, misses and evictions.
+"""
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import numpy as np
+
+__all__ = ['SplineCache', 'spline_nbytes']
+
+
+def spline_nbytes(func):
+    """
+    Estimate the memory held by an interpolation function saved by UVBeam.
+
+    UVBeam saves functions wrapping one (real) or two (real and imaginary)
+    scipy splines. The size is that of the splines' knots and coefficients.
+
+    Parameters
+    ----------
+    func : callable
+        A spline, or a function whose closure holds splines.
+
+    Returns
+    -------
+    int
+        Size in bytes.
+    """
+    objs = [func]
+    closure = getattr(func, '__closure__', None)
+    if closure is not None:
+        objs.extend(cell.cell_contents for cell in closure)
+    nbytes = 0
+    for obj in objs:
+        tck = getattr(obj, 'tck', None)
+        if tck is None:
+            continue
+        nbytes += sum(np.asarray(arr).nbytes for arr in tck if arr is not None)
+    return nbytes
+
+
+class _BeamSplines(MutableMapping):
+    """
+    The part of a :class:`SplineCache` belonging to one beam.
+
+    This is the mapping set as ``saved_interp_functions`` on a UVBeam, so it takes
+    the keys that UVBeam uses. Membership tests do not count as accesses, since
+    UVBeam checks for a key before getting it.
+    """
+
+    def __init__(self, cache, beam_key):
+        self.cache = cache
+        self.beam_key = beam_key
+
+    def __getitem__(self, key):
+        return self.cache._get((self.beam_key, key))
+
+    def __setitem__(self, key, value):
+        self.cache._set((self.beam_key, key), value)
+
+    def __delitem__(self, key):
+        self.cache._delete((self.beam_key, key))
+
+    def __contains__(self, key):
+        return (self.beam_key, key) in self.cache._entries
+
+    def __iter__(self):
+        keys = [key for beam_key, key in self.cache._entries if beam_key == self.beam_key]
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for beam_key, _ in self.cache._entries if beam_key == self.beam_key)
+
+    def __deepcopy__(self, memo):
+        # Copies of a beam (e.g. from UVBeam.copy) start without any saved splines.
+        return {}
+
+
+class SplineCache:
+    """
+    Least-recently-used cache of UVBeam interpolation splines, within a memory budget.
+
+    Use :meth:`attach` to make a UVBeam save its splines here. Splines are evicted,
+    least recently used first, when their total size goes over `max_bytes`.
+
+    Parameters
+    ----------
+    max_bytes : float
+        Memory budget in bytes. If None, splines are never evicted, but are still counted.
+
+    Attributes
+    ----------
+    hits : int
+        Number of splines reused.
+    misses : int
+        Number of splines fit (and added to the cache).
+    evictions : int
+        Number of splines evicted to stay within the budget.
+    nbytes : int
+        Current size of the cached splines in bytes.
+    peak_nbytes : int
+        Largest size of the cached splines so far, in bytes.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self.peak_nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def attach(self, beam, beam_key):
+        """
+        Make a UVBeam save its interpolation splines in this cache.
+
+        Any splines the beam has saved already are dropped.
+
+        Parameters
+        ----------
+        beam : :class:`pyuvdata.UVBeam`
+            The beam.
+        beam_key : hashable
+            Identifies the beam's splines in the cache (e.g., its index in a BeamList).
+        """
+        beam.saved_interp_functions = _BeamSplines(self, beam_key)
+
+    def _get(self, full_key):
+        value, _ = self._entries[full_key]
+        self._entries.move_to_end(full_key)
+        self.hits += 1
+        return value
+
+    def _set(self, full_key, value):
+        if full_key in self._entries:
+            self._delete(full_key)
+        size = spline_nbytes(value)
+        self._entries[full_key] = (value, size)
+        self.misses += 1
+        self.nbytes += size
+        self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+        self._evict()
+
+    def _delete(self, full_key):
+        _, size = self._entries.pop(full_key)
+        self.nbytes -= size
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        # The spline just added is kept by UVBeam for the current call, even if evicted.
+        while self.nbytes > self.max_bytes and len(self._entries) > 0:
+            full_key = next(iter(self._entries))
+            self._delete(full_key)
+            self.evictions += 1
+
+    def clear(self, beam_key=None):
+        """
+        Drop cached splines. The statistics are kept.
+
+        Parameters
+        ----------
+        beam_key : hashable
+            Only drop the splines of this beam. Defaults to dropping all splines.
+        """
+        if beam_key is None:
+            self._entries.clear()
+            self.nbytes = 0
+            return
+        for full_key in [fk for fk in self._entries if fk[0] == beam_key]:
+            self._delete(full_key)
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns
+        -------
+        dict
+            Keys are "hits", "misses", "evictions", "Nsplines", "nbytes", "peak_nbytes"
+            and "max_bytes" (None if there is no budget).
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'Nsplines': len(self._entries),
+            'nbytes': self.nbytes,
+            'peak_nbytes': self.peak_nbytes,
+            'max_bytes': self.max_bytes,
+        }
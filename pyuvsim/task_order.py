@@ -0,0 +1,213 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+Choose the order in which each process runs its tasks.
+
+The :class:`pyuvsim.UVEngine` keeps the quantities computed for the last task, and
+reuses them while consecutive tasks share them: source positions (and the local
+coherency) while the time is the same, and beam responses while the time, frequency
+and pair of antenna beams are the same. UVBeams also keep the splines fit at each
+frequency, within the memory budget of the spline cache. When the tasks at each time
+are only given the sources that may be above the horizon, the sky is also rebuilt at
+each change of time.
+
+By default, tasks run with time as the outer loop, then frequency, then baseline.
+:func:`plan_task_order` counts the recomputations each order of the three axes would
+need, with baselines grouped by beam pair, and picks the order with the lowest cost.
+"""
+
+import itertools
+
+import numpy as np
+
+__all__ = ['task_axes', 'default_order', 'default_order_costs', 'count_task_updates',
+           'plan_task_order']
+
+# Axes of the task grid, in the order used to flatten task indices.
+task_axes = ('time', 'freq', 'baseline')
+
+# Outer to inner loop.
+default_order = 'time,freq,baseline'
+
+# Seconds per source for each position, beam and sky update, and per spline fit.
+# These are rough, for UVBeams with a few hundred pixels per axis.
+default_order_costs = {
+    'position': 2e-6,
+    'beam': 5e-7,
+    'sky': 1e-6,
+    'spline_fit': 2e-2,
+}
+
+
+def _parse_order(order):
+    axes = tuple(ax.strip() for ax in order.split(','))
+    if sorted(axes) != sorted(task_axes):
+        raise ValueError("Task order must list each of {} once, got '{}'.".format(
+            ', '.join(task_axes), order))
+    return axes
+
+
+def _order_tasks(task_inds, shape, pair_ids, order):
+    # Sort flat task indices by the given axis order, with the baselines
+    # grouped by beam pair.
+    task_inds = np.asarray(task_inds, dtype=np.int64)
+    index = dict(zip(task_axes, np.unravel_index(task_inds, shape)))
+    bl_rank = np.empty(len(pair_ids), dtype=np.int64)
+    bl_rank[np.argsort(pair_ids, kind='stable')] = np.arange(len(pair_ids))
+    index['baseline'] = bl_rank[index['baseline']]
+    # lexsort sorts on the last key first.
+    keys = [index[ax] for ax in reversed(_parse_order(order))]
+    return task_inds[np.lexsort(keys)]
+
+
+def count_task_updates(task_inds, shape, beam_pairs, spline_beams=(), spline_capacity=None,
+                       rebuild_sky=False):
+    """
+    Count the updates the engine makes when running tasks in the given order.
+
+    Parameters
+    ----------
+    task_inds : array_like of int
+        Flat task indices in the (Ntimes, Nfreqs, Nbls) grid, in the order they are run.
+    shape : tuple of int
+        (Ntimes, Nfreqs, Nbls).
+    beam_pairs : list of tuple
+        The pair of beam ids of each baseline.
+    spline_beams : collection of int
+        Ids of the beams evaluated with saved splines (UVBeams without lookup tables).
+    spline_capacity : int
+        Number of frequencies for which the splines of these beams fit in the spline
+        cache. If None, splines are never evicted.
+    rebuild_sky : bool
+        Whether the sky is rebuilt at each change of time, as it is when the tasks at
+        each time are only given the sources that may be above the horizon
+        (see :func:`pyuvsim.uvsim.uvdata_to_task_iter`).
+
+    Returns
+    -------
+    dict
+        "Ntasks", "Nposition_updates", "Nbeam_updates", "Nsky_updates" and
+        "Nspline_fits". Spline
+        fits are the distinct frequencies of each beam if they all fit in the cache,
+        every evaluation of the beam if not even one frequency fits, and otherwise
+        every change of frequency between evaluations of the beam.
+    """
+    task_inds = np.asarray(task_inds, dtype=np.int64)
+    Ntasks = task_inds.size
+    counts = {'Ntasks': Ntasks, 'Nposition_updates': 0, 'Nbeam_updates': 0,
+              'Nsky_updates': 0, 'Nspline_fits': 0}
+    if Ntasks == 0:
+        return counts
+
+    time_i, freq_i, bl_i = np.unravel_index(task_inds, shape)
+    pair_keys = {pair: ind for ind, pair in enumerate(sorted(set(beam_pairs)))}
+    pair_ids = np.array([pair_keys[pair] for pair in beam_pairs])[bl_i]
+
+    first = np.zeros(Ntasks, dtype=bool)
+    first[0] = True
+    time_change = first.copy()
+    time_change[1:] = time_i[1:] != time_i[:-1]
+    beam_change = time_change.copy()
+    beam_change[1:] |= (freq_i[1:] != freq_i[:-1]) | (pair_ids[1:] != pair_ids[:-1])
+    counts['Nposition_updates'] = int(np.sum(time_change))
+    counts['Nbeam_updates'] = int(np.sum(beam_change))
+    if rebuild_sky:
+        counts['Nsky_updates'] = counts['Nposition_updates']
+
+    beam_freqs = freq_i[beam_change]
+    beam_bls = bl_i[beam_change]
+    for beam_id in spline_beams:
+        uses = np.array([beam_id in beam_pairs[bl] for bl in range(len(beam_pairs))])
+        freqs = beam_freqs[uses[beam_bls]]
+        if freqs.size == 0:
+            continue
+        Nfreqs_used = np.unique(freqs).size
+        if spline_capacity is None or spline_capacity >= Nfreqs_used:
+            counts['Nspline_fits'] += Nfreqs_used
+        elif spline_capacity < 1:
+            counts['Nspline_fits'] += freqs.size
+        else:
+            counts['Nspline_fits'] += 1 + int(np.sum(freqs[1:] != freqs[:-1]))
+    return counts
+
+
+def _order_cost(counts, Nsrcs, costs):
+    return (costs['position'] * counts['Nposition_updates'] * Nsrcs
+            + costs['beam'] * counts['Nbeam_updates'] * Nsrcs
+            + costs['sky'] * counts['Nsky_updates'] * Nsrcs
+            + costs['spline_fit'] * counts['Nspline_fits'])
+
+
+def plan_task_order(task_inds, shape, beam_pairs, Nsrcs, order='auto', spline_beams=(),
+                    spline_capacity=None, costs=None, outer_axis=None, rebuild_sky=False):
+    """
+    Order tasks to reuse as much of the engine's state as possible.
+
+    Parameters
+    ----------
+    task_inds : array_like of int
+        Flat task indices in the (Ntimes, Nfreqs, Nbls) grid.
+    shape : tuple of int
+        (Ntimes, Nfreqs, Nbls).
+    beam_pairs : list of tuple
+        The pair of beam ids of each baseline.
+    Nsrcs : int
+        Number of sources simulated at a time.
+    order : str
+        "auto" to choose the order with the lowest cost, or the axes from the outer
+        to the inner loop, separated by commas (e.g., "freq,time,baseline").
+        Baselines are grouped by beam pair in either case.
+    spline_beams, spline_capacity, rebuild_sky
+        Passed to :func:`count_task_updates`.
+    costs : dict
+        Seconds per update, with the keys of `default_order_costs`.
+    outer_axis : str
+        If set, the axis that must be the outer loop.
+
+    Returns
+    -------
+    ordered_inds : ndarray of int
+        The flat task indices, in the order to run them.
+    report : dict
+        "order", the predicted "cost" in seconds, the update counts from
+        :func:`count_task_updates`, and the predicted "position_reuse" and
+        "beam_reuse" (fractions of tasks reusing the last task's values).
+    """
+    if costs is None:
+        costs = default_order_costs
+    pair_keys = {pair: ind for ind, pair in enumerate(sorted(set(beam_pairs)))}
+    pair_ids = np.array([pair_keys[pair] for pair in beam_pairs], dtype=np.int64)
+
+    if order == 'auto':
+        # The default order comes first, so it is kept unless another is cheaper.
+        candidates = [default_order] + [
+            ','.join(axes) for axes in itertools.permutations(task_axes)
+            if ','.join(axes) != default_order
+        ]
+    else:
+        candidates = [','.join(_parse_order(order))]
+    if outer_axis is not None:
+        candidates = [candidate for candidate in candidates
+                      if candidate.split(',')[0] == outer_axis]
+        if len(candidates) == 0:
+            raise ValueError("Task order must have {} as the outer loop, got '{}'.".format(
+                outer_axis, order))
+
+    best = None
+    for candidate in candidates:
+        ordered_inds = _order_tasks(task_inds, shape, pair_ids, candidate)
+        counts = count_task_updates(ordered_inds, shape, beam_pairs,
+                                    spline_beams=spline_beams,
+                                    spline_capacity=spline_capacity,
+                                    rebuild_sky=rebuild_sky)
+        cost = _order_cost(counts, Nsrcs, costs)
+        if best is None or cost < best[2]['cost']:
+            best = (candidate, ordered_inds, dict(counts, order=candidate, cost=cost))
+
+    _, ordered_inds, report = best
+    Ntasks = max(report['Ntasks'], 1)
+    report['position_reuse'] = 1 - report['Nposition_updates'] / Ntasks
+    report['beam_reuse'] = 1 - report['Nbeam_updates'] / Ntasks
+    return ordered_inds, report
@@ -7,9 +7,64 @@ import warnings
 from pyuvdata import UVBeam, parameter
 
 from .analyticbeam import AnalyticBeam
+from .beam_lookup import BeamLookupTable
+from .spline_cache import SplineCache
+from .beam_cache import BeamResponseCache
 from . import mpi
 
 
+def _crop_uvbeam(uvb, freq_array, freq_margin=4, za_max=np.pi / 2, za_margin=3):
+    """
+    Select the frequencies and zenith angles of a UVBeam that a simulation may use.
+
+    The frequencies kept are those spanning the simulation band, plus `freq_margin`
+    extra channels on each side for frequency interpolation. For beams in az/za
+    coordinates, the zenith angles kept are those up to `za_max`, plus `za_margin`
+    extra pixels for angular interpolation near the horizon. HEALPix beams are
+    only cropped in frequency.
+
+    Parameters
+    ----------
+    uvb : :class:`pyuvdata.UVBeam`
+        The beam, which is modified in place.
+    freq_array : array_like of float
+        Simulation frequencies in Hz.
+    freq_margin : int
+        Number of extra beam frequencies to keep beyond each end of the band.
+    za_max : float
+        Largest zenith angle in radians.
+    za_margin : int
+        Number of extra zenith angle pixels to keep beyond `za_max`.
+    """
+    select_kwargs = {}
+
+    beam_freqs = np.asarray(uvb.freq_array).flatten()
+    freq_array = np.asarray(freq_array, dtype=float).flatten()
+    order = np.argsort(beam_freqs)
+    sorted_freqs = beam_freqs[order]
+    # Beam frequencies bracketing the band.
+    low = np.searchsorted(sorted_freqs, freq_array.min(), side='right') - 1
+    high = np.searchsorted(sorted_freqs, freq_array.max(), side='left')
+    low = max(low - freq_margin, 0)
+    high = min(high + freq_margin, beam_freqs.size - 1)
+    # Cubic interpolation needs at least four frequencies.
+    while high - low + 1 < min(4, beam_freqs.size):
+        if low > 0:
+            low -= 1
+        if high < beam_freqs.size - 1 and high - low + 1 < 4:
+            high += 1
+    if high - low + 1 < beam_freqs.size:
+        select_kwargs['freq_chans'] = np.sort(order[low:high + 1])
+
+    if uvb.pixel_coordinate_system == 'az_za':
+        Nza_keep = np.count_nonzero(uvb.axis2_array <= za_max + 1e-10) + za_margin
+        if Nza_keep < uvb.Naxes2:
+            select_kwargs['axis2_inds'] = np.sort(np.argsort(uvb.axis2_array)[:Nza_keep])
+
+    if len(select_kwargs) > 0:
+        uvb.select(**select_kwargs)
+
+
 class Telescope:
     """
     Container for data common to all antennas in the array.
@@ -70,6 +125,28 @@ class BeamList(object):
     uvb_params : dict
         Set of additional attributes to set on UVBeam objects.
 
+    beam_type : str
+        Either "efield" (the default) or "power". In power mode, all beams are converted
+        to power beams when they are made into objects, for use in the power beam mode
+        of :class:`pyuvsim.UVEngine`.
+
+    lookup_opts : dict
+        Options for compiling lookup tables for the UVBeams when converting to object
+        mode (keyword arguments for :meth:`compile_lookup_tables`). If None, no tables
+        are made and the UVBeams are evaluated with spline interpolation.
+
+    lookup_tables : dict
+        :class:`~pyuvsim.beam_lookup.BeamLookupTable` objects, keyed by beam index.
+
+    spline_cache : :class:`~pyuvsim.spline_cache.SplineCache`
+        Cache holding the interpolation splines of all UVBeams in the list, within a
+        memory budget (see :meth:`set_spline_cache`). If None, each UVBeam keeps all
+        of its splines.
+
+    response_cache : :class:`~pyuvsim.beam_cache.BeamResponseCache`
+        On-disk cache of UVBeam responses, reused across runs (see
+        :meth:`set_response_cache`). If None, responses are not saved.
+
     Parameters
     ----------
     beam_list : list (optional)
@@ -107,6 +184,11 @@ class BeamList(object):
         self.uvb_params = {'freq_interp_kind': 'cubic',
                            'interpolation_function': 'az_za_simple'}
         self.spline_interp_opts = None
+        self.beam_type = 'efield'
+        self.lookup_opts = None
+        self.lookup_tables = {}
+        self.spline_cache = None
+        self.response_cache = None
         self._str_beam_list = []
         self._obj_beam_list = []
         if beam_list is not None:
@@ -225,6 +307,12 @@ class BeamList(object):
                 raise ValueError(f"Invalid file path: {value}") from err
             self._obj_beam_list[ind] = value
             self._scrape_uvb_params(self._obj_beam_list, strict=False)
+            if self.spline_cache is not None:
+                # The splines saved for this index belong to the beam being replaced.
+                self.spline_cache.clear(ind)
+                self._attach_spline_cache()
+            if self.response_cache is not None:
+                self.response_cache.set_beam_hashes(self)
 
     def __eq__(self, other):
         if self.string_mode:
@@ -251,8 +339,10 @@ class BeamList(object):
                 self._obj_beam_list.pop()
             raise err
 
-    def _str_to_obj(self, beam_model, use_shared_mem=False):
+    def _str_to_obj(self, beam_model, use_shared_mem=False, freq_array=None):
         # Convert beam strings to objects.
+        # If freq_array is given, UVBeams are cropped to what the simulation uses
+        # before they are shared.
         if isinstance(beam_model, (AnalyticBeam, UVBeam)):
             return beam_model
         if beam_model.startswith('analytic'):
@@ -265,14 +355,20 @@ class BeamList(object):
                 full = self._float_params[par]
                 to_set[full] = float(val)
 
-            return AnalyticBeam(model, **to_set)
+            beam = AnalyticBeam(model, **to_set)
+            self._set_beam_type(beam)
+            return beam
 
         path = beam_model  # beam_model = path to beamfits
         uvb = UVBeam()
         if use_shared_mem and (mpi.world_comm is not None):
             if mpi.rank == 0:
                 uvb.read_beamfits(path)
+                if freq_array is not None:
+                    _crop_uvbeam(uvb, freq_array)
                 uvb.peak_normalize()
+                # Convert before sharing, so that only the power beam is shared.
+                self._set_beam_type(uvb)
             for key, attr in uvb.__dict__.items():
                 if not isinstance(attr, parameter.UVParameter):
                     continue
@@ -283,11 +379,25 @@ class BeamList(object):
             mpi.world_comm.Barrier()
         else:
             uvb.read_beamfits(path)
+            if freq_array is not None:
+                _crop_uvbeam(uvb, freq_array)
         for key, val in self.uvb_params.items():
             setattr(uvb, key, val)
         uvb.extra_keywords['beam_path'] = path
         return uvb
 
+    def _set_beam_type(self, beam):
+        # Convert an E-field beam to a power beam, if in power mode.
+        if self.beam_type == 'efield' or beam.beam_type == 'power':
+            return
+        if isinstance(beam, UVBeam):
+            # Normalize the E-field beam first, as for E-field simulations.
+            if beam.data_normalization != 'peak':
+                beam.peak_normalize()
+            beam.efield_to_power(calc_cross_pols=True)
+        else:
+            beam.efield_to_power()
+
     def _obj_to_str(self, beam_model):
         # Convert beam objects to strings that may generate them.
 
@@ -342,23 +452,197 @@ class BeamList(object):
             self.uvb_params.update(new_uvb_par)
             self._str_beam_list = [self._obj_to_str(bobj) for bobj in self._obj_beam_list]
         self._obj_beam_list = []
+        self.lookup_tables = {}
+        if self.spline_cache is not None:
+            self.spline_cache.clear()
+        if self.response_cache is not None:
+            self.response_cache.beam_hashes = {}
         self.string_mode = True
 
-    def set_obj_mode(self, use_shared_mem=False):
+    def set_obj_mode(self, use_shared_mem=False, freq_array=None):
         """
         Initialize AnalyticBeam and UVBeam objects from string representations.
 
         For any UVBeams, additional attributes will be set by the BeamList.uvb_params
         dictionary. This overwrites any settings that may have been read from file.
 
+        Parameters
+        ----------
+        use_shared_mem : bool
+            Read UVBeams on the root process and share their data among the processes
+            on each node.
+        freq_array : array_like of float
+            Simulation frequencies in Hz. If given, UVBeams read from file are cropped
+            to the frequencies around this band and to zenith angles above the horizon
+            (with margins for interpolation), before they are shared. If `lookup_opts`
+            is also set, lookup tables are compiled for the UVBeams at these frequencies.
+
         Sets
         ----
         string_mode : bool
             Sets to False
+
+        Notes
+        -----
+        If `beam_type` is "power", E-field beams are converted to power beams.
         """
+        if self.beam_type not in ['efield', 'power']:
+            raise ValueError("beam_type must be 'efield' or 'power'.")
         if not self._str_beam_list == []:
-            self._obj_beam_list = [self._str_to_obj(bstr, use_shared_mem=use_shared_mem)
-                                   for bstr in self._str_beam_list]
+            self._obj_beam_list = [
+                self._str_to_obj(bstr, use_shared_mem=use_shared_mem, freq_array=freq_array)
+                for bstr in self._str_beam_list
+            ]
         self._set_params_on_uvbeams(self._obj_beam_list)
+        for beam in self._obj_beam_list:
+            self._set_beam_type(beam)
         self._str_beam_list = []
         self.string_mode = False
+        self._attach_spline_cache()
+        if freq_array is not None and self.lookup_opts is not None:
+            self.compile_lookup_tables(freq_array, use_shared_mem=use_shared_mem,
+                                       **self.lookup_opts)
+        if self.response_cache is not None:
+            self._hash_beams(use_shared_mem=use_shared_mem)
+
+    def set_spline_cache(self, max_bytes=None):
+        """
+        Keep the interpolation splines of all UVBeams in one cache, with a memory budget.
+
+        UVBeam saves the splines it fits when interpolating with ``reuse_spline=True``,
+        for every frequency it is evaluated at. With a cache, the least recently used
+        splines of any beam are evicted when their total size goes over the budget.
+        The cache also counts hits, misses and evictions.
+
+        The cache is kept through conversions to string mode and back, but the splines
+        in it are dropped.
+
+        Parameters
+        ----------
+        max_bytes : float
+            Memory budget in bytes. If None, splines are counted but never evicted.
+
+        Sets
+        ----
+        spline_cache : :class:`~pyuvsim.spline_cache.SplineCache`
+            The new cache.
+        """
+        self.spline_cache = SplineCache(max_bytes=max_bytes)
+        self._attach_spline_cache()
+
+    def set_response_cache(self, cache_dir, use_shared_mem=False):
+        """
+        Save UVBeam responses to disk, and reuse them in later runs.
+
+        Each evaluation of a UVBeam by :meth:`pyuvsim.Antenna.get_beam_jones` (or
+        :meth:`pyuvsim.Antenna.get_beam_power`) is saved in `cache_dir`, keyed by
+        hashes of the beam, the frequency and the source positions. Runs evaluating
+        the same beams at the same positions load the saved responses instead.
+        AnalyticBeams are not cached, as they are cheap to evaluate.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory for the cache files.
+        use_shared_mem : bool
+            Hash the beams on the root process only, if they are shared among processes.
+            Must then be called from all processes.
+
+        Sets
+        ----
+        response_cache : :class:`~pyuvsim.beam_cache.BeamResponseCache`
+            The cache.
+        """
+        self.response_cache = BeamResponseCache(cache_dir)
+        if not self.string_mode:
+            self._hash_beams(use_shared_mem=use_shared_mem)
+
+    def _hash_beams(self, use_shared_mem=False):
+        # Hash the beams for the response cache, on the root process if they are shared.
+        if use_shared_mem and (mpi.world_comm is not None):
+            if mpi.rank == 0:
+                self.response_cache.set_beam_hashes(self)
+            self.response_cache.beam_hashes = mpi.world_comm.bcast(
+                self.response_cache.beam_hashes, root=0
+            )
+        else:
+            self.response_cache.set_beam_hashes(self)
+
+    def _attach_spline_cache(self):
+        # Make the UVBeams save their splines in the spline cache, if there is one.
+        if self.spline_cache is None or self.string_mode:
+            return
+        for ind, beam in enumerate(self._obj_beam_list):
+            if isinstance(beam, UVBeam):
+                self.spline_cache.attach(beam, ind)
+
+    def compile_lookup_tables(self, freq_array, resolution=None, kind='cubic', tolerance=1e-2,
+                              use_shared_mem=False):
+        """
+        Resample the UVBeams onto regular az/za grids at the simulation frequencies.
+
+        The tables are used by :meth:`pyuvsim.Antenna.get_beam_jones` in place of
+        spline interpolation, for sources above the horizon at these frequencies.
+        AnalyticBeams are left as they are.
+
+        Parameters
+        ----------
+        freq_array : array_like of float
+            Simulation frequencies in Hz.
+        resolution : float
+            Grid spacing in degrees. Defaults to the pixel spacing of each beam.
+        kind : str
+            Interpolation between grid points, "linear" or "cubic".
+        tolerance : float
+            Largest acceptable difference from spline interpolation, relative to the
+            beam peak, checked at random positions. Beams whose tables are less accurate
+            than this are evaluated with spline interpolation instead, with a warning.
+            Set to None to skip the check.
+        use_shared_mem : bool
+            Compile the tables on the root process and share them among the processes
+            on each node. Must be called from all processes.
+
+        Sets
+        ----
+        lookup_tables : dict
+            Tables keyed by beam index.
+        """
+        if self.string_mode:
+            raise ValueError("Beams must be in object mode to compile lookup tables.")
+        if resolution is not None:
+            resolution = np.radians(resolution)
+        freq_array = np.asarray(freq_array, dtype=float).flatten()
+        use_shared_mem = use_shared_mem and (mpi.world_comm is not None)
+
+        self.lookup_tables = {}
+        for ind, beam in enumerate(self._obj_beam_list):
+            if not isinstance(beam, UVBeam):
+                continue
+            table = None
+            if not use_shared_mem or mpi.rank == 0:
+                if beam.data_normalization != 'peak':
+                    beam.peak_normalize()
+                table = BeamLookupTable.from_uvbeam(
+                    beam, freq_array, resolution=resolution, kind=kind,
+                    spline_opts=self.spline_interp_opts
+                )
+                if tolerance is not None:
+                    error = table.check_accuracy(beam, spline_opts=self.spline_interp_opts,
+                                                 seed=ind)
+                    if error > tolerance:
+                        warnings.warn(
+                            "The lookup table for beam {} differs from spline interpolation "
+                            "by up to {:.2e}, more than the tolerance of {:.2e}. Using spline "
+                            "interpolation for this beam. A finer resolution may help."
+                            .format(ind, error, tolerance)
+                        )
+                        table = None
+            if use_shared_mem:
+                data = None
+                if table is not None:
+                    data, table.data = table.data, None
+                table = mpi.world_comm.bcast(table, root=0)
+                if table is not None:
+                    table.data = mpi.shared_mem_bcast(data, root=0)
+            if table is not None:
+                self.lookup_tables[ind] = table
@@ -331,3 +331,35 @@ def test_diameter_to_sigma():
 
         # Assert integral of power beams within the first Airy null are close
         assert np.isclose(np.sum(airy_vals[fi, inds]), np.sum(gauss_vals[fi, inds]), rtol=1e-2)
+
+
+@pytest.mark.parametrize('beam', [pyuvsim.AnalyticBeam('uniform'),
+                                  pyuvsim.AnalyticBeam('gaussian', diameter=14.0),
+                                  pyuvsim.AnalyticBeam('airy', diameter=14.0)])
+def test_radial_response(beam):
+    # The compact response matches the diagonal of the full interpolation.
+    za_vals = np.concatenate([[0], np.random.uniform(0.0, np.pi / 2, 1000)])
+    az_vals = np.zeros_like(za_vals)
+    for freq in [1e8, 2e8]:
+        interp_data, _ = beam.interp(az_vals, za_vals, np.array([freq]))
+        values = beam.radial_response(za_vals, freq)
+        assert values.shape == za_vals.shape
+        assert np.allclose(values, interp_data[1, 0, 0, 0], rtol=0, atol=1e-7)
+        assert np.allclose(values, interp_data[0, 0, 1, 0], rtol=0, atol=1e-7)
+
+
+def test_airy_table():
+    beam = pyuvsim.AnalyticBeam('airy', diameter=14.0)
+    za_vals = np.linspace(0, np.pi / 2, 11)
+    beam.radial_response(za_vals, 1e8)
+    Ntable = beam._airy_table.size
+
+    # The table is reused for lower frequencies, and extended for higher ones.
+    beam.radial_response(za_vals, 0.5e8)
+    assert beam._airy_table.size == Ntable
+    values = beam.radial_response(za_vals, 2e8)
+    assert beam._airy_table.size > Ntable
+
+    xvals = np.pi * 14.0 * np.sin(za_vals[1:]) * 2e8 / c_ms
+    assert values[0] == 1.0
+    assert np.allclose(values[1:], 2 * j1(xvals) / xvals, rtol=0, atol=1e-7)
@@ -71,3 +71,47 @@ def test_jones_set_interp(cst_beam, hera_loc):
     assert (np.all(jones2 == jones0)
             and np.all(jones1 == jones)
             and np.all(jones1 == jones0))
+
+
+def test_jones_lookup_table(cst_beam, hera_loc):
+    # Jones matrices from a lookup table are close to those from spline interpolation.
+    beam = cst_beam.copy()
+    beam.interpolation_function = 'az_za_simple'
+    beam_list = pyuvsim.BeamList([beam])
+    antenna = pyuvsim.Antenna('ant1', 1, np.array([0, 10, 0]), 0)
+    array = pyuvsim.Telescope('telescope_name', hera_loc, beam_list)
+
+    alts = np.radians([90.0, 60.0, 35.3, 1.0])
+    azs = np.radians([0.0, 45.5, 200.1, 359.5])
+    source_altaz = np.array([alts, azs])
+    freq = 130e6 * units.Hz
+
+    jones_spline = antenna.get_beam_jones(array, source_altaz, freq)
+    beam_list.compile_lookup_tables([123e6, 130e6])
+    assert 0 in beam_list.lookup_tables
+    jones_table = antenna.get_beam_jones(array, source_altaz, freq)
+    assert not np.all(jones_table == jones_spline)
+    assert np.allclose(jones_table, jones_spline, atol=1e-2)
+
+    # Frequencies not in the table fall back to spline interpolation.
+    jones0 = antenna.get_beam_jones(array, source_altaz, 140e6 * units.Hz)
+    beam_list.lookup_tables = {}
+    jones1 = antenna.get_beam_jones(array, source_altaz, 140e6 * units.Hz)
+    assert np.all(jones0 == jones1)
+
+
+def test_jones_analytic(hera_loc):
+    # AnalyticBeam Jones matrices are diagonal, with the beam values on the diagonal.
+    beam = pyuvsim.AnalyticBeam('airy', diameter=14.0)
+    array = pyuvsim.Telescope('telescope_name', hera_loc, pyuvsim.BeamList([beam]))
+    antenna = pyuvsim.Antenna('ant1', 1, np.array([0, 10, 0]), 0)
+
+    alts = np.linspace(0.1, np.pi / 2, 50)
+    azs = np.linspace(0, 2 * np.pi, 50)
+    jones = antenna.get_beam_jones(array, np.array([alts, azs]), 150e6 * units.Hz)
+
+    interp_data, _ = beam.interp(azs, np.pi / 2 - alts, np.array([150e6]))
+    assert np.allclose(jones[0, 0], interp_data[1, 0, 0, 0], rtol=0, atol=1e-7)
+    assert np.allclose(jones[1, 1], interp_data[0, 0, 1, 0], rtol=0, atol=1e-7)
+    assert np.all(jones[0, 1] == 0)
+    assert np.all(jones[1, 0] == 0)
@@ -0,0 +1,107 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from astropy import units
+from astropy.coordinates import EarthLocation
+
+import pyuvsim
+from pyuvsim.beam_cache import BeamResponseCache, _update_hash, hash_uvbeam
+
+
+@pytest.fixture()
+def telescope(cst_beam):
+    beam = cst_beam.copy()
+    beam.interpolation_function = 'az_za_simple'
+    beam.freq_interp_kind = 'linear'
+    beam_list = pyuvsim.BeamList([beam, pyuvsim.AnalyticBeam('airy', diameter=14.0)])
+    location = EarthLocation(lat='-30d43m17.5s', lon='21d25m41.9s', height=1073.)
+    return pyuvsim.Telescope('telescope_name', location, beam_list)
+
+
+def _alt_az(Nsrcs, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.array([rng.uniform(0.1, np.pi / 2, Nsrcs), rng.uniform(0, 2 * np.pi, Nsrcs)])
+
+
+def test_hash_uvbeam(cst_beam):
+    beam = cst_beam.copy()
+    beam_hash = hash_uvbeam(beam)
+    assert hash_uvbeam(beam.copy()) == beam_hash
+    assert hash_uvbeam(beam, spline_opts={'kx': 1, 'ky': 1}) != beam_hash
+
+    beam.data_array[0, 0, 0, 0, 10, 10] *= 2
+    assert hash_uvbeam(beam) != beam_hash
+
+
+def test_update_hash_layout():
+    # Arrays hash by their values, whatever their memory layout.
+    arr = (np.arange(24) + 1j).reshape(2, 3, 4)
+    hashes = []
+    for item in [arr, np.asfortranarray(arr), arr.T.copy().T, arr[:, ::-1][:, ::-1]]:
+        hasher = hashlib.sha256()
+        _update_hash(hasher, item)
+        hashes.append(hasher.hexdigest())
+    assert len(set(hashes)) == 1
+
+
+def test_response_cache(telescope, tmpdir):
+    cache_dir = str(tmpdir.join('beam_cache'))
+    telescope.beam_list.set_response_cache(cache_dir)
+    cache = telescope.beam_list.response_cache
+    # Only the UVBeam is cached.
+    assert list(cache.beam_hashes.keys()) == [0]
+
+    antenna = pyuvsim.Antenna('ant1', 1, np.zeros(3), 0)
+    alt_az = _alt_az(20)
+    freq = 123e6 * units.Hz
+    jones = antenna.get_beam_jones(telescope, alt_az, freq)
+    assert cache.stats() == {'hits': 0, 'misses': 1, 'nbytes_written': 2 * 2 * 20 * 16}
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A new run, with its own cache object, reuses the saved response.
+    telescope.beam_list.set_response_cache(cache_dir)
+    cache = telescope.beam_list.response_cache
+    assert np.array_equal(antenna.get_beam_jones(telescope, alt_az, freq), jones)
+    assert cache.hits == 1
+
+    # Different source positions, frequencies, or interpolation settings miss.
+    antenna.get_beam_jones(telescope, _alt_az(20, seed=1), freq)
+    antenna.get_beam_jones(telescope, alt_az, 124e6 * units.Hz)
+    antenna.get_beam_jones(telescope, alt_az, freq, interpolation_function='az_za_simple',
+                           freq_interp_kind='cubic')
+    assert cache.misses == 3
+
+    # Analytic beams are evaluated directly.
+    antenna2 = pyuvsim.Antenna('ant2', 2, np.zeros(3), 1)
+    antenna2.get_beam_jones(telescope, alt_az, freq)
+    assert cache.hits + cache.misses == 4
+
+    # The key changes with the beam.
+    new_beam = telescope.beam_list[0].copy()
+    del new_beam.saved_interp_functions
+    new_beam.data_array *= 0.5
+    telescope.beam_list[0] = new_beam
+    assert np.allclose(antenna.get_beam_jones(telescope, alt_az, freq), 0.5 * jones)
+    assert cache.misses == 4
+
+    telescope.beam_list.response_cache.clear()
+    assert os.listdir(cache_dir) == []
+
+
+def test_response_cache_incomplete_file(tmpdir):
+    cache = BeamResponseCache(str(tmpdir))
+    with open(os.path.join(str(tmpdir), 'abc.npy'), 'w') as bad_file:
+        bad_file.write('incomplete')
+    assert cache.load('abc') is None
+    assert cache.misses == 1
+
+    cache.save('abc', np.ones(3))
+    data = cache.load('abc')
+    assert isinstance(data, np.memmap)
+    assert np.array_equal(data, np.ones(3))
@@ -0,0 +1,76 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import numpy as np
+import pytest
+
+import pyuvsim
+from pyuvsim.beam_lookup import BeamLookupTable
+
+
+@pytest.fixture(scope='module')
+def cst_table(cst_beam):
+    beam = cst_beam.copy()
+    return BeamLookupTable.from_uvbeam(beam, [123e6, 140e6], kind='cubic')
+
+
+def test_table_grid(cst_beam, cst_table):
+    # The beam is on a 1 degree grid, which covers the sky above the horizon.
+    assert cst_table.data.shape == (2, 2, 2, 91, 360)
+    assert np.isclose(cst_table.az_step, np.radians(1))
+    assert np.isclose(cst_table.za_step, np.radians(1))
+    assert cst_table.freq_index(140e6) == 1
+    assert cst_table.freq_index(150e6) is None
+
+    # Grid points are reproduced exactly, with either kind of interpolation.
+    az_array = np.radians([0.0, 10.0, 359.0])
+    za_array = np.radians([0.0, 45.0, 90.0])
+    expected = cst_table.data[:, :, 0, [0, 45, 90], [0, 10, 359]]
+    assert np.allclose(cst_table.interp(az_array, za_array, 0), expected)
+    linear_table = BeamLookupTable(cst_table.data, cst_table.freq_array, kind='linear')
+    assert np.allclose(linear_table.interp(az_array, za_array, 0), expected)
+
+    # Azimuth wraps around.
+    assert np.allclose(cst_table.interp(az_array + 2 * np.pi, za_array, 0), expected)
+
+
+def test_table_accuracy(cst_beam, cst_table):
+    beam = cst_beam.copy()
+    error = cst_table.check_accuracy(beam, seed=0)
+    assert error == cst_table.max_error
+    assert error < 1e-2
+
+    # A finer grid is closer to the spline interpolation.
+    fine_table = BeamLookupTable.from_uvbeam(beam, [123e6], resolution=np.radians(0.5))
+    assert fine_table.check_accuracy(beam, seed=0) < error
+
+
+def test_table_errors(cst_table):
+    with pytest.raises(ValueError, match="kind must be 'linear' or 'cubic'"):
+        BeamLookupTable(cst_table.data, cst_table.freq_array, kind='nearest')
+
+
+def test_compile_lookup_tables(cst_beam):
+    beam = cst_beam.copy()
+    beam.interpolation_function = 'az_za_simple'
+    beam_list = pyuvsim.BeamList([beam, pyuvsim.AnalyticBeam('airy', diameter=14.0)])
+    beam_list.lookup_opts = {'resolution': 2.0, 'kind': 'linear'}
+    beam_list.set_obj_mode(freq_array=[123e6, 130e6])
+
+    # No table for the analytic beam.
+    assert list(beam_list.lookup_tables.keys()) == [0]
+    table = beam_list.lookup_tables[0]
+    assert table.kind == 'linear'
+    assert table.data.shape == (2, 2, 2, 46, 180)
+    assert table.max_error is not None
+
+    with pytest.warns(UserWarning, match='more than the tolerance'):
+        beam_list.compile_lookup_tables([123e6], tolerance=1e-8)
+    assert beam_list.lookup_tables == {}
+
+    beam_list.compile_lookup_tables([123e6], tolerance=None)
+    assert beam_list.lookup_tables[0].max_error is None
+
+    with pytest.raises(ValueError, match='Beams must be in object mode'):
+        pyuvsim.BeamList(['analytic_uniform']).compile_lookup_tables([123e6])
@@ -0,0 +1,57 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import numpy as np
+import pytest
+
+from pyuvsim import decomposition
+
+
+@pytest.mark.parametrize(
+    ('Nbls', 'Ntimes', 'Nfreqs', 'Nsrcs', 'Npus', 'node_ids'),
+    [(3, 2, 2, 10, 1, None),
+     (3, 2, 2, 10, 5, None),
+     (10, 1, 1, 2000, 20, None),
+     (2, 1, 1, 3, 20, None),
+     (10, 1, 1, 2000, 8, [1, 0, 1, 0, 1, 0, 1, 0])]
+)
+def test_block_coverage(Nbls, Ntimes, Nfreqs, Nsrcs, Npus, node_ids):
+    # Every task and source pair is simulated exactly once.
+    counts = np.zeros((Nbls * Ntimes * Nfreqs, Nsrcs), dtype=int)
+    for rank in range(Npus):
+        task_inds, src_inds, Ntasks, Nsrcs_local = decomposition.make_block_inds(
+            Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, node_ids=node_ids
+        )
+        assert len(task_inds) == Ntasks
+        assert len(src_inds) == Nsrcs_local
+        counts[task_inds.start:task_inds.stop, src_inds.start:src_inds.stop] += 1
+    assert np.all(counts == 1)
+
+
+def test_choose_block_grid():
+    # Many tasks per process: split the tasks only.
+    assert decomposition.choose_block_grid(100, 10, 10, 1000, 8) == (8, 1)
+
+    # Fewer tasks than processes: split the sources too.
+    Ntask_blocks, Nsrc_blocks = decomposition.choose_block_grid(10, 1, 1, 2000, 20)
+    assert Nsrc_blocks > 1
+    assert Ntask_blocks * Nsrc_blocks <= 20
+
+    # No gather is worth a handful of sources.
+    assert decomposition.choose_block_grid(10, 1, 1, 5, 20) == (10, 1)
+
+
+def test_node_placement():
+    # Ranks alternate between two nodes; each node gets one source block.
+    Npus = 8
+    node_ids = [rank % 2 for rank in range(Npus)]
+    grid = (4, 2)
+    src_blocks = {}
+    for rank in range(Npus):
+        _, src_inds, _, _ = decomposition.make_block_inds(
+            4, 1, 1, 100, rank, Npus, grid=grid, node_ids=node_ids
+        )
+        src_blocks.setdefault(node_ids[rank], set()).add(src_inds.start)
+    assert all(len(starts) == 1 for starts in src_blocks.values())
+    assert src_blocks[0] != src_blocks[1]
@@ -64,7 +64,9 @@ def test_shared_mem():
     shape = (20, 10)
     A = np.arange(N, dtype=float).reshape(shape)
 
+    shared_before = mpi.shared_mem_allocated
     sA = mpi.shared_mem_bcast(A)
+    assert mpi.shared_mem_allocated - shared_before == A.nbytes
 
     # Equivalent to original
     assert np.all(sA == A)
@@ -110,6 +112,17 @@ def test_mpi_counter():
     count.free()
 
 
+def test_mpi_counter_large():
+    # Counts beyond the range of 32-bit integers.
+    mpi.start_mpi()
+    count = mpi.Counter()
+    count.next(2**31)
+    count.next(2**31)
+    mpi.world_comm.Barrier()
+    assert count.current_value() == 2**32 * mpi.world_comm.Get_size()
+    count.free()
+
+
 @pytest.mark.parametrize('MAX_BYTES', [mpi.INT_MAX, 100])
 def test_big_gather(MAX_BYTES, fake_tasks):
 
@@ -205,3 +218,92 @@ def test_skymodeldata_share():
     sky2 = smd.get_skymodel()
 
     assert sky2 == sky
+
+
+@pytest.mark.parallel(3)
+def test_status_board():
+    mpi.start_mpi()
+    board = mpi.StatusBoard(3)
+    if mpi.rank != 0:
+        board.post([1, mpi.rank, 3])
+    mpi.world_comm.Barrier()
+    if mpi.rank == 0:
+        table = board.read()
+        assert table.shape == (mpi.Npus, 3)
+        assert np.all(table[0] == 0)
+        assert np.all(table[1:, 1] == np.arange(1, mpi.Npus))
+    mpi.world_comm.Barrier()
+    board.free()
+
+
+@pytest.mark.parallel(3)
+def test_node_block_sum():
+    mpi.start_mpi()
+    # Ranks 0 and 1 share a group and have disjoint rows; rank 2 overlaps both.
+    blocks = {0: (0, np.ones((4, 2))), 1: (4, 2 * np.ones((3, 2))), 2: (2, np.ones((4, 2)))}
+    # Only the blocks of the running ranks are summed (one rank when run in-process).
+    blocks = {rank: blocks[rank] for rank in range(mpi.world_comm.Get_size())}
+    offset, arr = blocks.get(mpi.rank, (0, np.zeros((0, 2))))
+    group = 0 if mpi.rank < 2 else 1
+
+    node_blocks = mpi.node_block_sum(arr, offset, group=group)
+
+    if mpi.rank == 0:
+        expected = np.zeros((7, 2))
+        for off, block in blocks.values():
+            expected[off:off + len(block)] += block
+        result = np.zeros((7, 2))
+        for off, block in node_blocks:
+            result[off:off + len(block)] += block
+        assert np.all(result == expected)
+        # Each row is received once.
+        assert sum(len(block) for _, block in node_blocks) == np.count_nonzero(expected[:, 0])
+    else:
+        assert node_blocks is None
+
+
+@pytest.mark.parallel(4)
+def test_node_block_sum_nodes(monkeypatch):
+    mpi.start_mpi()
+    world_comm = mpi.world_comm
+    # Pretend that ranks 1 and 3 share a node, and ranks 0 and 2 are each on their own.
+    node_comm = world_comm.Split(color={3: 1}.get(world_comm.rank, world_comm.rank),
+                                 key=world_comm.rank)
+    rank_comm = world_comm.Split(color=node_comm.rank, key=world_comm.rank)
+    monkeypatch.setattr(mpi, 'node_comm', node_comm)
+    monkeypatch.setattr(mpi, 'rank_comm', rank_comm)
+
+    # The nodes hold rows 0-2, 2-7 and 5-8, so rows 2 and 5-7 are summed across nodes,
+    # and the root does not hold rows 5-7.
+    blocks = {0: (0, np.ones((3, 2))), 1: (2, 2 * np.ones((4, 2))),
+              2: (5, 3 * np.ones((4, 2))), 3: (6, 4 * np.ones((2, 2)))}
+    blocks = {rank: blocks[rank] for rank in range(world_comm.Get_size())}
+    offset, arr = blocks.get(world_comm.rank, (0, np.zeros((0, 2))))
+
+    # Reduce two rows at a time.
+    node_blocks = mpi.node_block_sum(arr, offset, MAX_BYTES=2 * 2 * arr.itemsize)
+
+    if world_comm.rank == 0:
+        Nrows = max(off + len(block) for off, block in blocks.values())
+        expected = np.zeros((Nrows, 2))
+        for off, block in blocks.values():
+            expected[off:off + len(block)] += block
+        result = np.zeros((Nrows, 2))
+        for off, block in node_blocks:
+            result[off:off + len(block)] += block
+        assert np.all(result == expected)
+        assert sum(len(block) for _, block in node_blocks) == Nrows
+        if world_comm.Get_size() == 4:
+            assert sorted(off for off, _ in node_blocks) == [0, 2, 3, 5, 8]
+    else:
+        assert node_blocks is None
+    node_comm.Free()
+    rank_comm.Free()
+
+
+def test_node_block_sum_serial():
+    arr = np.arange(6, dtype=complex).reshape(3, 2)
+    node_blocks = mpi.node_block_sum(arr, 5)
+    assert len(node_blocks) == 1
+    assert node_blocks[0][0] == 5
+    assert np.all(node_blocks[0][1] == arr)
@@ -0,0 +1,147 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+from pyuvdata import UVData
+
+import pyuvsim
+from pyuvsim import planning
+from pyuvsim.data import DATA_PATH as SIM_DATA_PATH
+
+triangle_uvfits_file = os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits')
+
+
+@pytest.fixture(scope='module')
+def triangle_inputs():
+    uv = UVData()
+    uv.read_uvfits(triangle_uvfits_file)
+    sky, _ = pyuvsim.create_mock_catalog(
+        uv.time_array[0], arrangement='random', Nsrcs=2000, rseed=3
+    )
+    return uv, pyuvsim.simsetup.SkyModelData(sky)
+
+
+def test_plan_uvdata_simulation(triangle_inputs):
+    uv, catalog = triangle_inputs
+    beam_list = pyuvsim.BeamList(['analytic_gaussian_sig=0.08'])
+
+    plan = planning.plan_uvdata_simulation(
+        uv, beam_list, catalog, Npus=3, Npus_node=2, mem_per_node=4 * 2**30,
+        baseline_mem=2**20
+    )
+    assert not beam_list.string_mode
+    assert (plan['Nbls'], plan['Ntimes'], plan['Nfreqs']) == (uv.Nbls, uv.Ntimes, uv.Nfreqs)
+    assert plan['Nsrcs'] == 2000
+    assert plan['Nnodes'] == 2
+    # 1000 tasks split among 3 processes.
+    assert plan['Ntasks_local_max'] == 334
+    assert plan['Nsrcs_local_max'] == 2000
+    assert plan['Nsky_parts'] == 1
+    assert plan['fits']
+
+    assert plan['rank_mem'] == sum(plan['rank_mem_parts'].values())
+    assert plan['root_mem'] > plan['rank_mem']
+    assert plan['node_mem'] == plan['root_mem'] + plan['rank_mem'] + sum(
+        plan['node_mem_parts'][key]
+        for key in ['shared_catalog', 'shared_beams', 'shared_results'])
+    assert plan['rank_mem_parts']['baseline'] == 2**20
+    # The first node sums the visibilities of its two ranks' tasks.
+    assert plan['node_mem_parts']['shared_results'] == 667 * uv.Npols * 16
+    assert plan['root_mem_parts']['gather_buffers'] == 2 * 1000 * uv.Npols * 16
+    assert plan['root_mem_parts']['output'] > uv.Nblts * uv.Nfreqs * uv.Npols * 16
+
+    assert plan['runtime'] == planning.predict_runtime(
+        planning.default_costs, uv.Nbls, uv.Ntimes, uv.Nfreqs, 2000, 3
+    )
+
+
+def test_plan_sky_chunks(triangle_inputs):
+    # Less memory gives more sky chunks, and too little does not fit.
+    uv, catalog = triangle_inputs
+    beam_list = pyuvsim.BeamList(['analytic_uniform'])
+
+    skymodel_mem = pyuvsim.utils.estimate_skymodel_memory_usage(2000, 1)
+    Nsky_parts = []
+    for mem in [2**30, 2 * skymodel_mem, skymodel_mem]:
+        plan = planning.plan_uvdata_simulation(
+            uv, beam_list, catalog, Npus=1, mem_per_node=mem, baseline_mem=2**20
+        )
+        Nsky_parts.append(plan['Nsky_parts'])
+    assert Nsky_parts[0] == 1
+    assert Nsky_parts[1] > 1
+    assert Nsky_parts[2] > Nsky_parts[1]
+
+    plan = planning.plan_uvdata_simulation(
+        uv, beam_list, catalog, Npus=1, mem_per_node=2**16, baseline_mem=2**20
+    )
+    assert not plan['fits']
+    assert 'not expected to fit' in planning.format_plan(plan)
+
+
+def test_plan_lazy_spectra(triangle_inputs):
+    # Lazily evaluated spectra need fewer sky chunks.
+    uv, catalog = triangle_inputs
+    catalog = copy.deepcopy(catalog)
+    catalog.spectral_type = 'spectral_index'
+    catalog.reference_frequency = np.full(catalog.Ncomponents, 1e8)
+    catalog.spectral_index = np.full(catalog.Ncomponents, -0.8)
+    beam_list = pyuvsim.BeamList(['analytic_uniform'])
+
+    mem = 2 * pyuvsim.utils.estimate_skymodel_memory_usage(2000, 1)
+    plans = [
+        planning.plan_uvdata_simulation(
+            uv, beam_list, catalog, Npus=1, mem_per_node=mem, baseline_mem=2**20,
+            lazy_spectra=lazy
+        )
+        for lazy in [False, True]
+    ]
+    assert plans[1]['Nsky_parts'] < plans[0]['Nsky_parts']
+
+
+def test_plan_split_sources(triangle_inputs):
+    # More processes than tasks splits the sources.
+    uv, catalog = triangle_inputs
+    uv = uv.select(times=np.unique(uv.time_array)[:1], freq_chans=[0], inplace=False)
+    beam_list = pyuvsim.BeamList(['analytic_uniform'])
+
+    plan = planning.plan_uvdata_simulation(
+        uv, beam_list, catalog, Npus=20, mem_per_node=2**30, baseline_mem=0
+    )
+    assert plan['Nsrc_blocks'] > 1
+    assert plan['Ntask_blocks'] * plan['Nsrc_blocks'] <= 20
+    assert plan['Ntasks_local_max'] == np.ceil(uv.Nbls / plan['Ntask_blocks'])
+    assert plan['Nsrcs_local_max'] == np.ceil(2000 / plan['Nsrc_blocks'])
+    assert 'Blocks: {} of tasks'.format(plan['Ntask_blocks']) in planning.format_plan(plan)
+
+
+def test_plan_simulation():
+    param_filename = os.path.join(SIM_DATA_PATH, 'test_config', 'param_1time_1src_testcat.yaml')
+    plan = planning.plan_simulation(param_filename, Npus=2, mem_per_node=2**30)
+    assert plan['Nsrcs'] == 1
+    assert plan['Nsky_parts'] == 1
+    assert plan['fits']
+    assert 'Estimated runtime' in planning.format_plan(plan)
+
+
+def test_load_costs(tmpdir):
+    costs_file = str(tmpdir.join('costs.json'))
+    with open(costs_file, 'w') as cfile:
+        json.dump({'per_task': 1.0}, cfile)
+    costs = planning.load_costs(costs_file)
+    assert costs['per_task'] == 1.0
+    assert costs['overhead'] == planning.default_costs['overhead']
+
+    assert planning.predict_runtime(
+        costs, 2, 3, 4, 5, 1
+    ) > planning.predict_runtime(planning.default_costs, 2, 3, 4, 5, 1)
+
+    with open(costs_file, 'w') as cfile:
+        json.dump({'per_widget': 1.0}, cfile)
+    with pytest.raises(ValueError, match='Unknown cost terms'):
+        planning.load_costs(costs_file)
@@ -2,10 +2,13 @@
 # Copyright (c) 2018 Radio Astronomy Software Group
 # Licensed under the 3-clause BSD License
 
+import numpy as np
 from numpy import unique
 import os
 import atexit
+import json
 import shutil
+import time
 import pytest
 
 import pyuvsim
@@ -42,3 +45,271 @@ def test_profiler(tmpdir):
     assert len(lstats.timings) != 0
     func_names = [k[2] for k in lstats.timings.keys()]
     assert unique(func_names).tolist() == sorted(pyuvsim.profiling.default_profile_funcs)
+
+
+def test_write_phase_timings(tmpdir):
+    timer = pyuvsim.timing.phase_timer
+    timer.reset()
+    with pyuvsim.timing.phase('task_loop'):
+        timer.add('task_loop.beams', 0.5)
+    timer.add('gather', 0.25)
+    timer.set_stats('spline_cache', {'hits': 10, 'misses': 2, 'max_bytes': None})
+
+    prefix = str(tmpdir.join('timing'))
+    summary = pyuvsim.profiling.write_phase_timings(prefix + '.out')
+    timer.reset()
+
+    with open(prefix + '_rank0.json', 'r') as jfile:
+        rank_data = json.load(jfile)
+    assert rank_data['rank'] == 0
+    assert set(rank_data['phases'].keys()) == {'task_loop', 'task_loop.beams', 'gather'}
+    assert rank_data['stats'] == {'spline_cache': {'hits': 10, 'misses': 2}}
+
+    assert summary['gather']['max'] == 0.25
+    assert summary['task_loop.beams']['category'] == 'compute'
+    with open(prefix + '_summary.out', 'r') as sfile:
+        table = sfile.read()
+    assert 'task_loop.beams' in table
+    assert 'Time by category' in table
+    assert 'spline_cache.hits' in table
+
+
+def test_merge_stats(tmpdir):
+    files = []
+    for rank, hits in enumerate([1, 2, 6]):
+        fname = str(tmpdir.join('timing_rank{}.json'.format(rank)))
+        rank_data = {'rank': rank, 'Npus': 3, 'phases': {},
+                     'stats': {'spline_cache': {'hits': hits}}}
+        with open(fname, 'w') as jfile:
+            json.dump(rank_data, jfile)
+        files.append(fname)
+
+    stats = pyuvsim.profiling.merge_stats(files)
+    assert stats['spline_cache.hits'] == {'Nranks': 3, 'min': 1.0, 'mean': 3.0, 'max': 6.0,
+                                          'total': 9.0}
+    table = pyuvsim.profiling.format_stats_table(stats)
+    assert table.split('\n')[2].split() == ['spline_cache.hits', '3', '1', '3', '6', '9']
+
+
+def test_merge_phase_timings(tmpdir):
+    files = []
+    for rank, (loop_time, gather_time) in enumerate([(1.0, 3.0), (2.0, 2.0), (6.0, 1.0)]):
+        fname = str(tmpdir.join('timing_rank{}.json'.format(rank)))
+        phases = {'task_loop': {'total': loop_time, 'count': 1},
+                  'gather': {'total': gather_time, 'count': 1}}
+        if rank == 0:
+            phases['write'] = {'total': 0.5, 'count': 1}
+        with open(fname, 'w') as jfile:
+            json.dump({'rank': rank, 'Npus': 3, 'phases': phases}, jfile)
+        files.append(fname)
+
+    summary = pyuvsim.profiling.merge_phase_timings(files)
+    assert list(summary.keys()) == ['task_loop', 'gather', 'write']
+    assert summary['task_loop']['min'] == 1.0
+    assert summary['task_loop']['mean'] == 3.0
+    assert summary['task_loop']['max'] == 6.0
+    assert summary['task_loop']['calls'] == 3
+    assert summary['write']['Nranks'] == 1
+
+    table = pyuvsim.profiling.format_phase_table(summary)
+    lines = table.split('\n')
+    assert lines[0].split()[:2] == ['Phase', 'Category']
+    # Compute time dominates (max over ranks).
+    cat_lines = lines[lines.index('Time by category (max over ranks, top-level phases):') + 1:]
+    assert cat_lines[0].split()[0] == 'compute'
+
+
+def test_write_trace(tmpdir):
+    pyuvsim.profiling.set_tracer()
+    with pyuvsim.timing.phase('gather'):
+        pyuvsim.mpi.big_bcast(pyuvsim.mpi.world_comm, [1, 2, 3])
+
+    prefix = str(tmpdir.join('timeline'))
+    outfile = pyuvsim.profiling.write_trace(prefix + '.trace.json')
+    assert outfile == prefix + '.trace.json'
+    assert pyuvsim.timing.tracer is None
+
+    with open(outfile, 'r') as jfile:
+        trace = json.load(jfile)
+    names = [ev['name'] for ev in trace['traceEvents'] if ev['ph'] != 'M']
+    assert names == ['gather', 'big_bcast', 'gather']
+    assert min(ev['ts'] for ev in trace['traceEvents'] if 'ts' in ev) == 0
+
+
+def test_merge_traces(tmpdir):
+    files = []
+    for rank in range(2):
+        recorder = pyuvsim.timing.TraceRecorder(pid=rank)
+        recorder.instant('event')
+        fname = str(tmpdir.join('trace_rank{}.trace.json'.format(rank)))
+        with open(fname, 'w') as jfile:
+            json.dump(recorder.events, jfile)
+        files.append(fname)
+
+    trace = pyuvsim.profiling.merge_traces(files, str(tmpdir.join('trace.json')))
+    events = [ev for ev in trace['traceEvents'] if ev['ph'] == 'i']
+    assert [ev['pid'] for ev in events] == [0, 1]
+    assert events[0]['ts'] == 0
+    assert events[1]['ts'] >= 0
+    process_names = [ev['args']['name'] for ev in trace['traceEvents']
+                     if ev['name'] == 'process_name']
+    assert process_names == ['rank 0', 'rank 1']
+
+
+def _busy_loop(Niter):
+    total = 0
+    for ii in range(Niter):
+        total += ii ** 2
+    return total
+
+
+def test_sampler(tmpdir):
+    with pytest.raises(ValueError, match='clock must be one of'):
+        pyuvsim.profiling.StackSampler(clock='sundial')
+    with pytest.raises(ValueError, match='has not been started'):
+        pyuvsim.profiling.write_samples(str(tmpdir.join('samples')))
+
+    pyuvsim.profiling.set_sampler(frequency=1000)
+    t0 = time.process_time()
+    while time.process_time() - t0 < 0.2:
+        _busy_loop(10000)
+
+    prefix = str(tmpdir.join('samples'))
+    merged = pyuvsim.profiling.write_samples(prefix + '.collapsed')
+    assert pyuvsim.profiling.sampler is None
+
+    assert any(stack.endswith('test_profiler.py:_busy_loop') for stack in merged.keys())
+    assert pyuvsim.profiling.read_collapsed(prefix + '.collapsed') == {
+        stack: counts[0] for stack, counts in merged.items()
+    }
+    with open(prefix + '_frames.out', 'r') as ffile:
+        table = ffile.read()
+    assert 'test_profiler.py:_busy_loop' in table
+
+
+def test_merge_samples(tmpdir):
+    rank_samples = [
+        {'main;run;loop': 10, 'main;run;gather': 2},
+        {'main;run;loop': 20, 'main;run;gather': 4, 'main;run': 2},
+    ]
+    files = []
+    for rank, samples in enumerate(rank_samples):
+        fname = str(tmpdir.join('samples_rank{}.collapsed'.format(rank)))
+        with open(fname, 'w') as cfile:
+            for stack, count in samples.items():
+                cfile.write("{} {}\n".format(stack, count))
+        files.append(fname)
+
+    merged = pyuvsim.profiling.merge_samples(files)
+    assert merged['main;run;loop'].tolist() == [10, 20]
+    assert merged['main;run'].tolist() == [0, 2]
+
+    stats = pyuvsim.profiling.frame_stats(merged)
+    assert list(stats.keys())[:2] == ['main', 'run']
+    assert stats['run'] == {'min': 12, 'mean': 19.0, 'max': 26, 'std': 7.0, 'self': 1.0}
+    assert stats['loop']['std'] == 5.0
+
+    table = pyuvsim.profiling.format_sample_table(merged, frequency=10.)
+    assert 'Units: s' in table
+    assert 'gather' in table
+
+
+def test_memory_monitor(tmpdir):
+    pytest.importorskip('psutil')
+    with pytest.raises(ValueError, match='has not been started'):
+        pyuvsim.profiling.write_memory_timeline(str(tmpdir.join('memory')))
+
+    pyuvsim.profiling.set_memory_monitor(interval=0.01, trace_allocations=True, Ntop=3)
+    with pyuvsim.timing.phase('catalog_read'):
+        arr = np.ones(2**20)
+        time.sleep(0.05)
+    with pyuvsim.timing.phase('task_loop'):
+        del arr
+
+    prefix = str(tmpdir.join('memory'))
+    summary = pyuvsim.profiling.write_memory_timeline(prefix + '.out')
+    assert pyuvsim.profiling.monitor is None
+    assert pyuvsim.timing.phase_timer.listeners == []
+
+    with open(prefix + '_rank0.memory.json', 'r') as jfile:
+        rank_data = json.load(jfile)
+    phases = [smp['phase'] for smp in rank_data['samples']]
+    assert 'catalog_read' in phases
+    assert all(smp['rss'] > 0 for smp in rank_data['samples'])
+
+    assert list(summary['phases'].keys())[:3] == ['(none)', 'catalog_read', 'task_loop']
+    assert summary['Nnodes'] == 1
+    assert summary['top_rank'] == 0
+    assert len(summary['allocators']['catalog_read']['top']) == 3
+    assert summary['allocators']['catalog_read']['peak'] >= 2**23
+    with open(prefix + '_memory.out', 'r') as mfile:
+        table = mfile.read()
+    assert 'catalog_read' in table
+    assert 'Top allocators on rank 0' in table
+
+
+def test_merge_memory_timelines(tmpdir):
+    files = []
+    for rank, (host, rss) in enumerate([('node0', 2), ('node0', 3), ('node1', 4)]):
+        fname = str(tmpdir.join('memory_rank{}.memory.json'.format(rank)))
+        rank_data = {
+            'rank': rank, 'Npus': 3, 'hostname': host,
+            'samples': [{'time': 0, 'rss': rss, 'maxrss': rss, 'shared': 1, 'phase': 'gather'}],
+            'phases': {'gather': {'rss': rss, 'maxrss_growth': 1, 'shared': 1}},
+            'allocators': {},
+        }
+        with open(fname, 'w') as jfile:
+            json.dump(rank_data, jfile)
+        files.append(fname)
+
+    summary = pyuvsim.profiling.merge_memory_timelines(files)
+    assert summary['Nnodes'] == 2
+    assert summary['top_rank'] == 2
+    assert summary['phases']['gather'] == {
+        'rss_min': 2, 'rss_mean': 3.0, 'rss_max': 4, 'node_rss': 5,
+        'maxrss_growth': 3, 'shared': 1
+    }
+    assert 'Top allocators' not in pyuvsim.profiling.format_memory_table(summary)
+
+
+@pytest.mark.parametrize('fname', ['metrics.jsonl', 'metrics.prom'])
+def test_live_metrics(tmpdir, fname):
+    pytest.importorskip('psutil')
+    outfile = str(tmpdir.join(fname))
+    metrics = pyuvsim.profiling.set_live_metrics(outfile, interval=100.)
+    assert metrics.file_format == ('prometheus' if fname.endswith('.prom') else 'jsonl')
+    metrics.start(10, 2)
+    assert metrics.snapshot()['eta'] is None
+
+    # Updates are only posted once per interval, unless forced.
+    time.sleep(0.01)
+    metrics.update(4, 0)
+    assert metrics.snapshot()['tasks_done'] == 0
+    metrics.update(5, 1, force=True)
+    snap = metrics.snapshot()
+    assert snap['tasks_done'] == 5
+    assert snap['fraction_done'] == 0.5
+    assert snap['throughput'] > 0
+    assert snap['eta'] > 0
+    assert snap['ranks'][0]['sky_chunk'] == 1
+    assert snap['ranks'][0]['rss'] > 0
+
+    metrics.update(10, 1, force=True)
+    metrics.stop()
+    pyuvsim.profiling.live_metrics = None
+    assert metrics.board is None
+
+    with open(outfile, 'r') as mfile:
+        content = mfile.read()
+    if fname.endswith('.prom'):
+        assert 'pyuvsim_tasks_done{rank="0"} 10' in content
+        assert 'pyuvsim_eta_seconds 0.0' in content
+    else:
+        snap = json.loads(content.splitlines()[-1])
+        assert snap['tasks_done'] == 10
+        assert snap['eta'] == 0.0
+
+
+def test_live_metrics_errors():
+    with pytest.raises(ValueError, match='file_format must be'):
+        pyuvsim.profiling.LiveMetrics('metrics.txt', file_format='csv')
@@ -7,12 +7,14 @@ import os
 import pytest
 import yaml
 from astropy import units
+from astropy.coordinates import Latitude, Longitude
 
+import pyradiosky
 from pyuvdata import UVData
 from pyradiosky.utils import jy_to_ksr, stokes_to_coherency
 
 import pyuvsim
-from pyuvsim.astropy_interface import Time
+from pyuvsim.astropy_interface import SkyCoord, Time
 from pyuvsim.data import DATA_PATH as SIM_DATA_PATH
 from pyuvsim.analyticbeam import c_ms
 
@@ -235,3 +237,261 @@ def test_sim_on_moon():
     )
     assert np.allclose(uv_out.data_array[:, 0, :, 0], 0.5)
     assert uv_out.extra_keywords['world'] == 'moon'
+
+
+@pytest.mark.parametrize('lean_output', [False, True])
+def test_lean_output(lean_output):
+    # Outputs are returned with writable flag and nsample arrays unless lean.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:2], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(time, arrangement='zenith', return_data=True)
+
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True,
+                                            lean_output=lean_output)
+    for key in ['flag_array', 'nsample_array']:
+        assert getattr(uv_out, key).flags.writeable != lean_output
+    if not lean_output:
+        uv_out.flag_array[0] = True
+        assert np.sum(uv_out.flag_array) == uv_out.Nspws * uv_out.Nfreqs * uv_out.Npols
+
+
+def test_pipeline(tmpdir):
+    # Pipelined runs give the same visibilities, and write each time once it is finished.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:3], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(
+        time, arrangement='random', Nsrcs=20, rseed=1, return_data=True
+    )
+
+    uv_ref = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True)
+
+    filename = str(tmpdir.join('pipeline.uvh5'))
+    writer = pyuvsim.uvsim._UVH5BlockWriter(filename, 'Pipelined run.')
+    pyuvsim.timing.phase_timer.reset()
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(
+        uv_obj, beam_list, catalog=sources, quiet=True, pipeline=True, block_writer=writer,
+        task_order='auto'
+    )
+    assert np.allclose(uv_out.data_array, uv_ref.data_array)
+    stats = pyuvsim.timing.phase_timer.stats['pipeline']
+    assert stats['Nblocks_written'] == uv_obj.Ntimes
+
+    uv_file = UVData()
+    uv_file.read_uvh5(filename)
+    assert uv_file.history.startswith('Pipelined run.')
+    assert np.allclose(uv_file.data_array, uv_ref.data_array)
+
+
+def test_pipeline_skipped_times(tmpdir):
+    # Times with no sources above the horizon have no tasks, but are still written.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:3], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    # Sources near the north celestial pole never rise at this southern latitude.
+    Nsrcs = 4
+    stokes = np.zeros((4, 1, Nsrcs))
+    stokes[0] = 1
+    sky = pyradiosky.SkyModel(name=np.arange(Nsrcs).astype(str),
+                              ra=Longitude(np.linspace(0, 2 * np.pi, Nsrcs), 'rad'),
+                              dec=Latitude(np.full(Nsrcs, 75), 'deg'),
+                              stokes=stokes * units.Jy, spectral_type='flat')
+    sources = pyuvsim.simsetup.SkyModelData(sky)
+
+    filename = str(tmpdir.join('pipeline.uvh5'))
+    writer = pyuvsim.uvsim._UVH5BlockWriter(filename, 'Pipelined run.')
+    pyuvsim.timing.phase_timer.reset()
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(
+        uv_obj, beam_list, catalog=sources, quiet=True, pipeline=True, block_writer=writer,
+        horizon_buffer=0.04364
+    )
+    assert np.all(uv_out.data_array == 0)
+    assert pyuvsim.timing.phase_timer.stats['active_sources']['active_fraction'] == 0
+    assert pyuvsim.timing.phase_timer.stats['pipeline']['Nblocks_written'] == uv_obj.Ntimes
+
+
+@pytest.mark.parametrize('order', ['auto', 'freq,baseline,time'])
+def test_task_order_rise_set(order):
+    # With a horizon buffer, the sky is only rebuilt for each time when time is the
+    # outer loop.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:3], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(
+        time, arrangement='random', Nsrcs=20, rseed=1, return_data=True
+    )
+
+    pyuvsim.timing.phase_timer.reset()
+    uv_ref = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True)
+    assert 'active_sources' not in pyuvsim.timing.phase_timer.stats
+
+    pyuvsim.timing.phase_timer.reset()
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True,
+                                            task_order=order, horizon_buffer=0.04364)
+    assert np.allclose(uv_out.data_array, uv_ref.data_array)
+    stats = pyuvsim.timing.phase_timer.stats
+    if order == 'auto':
+        assert stats['task_order']['Nsky_updates'] == uv_obj.Ntimes
+        assert stats['active_sources']['Nsky_updates'] == uv_obj.Ntimes
+    else:
+        assert stats['task_order']['Nsky_updates'] == 0
+        assert 'active_sources' not in stats
+
+
+def test_parallel_write(tmpdir):
+    # Visibilities written by each process match those gathered on the root.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:2], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(
+        time, arrangement='random', Nsrcs=20, rseed=1, return_data=True
+    )
+
+    uv_ref = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True)
+
+    filename = str(tmpdir.join('parallel.uvh5'))
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(
+        uv_obj, beam_list, catalog=sources, quiet=True, parallel_outfile=filename
+    )
+    assert uv_out.metadata_only
+    uv_file = UVData()
+    uv_file.read_uvh5(filename)
+    assert np.allclose(uv_file.data_array, uv_ref.data_array)
+
+    with pytest.raises(ValueError, match="Pipelined runs cannot also write"):
+        pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True,
+                                       pipeline=True, parallel_outfile=filename)
+
+
+@pytest.mark.parametrize('phase_center', ['zenith', 'off_zenith'])
+def test_phase_center(phase_center):
+    # Visibilities phased in the engine match drift scans phased by pyuvdata.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:2], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(
+        time, arrangement='random', Nsrcs=20, rseed=1, return_data=True
+    )
+    if phase_center == 'off_zenith':
+        phase_center = SkyCoord(ra=uv_obj.lst_array[0] * units.rad + 5 * units.deg,
+                                dec=-25 * units.deg, frame='icrs')
+
+    uv_ref = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True)
+    pyuvsim.uvsim._phase_metadata(
+        uv_ref, pyuvsim.uvsim._get_phase_center(phase_center, uv_obj)
+    )
+
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True,
+                                            phase_center=phase_center)
+    assert np.allclose(uv_out.uvw_array, uv_ref.uvw_array)
+    assert np.allclose(uv_out.data_array, uv_ref.data_array,
+                       atol=1e-5 * np.max(np.abs(uv_ref.data_array)))
+
+    with pytest.raises(ValueError, match="phase_center must be 'zenith' or a SkyCoord"):
+        pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True,
+                                       phase_center='north')
+
+
+def test_phase_center_metadata(monkeypatch):
+    # The output is phased before its arrays are allocated, to the same uvws and phase
+    # center as a full object phased by pyuvdata.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits'))
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:2], freq_chans=[0, 1])
+    phase_center = SkyCoord(ra=uv_obj.lst_array[0] * units.rad + 5 * units.deg,
+                            dec=-25 * units.deg, frame='icrs')
+    phase_center = pyuvsim.uvsim._get_phase_center(phase_center, uv_obj)
+
+    uv_ref = pyuvsim.simsetup._complete_uvdata(uv_obj)
+    pyuvsim.uvsim._phase_metadata(uv_ref, phase_center)
+
+    phased_data = []
+    uvdata_phase = UVData.phase
+
+    def phase(self, *args, **kwargs):
+        phased_data.append(self.data_array)
+        return uvdata_phase(self, *args, **kwargs)
+
+    monkeypatch.setattr(UVData, 'phase', phase)
+    uv_out = pyuvsim.uvsim._make_output(uv_obj, phase_center=phase_center)
+    assert len(phased_data) == 1
+    assert phased_data[0] is None
+
+    assert np.allclose(uv_out.uvw_array, uv_ref.uvw_array)
+    if getattr(uv_ref, 'phase_center_catalog', None) is not None:
+        assert uv_out.phase_center_catalog == uv_ref.phase_center_catalog
+    else:
+        assert uv_out.phase_center_ra == uv_ref.phase_center_ra
+        assert uv_out.phase_center_dec == uv_ref.phase_center_dec
+    assert uv_out.data_array.shape == uv_ref.data_array.shape
+    assert np.all(uv_out.data_array == 0)
+
+
+def test_run_template():
+    # Metadata only templates give the same visibilities as full UVData objects.
+    filename = os.path.join(SIM_DATA_PATH, '28mEWbl_10time_10chan.uvfits')
+    uv_obj = UVData()
+    uv_obj.read_uvfits(filename)
+    times = np.unique(uv_obj.time_array)[:2]
+    uv_obj.select(times=times, freq_chans=[0, 1])
+    uv_template = pyuvsim.simsetup.read_uvdata_template(filename, times=times,
+                                                        freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList(['analytic_airy_diam=14.0'])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(
+        time, arrangement='random', Nsrcs=20, rseed=1, return_data=True
+    )
+
+    uv_ref = pyuvsim.uvsim.run_uvdata_uvsim(uv_obj, beam_list, catalog=sources, quiet=True)
+    uv_out = pyuvsim.uvsim.run_uvdata_uvsim(uv_template, beam_list, catalog=sources,
+                                            quiet=True)
+    assert np.allclose(uv_out.data_array, uv_ref.data_array)
+
+
+def test_adaptive_sky_chunks():
+    # The memory ceiling is set to start with two chunks. It is below the memory already
+    # in use, so the rest of the sources are done in the smallest chunks (one source each).
+    # This should not change the result.
+    param_filename = os.path.join(SIM_DATA_PATH, 'test_config', 'obsparam_hex37_14.6m.yaml')
+    param_dict = pyuvsim.simsetup._config_str_to_dict(param_filename)
+    param_dict['select'] = {'redundant_threshold': 0.1}
+    uv_obj, beam_list, beam_dict = pyuvsim.initialize_uvdata_from_params(param_dict)
+    uv_obj.select(times=uv_obj.time_array[0])
+
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, kwds = pyuvsim.create_mock_catalog(
+        time, arrangement='long-line', Nsrcs=30, return_data=True
+    )
+
+    uv_fixed = pyuvsim.uvsim.run_uvdata_uvsim(
+        uv_obj, beam_list, beam_dict, catalog=sources, quiet=True
+    )
+
+    Npus_node = pyuvsim.mpi.node_comm.Get_size()
+    max_mem = pyuvsim.utils.estimate_skymodel_memory_usage(30, 1) * Npus_node
+    pyuvsim.timing.phase_timer.reset()
+    uv_adaptive = pyuvsim.uvsim.run_uvdata_uvsim(
+        uv_obj, beam_list, beam_dict, catalog=sources, quiet=True, max_mem_per_node=max_mem,
+        adaptive_sky_chunks=True
+    )
+    assert pyuvsim.timing.phase_timer.counts['task_loop.sky_chunk'] == 16
+    assert np.allclose(uv_fixed.data_array, uv_adaptive.data_array)
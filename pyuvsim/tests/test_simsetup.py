@@ -884,6 +884,30 @@ def test_uvfits_to_config():
     assert simtest.compare_dictionaries(param_dict, orig_param_dict)
 
 
+def test_read_uvdata_template(tmp_path):
+    uv_full = UVData()
+    uv_full.read_uvfits(triangle_uvfits_file)
+    times = np.unique(uv_full.time_array)[:2]
+    uv_full.select(times=times, freq_chans=[0, 1])
+
+    uv_obj = pyuvsim.simsetup.read_uvdata_template(triangle_uvfits_file, times=times,
+                                                   freq_chans=[0, 1])
+    assert uv_obj.metadata_only
+    assert uv_obj.polarization_array.tolist() == [-5, -6, -7, -8]
+    assert np.array_equal(uv_obj.time_array, uv_full.time_array)
+    assert np.array_equal(uv_obj.freq_array, uv_full.freq_array)
+    assert np.array_equal(uv_obj.baseline_array, uv_full.baseline_array)
+
+    # Config files only need the metadata.
+    pyuvsim.simsetup.uvdata_to_config_file(uv_obj, path_out=str(tmp_path))
+    param_dict = pyuvsim.simsetup._config_str_to_dict(str(tmp_path / 'obsparam.yaml'))
+    assert param_dict['time']['Ntimes'] == 2
+    assert param_dict['freq']['Nfreqs'] == 2
+
+    with pytest.raises(ValueError, match="must have every baseline at each time"):
+        pyuvsim.simsetup.read_uvdata_template(triangle_uvfits_file, blt_inds=[0, 1, 12])
+
+
 def test_mock_catalogs():
     time = Time(2458098.27471265, scale='utc', format='jd')
 
@@ -1109,6 +1133,23 @@ def test_moon_lsts():
     assert new_obj.check()
 
 
+def test_complete_uvdata_lean():
+    # Lean containers only allocate the data array.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(triangle_uvfits_file)
+    uv_full = pyuvsim.simsetup._complete_uvdata(uv_obj)
+    uv_lean = pyuvsim.simsetup._complete_uvdata(uv_obj, lean=True)
+    assert uv_lean.check()
+    assert np.all(uv_lean.data_array == 0)
+    for key in ['flag_array', 'nsample_array']:
+        arr = getattr(uv_lean, key)
+        assert np.array_equal(arr, getattr(uv_full, key))
+        assert arr.dtype == getattr(uv_full, key).dtype
+        assert not arr.flags.writeable
+        # A single value, broadcast to the full shape.
+        assert arr.strides == (0,) * arr.ndim
+
+
 @pytest.mark.filterwarnings("ignore:The _ra parameters are not")
 @pytest.mark.filterwarnings("ignore:The _dec parameters are not")
 @pytest.mark.filterwarnings("ignore:Future equality does not pass")
@@ -1274,3 +1315,77 @@ def test_set_lsts_errors():
     uv0.extra_keywords['world'] = 'tatooine'
     with pytest.raises(ValueError, match="Invalid world tatooine."):
         pyuvsim.simsetup._set_lsts_on_uvdata(uv0)
+
+
+def test_parse_simulation_params():
+    param_filename = os.path.join(SIM_DATA_PATH, 'test_config', 'param_1time_1src_testcat.yaml')
+    assert pyuvsim.simsetup.parse_simulation_params(param_filename) == {}
+
+    param_dict = {'simulation': {'max_mem_per_node': 2, 'adaptive_sky_chunks': False}}
+    sim_kwargs = pyuvsim.simsetup.parse_simulation_params(param_dict)
+    assert sim_kwargs == {'max_mem_per_node': 2 * 2**30, 'adaptive_sky_chunks': False}
+
+    param_dict = {'simulation': {'max_memory': 2}}
+    with pytest.raises(ValueError, match='Unrecognized simulation parameters: max_memory'):
+        pyuvsim.simsetup.parse_simulation_params(param_dict)
+
+
+def test_parse_simulation_params_beam_options():
+    param_dict = {'simulation': {'beam_lookup': True}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'beam_lookup': {}}
+
+    param_dict = {'simulation': {'beam_lookup': False}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {}
+
+    param_dict = {'simulation': {'power_beam': True}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'power_beam': True}
+
+    param_dict = {'simulation': {'spline_cache_mem': 0.5}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'spline_cache_mem': 2**29}
+
+    param_dict = {'simulation': {'beam_cache_dir': 'beam_cache'}}
+    sim_kwargs = pyuvsim.simsetup.parse_simulation_params(param_dict)
+    assert sim_kwargs == {'beam_cache_dir': 'beam_cache'}
+
+    param_dict = {'simulation': {'lazy_spectra': True}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'lazy_spectra': True}
+
+    param_dict = {'simulation': {'task_order': 'auto'}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'task_order': 'auto'}
+
+    param_dict = {'simulation': {'pipeline': True}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'pipeline': True}
+
+    param_dict = {'simulation': {'horizon_buffer': '0.04364'}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'horizon_buffer': 0.04364}
+
+    lookup_opts = {'resolution': 0.5, 'kind': 'linear', 'tolerance': 1e-3}
+    param_dict = {'simulation': {'beam_lookup': lookup_opts}}
+    sim_kwargs = pyuvsim.simsetup.parse_simulation_params(param_dict)
+    assert sim_kwargs == {'beam_lookup': lookup_opts}
+
+    param_dict = {'simulation': {'beam_lookup': {'order': 3}}}
+    with pytest.raises(ValueError, match='Unrecognized beam_lookup parameters: order'):
+        pyuvsim.simsetup.parse_simulation_params(param_dict)
+
+    param_dict = {'simulation': {'beam_lookup': 'cubic'}}
+    with pytest.raises(ValueError, match='beam_lookup must be a boolean or a dictionary'):
+        pyuvsim.simsetup.parse_simulation_params(param_dict)
+
+
+def test_parse_simulation_params_phase_center():
+    param_dict = {'simulation': {'phase_center': 'zenith'}}
+    assert pyuvsim.simsetup.parse_simulation_params(param_dict) == {'phase_center': 'zenith'}
+
+    param_dict = {'simulation': {'phase_center': {'ra': 30, 'dec': -30}}}
+    phase_center = pyuvsim.simsetup.parse_simulation_params(param_dict)['phase_center']
+    assert np.isclose(phase_center.ra.deg, 30)
+    assert np.isclose(phase_center.dec.deg, -30)
+
+    param_dict = {'simulation': {'phase_center': {'ra': 30}}}
+    with pytest.raises(ValueError, match='phase_center must have the keys ra and dec'):
+        pyuvsim.simsetup.parse_simulation_params(param_dict)
+
+    param_dict = {'simulation': {'phase_center': 'north'}}
+    with pytest.raises(ValueError, match="phase_center must be 'zenith' or a dictionary"):
+        pyuvsim.simsetup.parse_simulation_params(param_dict)
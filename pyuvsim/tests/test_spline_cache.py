@@ -0,0 +1,117 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import copy
+
+import numpy as np
+import pytest
+
+import pyuvsim
+from pyuvsim.spline_cache import SplineCache, spline_nbytes
+
+
+@pytest.fixture()
+def beam_list(cst_beam):
+    beam = cst_beam.copy()
+    beam.interpolation_function = 'az_za_simple'
+    beam.freq_interp_kind = 'linear'
+    return pyuvsim.BeamList([beam, pyuvsim.AnalyticBeam('airy', diameter=14.0)])
+
+
+def _interp(beam, freq):
+    beam.interp(az_array=np.array([0.1, 1.0]), za_array=np.array([0.2, 0.5]),
+                freq_array=np.array([freq]), reuse_spline=True)
+
+
+def test_spline_cache_stats(beam_list):
+    beam_list.set_spline_cache()
+    cache = beam_list.spline_cache
+    beam = beam_list[0]
+    assert beam.saved_interp_functions.cache is cache
+
+    # Two vector axes and two feeds per frequency.
+    _interp(beam, 123e6)
+    assert cache.stats()['misses'] == 4
+    assert len(beam.saved_interp_functions) == 4
+    _interp(beam, 123e6)
+    stats = cache.stats()
+    assert stats['hits'] == 4
+    assert stats['misses'] == 4
+    assert stats['evictions'] == 0
+    assert stats['max_bytes'] is None
+
+    # The size is that of the real and imaginary splines.
+    spline_size = spline_nbytes(beam.saved_interp_functions[(123e6, 0, 0)])
+    assert spline_size > beam.Naxes1 * beam.Naxes2 * 8
+    assert stats['nbytes'] == stats['peak_nbytes'] == 4 * spline_size
+
+    # Copies of the beam do not share the cache.
+    assert copy.deepcopy(beam).saved_interp_functions == {}
+
+
+def test_spline_cache_eviction(beam_list):
+    beam = beam_list[0]
+    _interp(beam, 123e6)
+    spline_size = spline_nbytes(beam.saved_interp_functions[(123e6, 0, 0)])
+
+    # Room for the splines of one frequency.
+    beam_list.set_spline_cache(max_bytes=4.5 * spline_size)
+    cache = beam_list.spline_cache
+    _interp(beam, 123e6)
+    _interp(beam, 140e6)
+    stats = cache.stats()
+    assert stats['misses'] == 8
+    assert stats['evictions'] == 4
+    assert stats['nbytes'] <= cache.max_bytes
+    # The least recently used splines were evicted.
+    assert (123e6, 0, 0) not in beam.saved_interp_functions
+    assert (140e6, 0, 0) in beam.saved_interp_functions
+
+    # Reused splines become the most recently used.
+    _interp(beam, 123e6)
+    _interp(beam, 123e6)
+    assert cache.hits == 4
+    assert (140e6, 0, 0) not in beam.saved_interp_functions
+
+
+def test_beam_list_spline_cache(beam_list):
+    beam_list.set_spline_cache()
+    cache = beam_list.spline_cache
+    _interp(beam_list[0], 123e6)
+    assert len(cache) == 4
+
+    # Replacing the beam drops its splines.
+    new_beam = beam_list[0].copy()
+    beam_list[0] = new_beam
+    assert len(cache) == 0
+    assert new_beam.saved_interp_functions.cache is cache
+
+    _interp(new_beam, 123e6)
+    cache.clear(beam_key=1)
+    assert len(cache) == 4
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+    assert cache.misses == 8
+
+    beam_list[0].extra_keywords['beam_path'] = 'beam.fits'
+    beam_list.set_str_mode()
+    assert beam_list.spline_cache is cache
+
+
+def test_spline_cache_mapping():
+    class Beam:
+        pass
+
+    beam = Beam()
+    cache = SplineCache(max_bytes=0)
+    cache.attach(beam, 'beam')
+    view = beam.saved_interp_functions
+    view['a'] = np.sin
+    # Functions without splines have no size, and fit in any budget.
+    assert cache.nbytes == 0
+    assert list(view) == ['a']
+    assert view['a'] is np.sin
+    del view['a']
+    assert len(view) == 0
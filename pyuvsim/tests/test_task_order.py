@@ -0,0 +1,118 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import os
+
+import numpy as np
+import pytest
+from pyuvdata import UVData
+
+import pyuvsim
+from pyuvsim import task_order
+from pyuvsim.data import DATA_PATH as SIM_DATA_PATH
+
+triangle_uvfits_file = os.path.join(SIM_DATA_PATH, '28m_triangle_10time_10chan.uvfits')
+
+# Baselines alternate between two beam pairs.
+shape = (2, 3, 4)
+beam_pairs = [(0, 0), (0, 1), (0, 0), (0, 1)]
+
+
+def test_count_task_updates():
+    task_inds = np.arange(np.prod(shape))
+    counts = task_order.count_task_updates(task_inds, shape, beam_pairs, spline_beams=[1])
+    assert counts['Ntasks'] == 24
+    assert counts['Nposition_updates'] == 2
+    assert counts['Nbeam_updates'] == 24
+    # Beam 1 is used at all three frequencies.
+    assert counts['Nspline_fits'] == 3
+
+    counts = task_order.count_task_updates(task_inds, shape, beam_pairs, spline_beams=[1],
+                                           spline_capacity=1)
+    assert counts['Nspline_fits'] == 6
+
+    counts = task_order.count_task_updates(task_inds, shape, beam_pairs, spline_beams=[1],
+                                           spline_capacity=0)
+    assert counts['Nspline_fits'] == 12
+
+    counts = task_order.count_task_updates(task_inds, shape, beam_pairs, rebuild_sky=True)
+    assert counts['Nsky_updates'] == 2
+
+    counts = task_order.count_task_updates([], shape, beam_pairs)
+    assert counts['Nbeam_updates'] == 0
+
+
+def test_plan_task_order():
+    task_inds = np.arange(3, 20)
+    ordered, report = task_order.plan_task_order(task_inds, shape, beam_pairs, 100,
+                                                 order=task_order.default_order)
+    assert sorted(ordered) == list(task_inds)
+    assert report['order'] == 'time,freq,baseline'
+    # Grouping the baselines by beam pair halves the beam updates.
+    default_counts = task_order.count_task_updates(task_inds, shape, beam_pairs)
+    assert report['Nbeam_updates'] < default_counts['Nbeam_updates']
+    assert report['beam_reuse'] > 0
+    assert report['position_reuse'] == 1 - 2 / 17
+
+    # With splines for one frequency in the cache, frequency goes outside time.
+    ordered, report = task_order.plan_task_order(
+        np.arange(24), shape, beam_pairs, 100, spline_beams=[0, 1], spline_capacity=1
+    )
+    assert report['order'].index('freq') < report['order'].index('time')
+    assert report['Nspline_fits'] == 6
+
+    # Without spline evictions, the default order is kept.
+    _, report = task_order.plan_task_order(np.arange(24), shape, beam_pairs, 100,
+                                           spline_beams=[0, 1])
+    assert report['order'] == task_order.default_order
+
+
+def test_plan_task_order_error():
+    with pytest.raises(ValueError, match="Task order must list each of"):
+        task_order.plan_task_order(np.arange(24), shape, beam_pairs, 100, order='time,freq')
+    with pytest.raises(ValueError, match="Task order must have time as the outer loop"):
+        task_order.plan_task_order(np.arange(24), shape, beam_pairs, 100,
+                                   order='freq,time,baseline', outer_axis='time')
+
+
+def test_plan_task_order_outer_axis():
+    # Cheaper with frequency outside, but time is kept as the outer loop.
+    _, report = task_order.plan_task_order(
+        np.arange(24), shape, beam_pairs, 100, spline_beams=[0, 1], spline_capacity=1,
+        outer_axis='time'
+    )
+    assert report['order'].startswith('time')
+
+
+@pytest.mark.parametrize('order', ['auto', 'freq,time,baseline'])
+def test_engine_reuse(order):
+    # The engine reuses what the plan predicts, and the visibilities do not change.
+    uv = UVData()
+    uv.read_uvfits(triangle_uvfits_file)
+    uv.select(times=np.unique(uv.time_array)[:2], freq_chans=[0, 1])
+    beam_list = pyuvsim.BeamList([pyuvsim.AnalyticBeam('airy', diameter=14.0),
+                                  pyuvsim.AnalyticBeam('airy', diameter=10.0)])
+    beam_dict = {'ANT1': 0, 'ANT2': 0, 'ANT3': 1, 'ANT4': 1}
+    sources, _ = pyuvsim.create_mock_catalog(uv.time_array[0], arrangement='zenith',
+                                             return_data=True)
+    shape = (uv.Ntimes, uv.Nfreqs, uv.Nbls)
+    task_inds = np.arange(np.prod(shape))
+    ordered, report = task_order.plan_task_order(
+        task_inds, shape, pyuvsim.uvsim._baseline_beam_pairs(uv, beam_dict),
+        sources.Ncomponents, order=order
+    )
+
+    vis = []
+    for inds in [task_inds, ordered]:
+        engine = pyuvsim.UVEngine()
+        vis_dict = {}
+        for task in pyuvsim.uvdata_to_task_iter(inds, uv, sources, beam_list, beam_dict):
+            engine.set_task(task)
+            vis_dict[task.uvdata_index] = engine.make_visibility()
+        vis.append(vis_dict)
+    stats = engine.reuse_stats()
+    for key in ['Ntasks', 'Nposition_updates', 'Nbeam_updates', 'beam_reuse']:
+        assert stats[key] == report[key]
+    for key in vis[0]:
+        assert np.allclose(vis[0][key], vis[1][key])
@@ -1,6 +1,7 @@
 
 import os
 import copy
+import numpy as np
 from astropy.coordinates import EarthLocation
 
 from pyuvdata import UVBeam
@@ -188,3 +189,45 @@ def test_beamlist_errors(beam_objs):
     tel0 = pyuvsim.Telescope('tel0', array_location, newbeams)
     tel1 = pyuvsim.Telescope('tel1', array_location, beam_objs)
     assert tel0 != tel1
+
+
+def test_crop_uvbeam(cst_beam):
+    # Make a beam with more frequencies to crop.
+    beam = cst_beam.copy()
+    for shift in [30e6, 60e6, 90e6, 120e6]:
+        beam2 = cst_beam.copy()
+        beam2.freq_array = beam2.freq_array + shift
+        beam += beam2
+    assert beam.Nfreqs == 10
+    assert np.degrees(beam.axis2_array.max()) == 180
+
+    cropped = beam.copy()
+    pyuvsim.telescope._crop_uvbeam(cropped, [175e6, 185e6], freq_margin=1)
+    # The bracketing frequencies are 153 and 210 MHz, plus one channel on each side.
+    assert np.allclose(np.sort(cropped.freq_array[0]), [150e6, 153e6, 180e6, 183e6, 210e6, 213e6])
+    # 0 to 90 degrees, plus three more pixels.
+    assert cropped.Naxes2 == 94
+    assert np.isclose(np.degrees(cropped.axis2_array.max()), 93)
+    expected = beam.select(frequencies=cropped.freq_array[0], axis2_inds=np.arange(94),
+                           inplace=False)
+    assert cropped == expected
+
+    # Keep at least four frequencies for cubic interpolation.
+    cropped = beam.copy()
+    pyuvsim.telescope._crop_uvbeam(cropped, [123e6], freq_margin=0)
+    assert cropped.Nfreqs == 4
+    assert np.min(cropped.freq_array) == 123e6
+
+
+def test_set_obj_mode_crop():
+    beamlist = pyuvsim.BeamList([herabeam_default])
+    beamlist.set_obj_mode()
+    full_beam = beamlist[0]
+    beamlist.set_str_mode()
+    beamlist.set_obj_mode(freq_array=full_beam.freq_array[0, :1])
+    cropped_beam = beamlist[0]
+
+    assert cropped_beam.Naxes2 < full_beam.Naxes2
+    assert np.max(cropped_beam.axis2_array) < np.pi / 2 + 0.1
+    assert cropped_beam.Nfreqs == min(full_beam.Nfreqs, 5)
+    assert cropped_beam.data_array.nbytes < full_beam.data_array.nbytes
@@ -0,0 +1,95 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+import time
+
+import pytest
+
+from pyuvsim import timing
+
+
+def test_phase_timer():
+    timer = timing.PhaseTimer()
+    assert timer.current_phase is None
+
+    with timer.phase('outer'):
+        assert timer.current_phase == 'outer'
+        with timer.phase('outer.inner'):
+            assert timer.current_phase == 'outer.inner'
+            time.sleep(0.01)
+        assert timer.current_phase == 'outer'
+    assert timer.current_phase is None
+
+    timer.add('outer.inner', 1.0)
+
+    times = timer.to_dict()
+    assert list(times.keys()) == ['outer.inner', 'outer']
+    assert times['outer.inner']['count'] == 2
+    assert times['outer']['count'] == 1
+    assert times['outer']['total'] >= 0.01
+    assert times['outer.inner']['total'] > times['outer']['total']
+
+    timer.reset()
+    assert timer.to_dict() == {}
+
+
+def test_phase_timer_exception():
+    # The phase should still be closed if an error is raised within it.
+    timer = timing.PhaseTimer()
+    with pytest.raises(ValueError, match='oops'):
+        with timer.phase('broken'):
+            raise ValueError('oops')
+    assert timer.current_phase is None
+    assert timer.counts['broken'] == 1
+
+
+def test_phase_listeners():
+    timer = timing.PhaseTimer()
+    events = []
+    timer.listeners.append(lambda event, name: events.append((event, name)))
+    with timer.phase('a'):
+        with timer.phase('a.b'):
+            pass
+    assert events == [('start', 'a'), ('start', 'a.b'), ('stop', 'a.b'), ('stop', 'a')]
+
+
+@pytest.mark.parametrize(
+    ('name', 'category'),
+    [('task_loop', 'compute'), ('task_loop.beams', 'compute'), ('gather', 'comm'),
+     ('gather.assemble', 'comm'), ('write', 'io'), ('something_else', 'other')]
+)
+def test_phase_category(name, category):
+    assert timing.get_phase_category(name) == category
+
+
+def test_trace_recorder():
+    recorder = timing.start_tracing(pid=3)
+    try:
+        with timing.phase('task_loop'):
+            timing.trace_instant('sky_chunk_switch', cat='compute', chunk=0)
+            with timing.trace('beam_interp', cat='compute', beam_id=1):
+                time.sleep(0.001)
+    finally:
+        assert timing.stop_tracing() is recorder
+    assert timing.tracer is None
+    assert recorder.on_phase not in timing.phase_timer.listeners
+
+    events = [ev for ev in recorder.events if ev['ph'] != 'M']
+    assert [(ev['name'], ev['ph']) for ev in events] == [
+        ('task_loop', 'B'), ('sky_chunk_switch', 'i'), ('beam_interp', 'X'), ('task_loop', 'E')
+    ]
+    assert all(ev['pid'] == 3 for ev in recorder.events)
+    assert events[0]['cat'] == 'compute'
+    assert events[1]['args'] == {'chunk': 0}
+    assert events[2]['args'] == {'beam_id': 1}
+    assert events[2]['dur'] >= 1e3
+    assert events[0]['ts'] <= events[2]['ts'] <= events[3]['ts']
+
+
+def test_trace_off():
+    assert timing.tracer is None
+    with timing.trace('nothing'):
+        pass
+    timing.trace_instant('nothing')
+    assert timing.stop_tracing() is None
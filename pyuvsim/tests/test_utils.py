@@ -4,6 +4,7 @@
 
 import os
 
+import h5py
 import numpy as np
 import pytest
 from pyuvdata import UVData
@@ -152,3 +153,123 @@ def test_file_format_in_filing_dict(tmpdir):
 
     # Cleanup
     os.remove(ofname + '.uvfits')
+
+
+def test_parallel_uvh5(tmpdir):
+    # Visibilities written in parts match those of a full write.
+    uv = UVData()
+    uv.read_uvfits(triangle_uvfits_file)
+    uv.flag_array[:10] = True
+    ofname = str(tmpdir.join('parallel.uvh5'))
+    # Flags and nsamples are written a few baseline-times at a time.
+    layout = simutils.initialize_uvh5_parallel(uv, ofname, slab_size=3 * uv.Nfreqs * uv.Npols)
+    with h5py.File(ofname, 'r') as h5file:
+        assert layout['shape'] == h5file['Data/visdata'].shape
+
+    blt_inds, freq_inds = np.unravel_index(np.arange(uv.Nblts * uv.Nfreqs),
+                                           (uv.Nblts, uv.Nfreqs))
+    for part in np.array_split(np.arange(blt_inds.size), 3)[::-1]:
+        simutils.write_uvh5_visibilities(ofname, layout, blt_inds[part], freq_inds[part],
+                                         uv.data_array[blt_inds[part], 0, freq_inds[part]])
+
+    uv_new = UVData()
+    uv_new.read_uvh5(ofname)
+    assert np.all(uv_new.data_array == uv.data_array)
+    assert np.all(uv_new.flag_array == uv.flag_array)
+    assert np.all(uv_new.nsample_array == uv.nsample_array)
+
+    serial_fname = str(tmpdir.join('serial.uvh5'))
+    uv.write_uvh5(serial_fname)
+    uv_serial = UVData()
+    uv_serial.read_uvh5(serial_fname)
+    assert np.all(uv_new.data_array == uv_serial.data_array)
+
+
+def test_parallel_uvh5_metadata_only(tmpdir):
+    # Metadata only objects get no flags and nsamples of 1.
+    uv = UVData()
+    uv.read_uvfits(triangle_uvfits_file)
+    uv_meta = uv.copy(metadata_only=True)
+    ofname = str(tmpdir.join('parallel.uvh5'))
+    layout = simutils.initialize_uvh5_parallel(uv_meta, ofname, slab_size=100)
+    blt_inds, freq_inds = np.unravel_index(np.arange(uv.Nblts * uv.Nfreqs),
+                                           (uv.Nblts, uv.Nfreqs))
+    simutils.write_uvh5_visibilities(ofname, layout, blt_inds, freq_inds,
+                                     uv.data_array[blt_inds, 0, freq_inds])
+
+    uv_new = UVData()
+    uv_new.read_uvh5(ofname)
+    assert np.all(uv_new.data_array == uv.data_array)
+    assert not np.any(uv_new.flag_array)
+    assert np.all(uv_new.nsample_array == 1)
+
+
+def test_parallel_uvh5_spw_axis(tmpdir):
+    # Visibilities are written at the right offsets in files with a spectral window axis.
+    shape = (6, 1, 4, 2)
+    ofname = str(tmpdir.join('spw_axis.h5'))
+    with h5py.File(ofname, 'w') as h5file:
+        visdata = h5file.create_dataset('visdata', shape, dtype=np.complex64)
+        visdata[(-1,) * visdata.ndim] = 0
+        layout = {'offset': visdata.id.get_offset(), 'dtype': visdata.dtype.str,
+                  'shape': visdata.shape}
+
+    data = (np.arange(48) + 1j).reshape(24, 2)
+    blt_inds, freq_inds = np.unravel_index(np.arange(24), (6, 4))
+    simutils.write_uvh5_visibilities(ofname, layout, blt_inds, freq_inds, data)
+    with h5py.File(ofname, 'r') as h5file:
+        assert np.all(h5file['visdata'][()] == data.reshape(shape))
+
+
+def test_get_current_rss():
+    pytest.importorskip('psutil')
+    rss0 = simutils.get_current_rss()
+    arr = np.ones(2**24)
+    assert simutils.get_current_rss() - rss0 >= arr.nbytes / 2
+
+
+def test_estimate_skymodel_memory_usage():
+    # The estimate should cover the numpy arrays of a SkyModel at a single frequency.
+    pyradiosky = pytest.importorskip('pyradiosky')
+    from astropy.coordinates import Latitude, Longitude
+    from astropy import units
+
+    Nsrcs, Nfreqs = 1000, 3
+    sky = pyradiosky.SkyModel(
+        name=np.array(['src{}'.format(ii) for ii in range(Nsrcs)]),
+        ra=Longitude(np.zeros(Nsrcs), units.deg), dec=Latitude(np.zeros(Nsrcs), units.deg),
+        stokes=np.ones((4, Nfreqs, Nsrcs)) * units.Jy, spectral_type='full',
+        freq_array=np.linspace(1e8, 2e8, Nfreqs) * units.Hz
+    )
+    arrays_nbytes = sky.stokes.nbytes + sky.coherency_radec.nbytes
+
+    mem_est = simutils.estimate_skymodel_memory_usage(Nsrcs, Nfreqs)
+    assert mem_est > arrays_nbytes
+    assert mem_est < 10 * arrays_nbytes
+    assert simutils.estimate_skymodel_memory_usage(2 * Nsrcs, Nfreqs) == 2 * mem_est
+
+
+def test_rise_set_lsts():
+    # Sources above the horizon are always between rising and setting.
+    from astropy.coordinates import AltAz, EarthLocation, SkyCoord
+    from astropy.time import Time
+    from astropy import units
+
+    rng = np.random.default_rng(2)
+    ra = rng.uniform(0, 2 * np.pi, 500)
+    dec = np.arcsin(rng.uniform(-1, 1, 500))
+    location = EarthLocation(lat='-30d43m17.5s', lon='21d25m41.9s', height=1073.)
+    rise_lst, set_lst = simutils.rise_set_lsts(ra, dec, location.lat.rad)
+
+    # Sources near the south pole never set.
+    assert np.all(np.isnan(rise_lst[np.degrees(dec) < -60]))
+    assert np.all(np.isfinite(rise_lst[np.degrees(dec) > -55]))
+
+    times = Time(2458098.27471265 + np.linspace(0, 1, 7), format='jd', location=location)
+    coords = SkyCoord(ra * units.rad, dec * units.rad)
+    for time in times:
+        lst = time.sidereal_time('apparent').rad
+        active = simutils.active_source_inds(lst, rise_lst, set_lst)
+        alt = coords.transform_to(AltAz(obstime=time, location=location)).alt.rad
+        assert set(np.nonzero(alt > 0)[0]) <= set(active)
+        assert active.size < 0.6 * ra.size
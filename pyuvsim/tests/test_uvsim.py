@@ -389,6 +389,94 @@ def test_offzenith_source_multibl(beam, hera_loc, triangle_pos):
     assert np.allclose(visibilities, visibilities_analytic)
 
 
+@pytest.mark.filterwarnings('ignore:Achromatic gaussian')
+@pytest.mark.parametrize('beam_type', ['cst', 'uniform', 'gaussian', 'airy'])
+def test_power_beam_matches_efield(beam_type, cst_beam, hera_loc):
+    # For unpolarized sources, power beams give the same visibilities as E-field beams.
+    if beam_type == 'cst':
+        beam = cst_beam.copy()
+        beam.interpolation_function = 'az_za_simple'
+    elif beam_type == 'gaussian':
+        beam = pyuvsim.AnalyticBeam('gaussian', sigma=0.1)
+    elif beam_type == 'airy':
+        beam = pyuvsim.AnalyticBeam('airy', diameter=14.0)
+    else:
+        beam = pyuvsim.AnalyticBeam('uniform')
+
+    time = Time(2458098.27471265, format='jd', location=hera_loc)
+    # At one of the beam's frequencies, so that there is no frequency interpolation.
+    freq = 123e6 * units.Hz
+    sources, _ = pyuvsim.create_mock_catalog(time, arrangement='random', Nsrcs=100,
+                                             rseed=2458098)
+    antenna1 = pyuvsim.Antenna('ant1', 1, np.array([0, 0, 0]), 0)
+    antenna2 = pyuvsim.Antenna('ant2', 2, np.array([30, 10, 0]), 0)
+    baseline = pyuvsim.Baseline(antenna1, antenna2)
+
+    visibilities = []
+    for power_beam in [False, True]:
+        beam_list = pyuvsim.BeamList([copy.deepcopy(beam)])
+        if power_beam:
+            beam_list.beam_type = 'power'
+        beam_list.set_obj_mode()
+        assert beam_list[0].beam_type == beam_list.beam_type
+        array = pyuvsim.Telescope('telescope_name', hera_loc, beam_list)
+        task = pyuvsim.UVTask(sources, time, freq, baseline, array)
+        engine = pyuvsim.UVEngine(task, power_beam=power_beam)
+        visibilities.append(engine.make_visibility())
+        sources.time = None
+
+    assert np.allclose(visibilities[0], visibilities[1], rtol=1e-4, atol=1e-5)
+
+
+def test_power_beam_errors(cst_beam, hera_loc):
+    time = Time(2458098.27471265, format='jd', location=hera_loc)
+    sources, _ = pyuvsim.create_mock_catalog(time, arrangement='zenith')
+    beam_list = pyuvsim.BeamList([pyuvsim.AnalyticBeam('uniform'),
+                                  pyuvsim.AnalyticBeam('airy', diameter=14.0)])
+    antenna1 = pyuvsim.Antenna('ant1', 1, np.array([0, 0, 0]), 0)
+    antenna2 = pyuvsim.Antenna('ant2', 2, np.array([30, 10, 0]), 1)
+    array = pyuvsim.Telescope('telescope_name', hera_loc, beam_list)
+    task = pyuvsim.UVTask(sources, time, 123e6 * units.Hz,
+                          pyuvsim.Baseline(antenna1, antenna2), array)
+
+    engine = pyuvsim.UVEngine(task, power_beam=True)
+    with pytest.raises(ValueError, match='Power beams can only be used for baselines'):
+        engine.make_visibility()
+
+    # The beams have not been converted.
+    task.baseline = pyuvsim.Baseline(antenna1, antenna1)
+    engine = pyuvsim.UVEngine(task, power_beam=True)
+    with pytest.raises(ValueError, match='Beam 0 is not a power beam'):
+        engine.make_visibility()
+
+    beam_list.beam_type = 'magnetic'
+    with pytest.raises(ValueError, match="beam_type must be 'efield' or 'power'"):
+        beam_list.set_obj_mode()
+
+
+def test_power_beam_run_errors():
+    uv_obj = UVData()
+    uv_obj.read_uvfits(EW_uvfits_file)
+    time = Time(uv_obj.time_array[0], format='jd', scale='utc')
+    sources, _ = pyuvsim.create_mock_catalog(time, arrangement='long-line', Nsrcs=5,
+                                             return_data=True)
+    sources.polarized = np.array([2])
+    sources.stokes_Q = np.array([[0.1]])
+    sources.stokes_U = np.array([[0.0]])
+    sources.stokes_V = np.array([[0.0]])
+    beam_list = pyuvsim.BeamList(['analytic_uniform', 'analytic_airy_diam=14.0'])
+    beam_dict = {uv_obj.antenna_names[0]: 0, uv_obj.antenna_names[1]: 1}
+
+    with pytest.raises(ValueError, match='Power beams can only be used for unpolarized skies'):
+        pyuvsim.run_uvdata_uvsim(uv_obj, beam_list, beam_dict, catalog=sources,
+                                 power_beam=True)
+
+    sources.stokes_Q[:] = 0
+    with pytest.raises(ValueError, match='all antennas have the same beam'):
+        pyuvsim.run_uvdata_uvsim(uv_obj, beam_list, beam_dict, catalog=sources,
+                                 power_beam=True)
+
+
 def test_file_to_tasks(cst_beam):
     hera_uv = UVData()
     hera_uv.read_uvfits(EW_uvfits_file)
@@ -608,6 +696,37 @@ def test_task_coverage():
         assert np.all(tasks[inds] == tasks_expected)
 
 
+def test_task_splitting_node_placement():
+    # Two nodes with their ranks interleaved, as with round-robin placement. Each node's
+    # ranks share one source block, and together cover every task.
+    Nbls, Ntimes, Nfreqs, Nsrcs, Npus = 2, 2, 1, 100, 8
+    node_ids = [rank % 2 for rank in range(Npus)]
+    grid = pyuvsim.decomposition.choose_block_grid(Nbls, Ntimes, Nfreqs, Nsrcs, Npus)
+    assert grid == (4, 2)
+
+    src_starts = {}
+    tasks = {}
+    Npending = np.zeros(Ntimes, dtype=int)
+    for rank in range(Npus):
+        task_inds, src_inds, _, _ = pyuvsim.uvsim._make_task_inds(
+            Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, node_ids=node_ids
+        )
+        assert (task_inds, src_inds) == pyuvsim.uvsim._make_task_inds(
+            Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, node_ids=node_ids, grid=grid
+        )[:2]
+        src_starts.setdefault(node_ids[rank], set()).add(src_inds.start)
+        tasks.setdefault(node_ids[rank], []).extend(task_inds)
+        times = np.unique(np.array(task_inds) // (Nfreqs * Nbls))
+        Npending[times] += 1
+    assert src_starts == {0: {0}, 1: {50}}
+    for node_tasks in tasks.values():
+        assert sorted(node_tasks) == list(range(Nbls * Ntimes * Nfreqs))
+
+    assert np.all(
+        pyuvsim.uvsim._pending_ranks(Nbls, Ntimes, Nfreqs, Nsrcs, Npus, grid) == Npending
+    )
+
+
 def test_source_splitting():
     # Check that if the available memory is less than the expected size of the source catalog,
     # then the task iterator will loop over chunks of the source array.
@@ -665,6 +784,62 @@ def test_source_splitting():
     pyuvsim.mpi.Npus_node = 1
 
 
+def test_sky_chunker_fixed():
+    # Without a memory ceiling, chunks match a plain split of the sources.
+    Nsrcs, Nsky_parts = 30, 4
+    chunker = pyuvsim.SkyChunker(Nsrcs, Nsky_parts)
+    chunks = []
+    final = []
+    for src_i in chunker:
+        chunks.append(src_i)
+        final.append(chunker.final_chunk)
+        chunker.chunk_done()
+    assert chunks == [simutils.iter_array_split(s, Nsrcs, Nsky_parts)[0]
+                      for s in range(Nsky_parts)]
+    assert final == [False, False, False, True]
+    assert chunker.Nchunks == Nsky_parts
+
+
+def test_sky_chunker_adaptive(monkeypatch):
+    # Memory grows by 1 kB per source while a chunk is in memory.
+    Nsrcs = 6400
+    base_rss = 10e6
+    mem_per_src = 1e3
+    current = {'srcs': 0}
+    monkeypatch.setattr(
+        simutils, 'get_current_rss', lambda: base_rss + mem_per_src * current['srcs']
+    )
+
+    # Room for 2000 sources at a time. Start with too many chunks.
+    chunker = pyuvsim.SkyChunker(Nsrcs, Nsky_parts=32, mem_ceiling=base_rss + 2e6 / 0.8 + 1)
+    assert chunker.Nblocks == 128
+    sizes = []
+    srcs_done = []
+    for src_i in chunker:
+        current['srcs'] = len(src_i)
+        sizes.append(len(src_i))
+        srcs_done.extend(src_i)
+        chunker.chunk_done()
+        current['srcs'] = 0
+    assert srcs_done == list(range(Nsrcs))
+    assert sizes[0] == 200
+    assert sizes[1] == 2000
+    assert max(sizes) <= 2000
+    assert len(sizes) == chunker.Nchunks == 5
+
+    # Now start with chunks that are too large, leaving little room for the next.
+    chunker = pyuvsim.SkyChunker(Nsrcs, Nsky_parts=2, mem_ceiling=base_rss + 0.5e6 / 0.8 + 1)
+    sizes = []
+    for src_i in chunker:
+        current['srcs'] = len(src_i)
+        sizes.append(len(src_i))
+        chunker.chunk_done()
+        current['srcs'] = 0
+        if len(sizes) == 2:
+            break
+    assert sizes == [3200, 500]
+
+
 def test_quantity_reuse(uvobj_beams_srcs):
     # Check that the right quantities on the UVEngine are changed when
     # the time/frequency/antenna pair change.
@@ -775,6 +950,119 @@ def test_update_flags(uvobj_beams_srcs):
     assert all(axes_covered)
 
 
+@pytest.mark.parametrize('spectral_type', ['spectral_index', 'subband'])
+def test_lazy_spectra(uvobj_beams_srcs, spectral_type):
+    # Fluxes evaluated in the engine match those evaluated up front.
+    uv_obj, beam_list, beam_dict, _ = uvobj_beams_srcs
+    beam_list.set_obj_mode()
+
+    Nsrcs = 20
+    freqs = uv_obj.freq_array[0]
+    stokes = np.zeros((4, 1, Nsrcs))
+    stokes[0] = np.linspace(1, 2, Nsrcs)
+    stokes[1] = 0.1
+    kwds = {}
+    if spectral_type == 'spectral_index':
+        kwds['reference_frequency'] = np.full(Nsrcs, 100e6) * units.Hz
+        kwds['spectral_index'] = np.linspace(-2, 0.5, Nsrcs)
+    else:
+        kwds['freq_array'] = np.linspace(freqs.min(), freqs.max(), 5) * units.Hz
+        stokes = stokes * np.linspace(2, 1, 5)[None, :, None] ** 2
+    ra = Longitude(np.linspace(0, 2 * np.pi, Nsrcs), 'rad')
+    dec = Latitude(np.linspace(-np.pi / 2, np.pi / 3, Nsrcs), 'rad')
+    sky = pyradiosky.SkyModel(
+        name=np.arange(Nsrcs).astype(str), ra=ra, dec=dec, stokes=stokes * units.Jy,
+        spectral_type=spectral_type, **kwds
+    )
+    sky = pyuvsim.simsetup.SkyModelData(sky)
+
+    Ntasks = uv_obj.Nblts * uv_obj.Nfreqs
+    vis = []
+    for lazy in [False, True]:
+        engine = pyuvsim.UVEngine()
+        taskiter = pyuvsim.uvdata_to_task_iter(
+            np.arange(Ntasks), uv_obj, sky, beam_list, beam_dict, lazy_spectra=lazy
+        )
+        vis_lazy = []
+        for task in taskiter:
+            assert (task.sources.spectral_type == 'full') != lazy
+            engine.set_task(task)
+            vis_lazy.append(engine.make_visibility())
+        vis.append(np.array(vis_lazy))
+    assert np.allclose(vis[0], vis[1])
+
+
+def test_active_sources():
+    # Handing each time only the sources that may be above the horizon does not
+    # change the visibilities.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(EW_uvfits_10time10chan)
+    uv_obj.select(times=np.unique(uv_obj.time_array)[::3], freq_chans=range(2))
+    beam_list = pyuvsim.BeamList([multi_beams[1]])
+    beam_dict = None
+
+    Nsrcs = 200
+    rng = np.random.default_rng(4)
+    ra = Longitude(rng.uniform(0, 2 * np.pi, Nsrcs), 'rad')
+    dec = Latitude(np.arcsin(rng.uniform(-1, 1, Nsrcs)), 'rad')
+    stokes = np.zeros((4, 1, Nsrcs))
+    stokes[0] = rng.uniform(1, 2, Nsrcs)
+    sky = pyradiosky.SkyModel(name=np.arange(Nsrcs).astype(str), ra=ra, dec=dec,
+                              stokes=stokes * units.Jy, spectral_type='flat')
+    sky = pyuvsim.simsetup.SkyModelData(sky)
+
+    Ntasks = uv_obj.Nblts * uv_obj.Nfreqs
+    vis = []
+    for horizon_buffer in [None, 0.04364]:
+        engine = pyuvsim.UVEngine()
+        taskiter = pyuvsim.uvdata_to_task_iter(
+            np.arange(Ntasks), uv_obj, sky, beam_list, beam_dict, Nsky_parts=2,
+            horizon_buffer=horizon_buffer
+        )
+        vis_buffer = []
+        for task in taskiter:
+            if horizon_buffer is not None:
+                # Each of the two chunks has half of the sources.
+                assert task.sources.Ncomponents < 0.75 * Nsrcs / 2
+            engine.set_task(task)
+            vis_buffer.append(engine.make_visibility())
+        vis.append(np.array(vis_buffer))
+    assert np.allclose(vis[0], vis[1])
+    stats = pyuvsim.timing.phase_timer.stats['active_sources']
+    assert 0.3 < stats['active_fraction'] < 0.7
+
+
+def test_active_sources_none_up():
+    # Tasks at times when none of the sources are above the horizon are skipped.
+    uv_obj = UVData()
+    uv_obj.read_uvfits(EW_uvfits_10time10chan)
+    uv_obj.select(times=np.unique(uv_obj.time_array)[:2], freq_chans=range(2))
+    beam_list = pyuvsim.BeamList([multi_beams[1]])
+
+    # Sources near the north celestial pole never rise at this southern latitude.
+    Nsrcs = 10
+    stokes = np.zeros((4, 1, Nsrcs))
+    stokes[0] = 1
+    sky = pyradiosky.SkyModel(name=np.arange(Nsrcs).astype(str),
+                              ra=Longitude(np.linspace(0, 2 * np.pi, Nsrcs), 'rad'),
+                              dec=Latitude(np.full(Nsrcs, 75), 'deg'),
+                              stokes=stokes * units.Jy, spectral_type='flat')
+    sky = pyuvsim.simsetup.SkyModelData(sky)
+
+    Ntasks = uv_obj.Nblts * uv_obj.Nfreqs
+    pyuvsim.timing.phase_timer.reset()
+    taskiter = pyuvsim.uvdata_to_task_iter(
+        np.arange(Ntasks), uv_obj, sky, beam_list, None, horizon_buffer=0.04364
+    )
+    assert list(taskiter) == []
+    stats = pyuvsim.timing.phase_timer.stats['active_sources']
+    assert stats['Nsky_updates'] == uv_obj.Ntimes
+    assert stats['active_fraction'] == 0
+
+    taskiter = pyuvsim.uvdata_to_task_iter(np.arange(Ntasks), uv_obj, sky, beam_list, None)
+    assert len(list(taskiter)) == Ntasks
+
+
 def test_overflow_check():
     # Ensure error before running sim for too many tasks.
 
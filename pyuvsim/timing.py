@@ -0,0 +1,317 @@
+# -*- mode: python; coding: utf-8 -*
+# Copyright (c) 2020 Radio Astronomy Software Group
+# Licensed under the 3-clause BSD License
+
+"""
+Low-overhead timing of the major phases of a simulation.
+
+Phase timings are always collected, on every rank, in the module-level
+:class:`PhaseTimer` instance ``phase_timer``. Writing them out and merging
+them across ranks is handled by :func:`pyuvsim.profiling.write_phase_timings`.
+
+Optionally, a :class:`TraceRecorder` can also record a timeline of events
+(phases, sky chunk switches, beam interpolation calls, and MPI collectives)
+in the Chrome trace-event format. See :func:`pyuvsim.profiling.set_tracer`.
+
+This module has no dependencies on the rest of pyuvsim, so that it may be
+used anywhere in the package (including in the MPI tools).
+"""
+
+import time
+from contextlib import contextmanager
+
+__all__ = ['PhaseTimer', 'phase_timer', 'phase', 'phase_categories', 'get_phase_category',
+           'TraceRecorder', 'start_tracing', 'stop_tracing', 'trace', 'trace_instant']
+
+# Used to classify phases when summarizing, so that it is clear whether a job
+# is limited by computation, communication, or file I/O.
+phase_categories = {
+    'config_parse': 'io',
+    'catalog_read': 'io',
+    'sky_share': 'comm',
+    'beam_setup': 'io',
+    'task_loop': 'compute',
+    'wait': 'comm',
+    'gather': 'comm',
+    'write': 'io',
+}
+
+
+def get_phase_category(name):
+    """
+    Get the category (compute, comm, io) of a phase.
+
+    Sub-phases (named like "<phase>.<subphase>") inherit the
+    category of their parent. Unknown phases are labeled "other".
+    """
+    return phase_categories.get(name.split('.')[0], 'other')
+
+
+class PhaseTimer:
+    """
+    Accumulate wall-clock time spent in named phases.
+
+    Phases may be nested. Sub-phases are conventionally named with a dot, as
+    in "task_loop.beams", so that they can be grouped with their parent
+    when summarizing.
+
+    Attributes
+    ----------
+    totals : dict
+        Total seconds spent in each phase.
+    counts : dict
+        Number of times each phase was entered.
+    listeners : list
+        Callables that are run as ``listener(event, name)`` whenever a phase
+        starts (event = "start") or stops (event = "stop").
+    stats : dict
+        Other numbers reported with the timings, such as cache statistics. Keys are
+        names, values are dictionaries of numbers (see :meth:`set_stats`).
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.stats = {}
+        self.listeners = []
+        self._stack = []
+
+    @property
+    def current_phase(self):
+        """Name of the innermost phase currently running (None if there is none)."""
+        if len(self._stack) == 0:
+            return None
+        return self._stack[-1][0]
+
+    def start(self, name):
+        """Mark the start of a phase."""
+        self._stack.append((name, time.perf_counter()))
+        for listener in self.listeners:
+            listener('start', name)
+
+    def stop(self):
+        """
+        Mark the end of the innermost running phase.
+
+        Returns
+        -------
+        float
+            Seconds elapsed since the matching call to :meth:`start`.
+        """
+        name, t0 = self._stack.pop()
+        dt = time.perf_counter() - t0
+        self.add(name, dt)
+        for listener in self.listeners:
+            listener('stop', name)
+        return dt
+
+    def add(self, name, seconds, count=1):
+        """
+        Add time to a phase directly.
+
+        This is the cheapest way to record time in tight loops.
+        """
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def set_stats(self, name, values):
+        """
+        Record a set of statistics to report with the timings.
+
+        Parameters
+        ----------
+        name : str
+            Name of the set of statistics, e.g. "spline_cache".
+        values : dict
+            Numbers keyed by statistic name. Other values (e.g. None) are not reported.
+        """
+        self.stats[name] = {key: val for key, val in values.items()
+                            if isinstance(val, (int, float)) and not isinstance(val, bool)}
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager that times the enclosed block as phase `name`."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def reset(self):
+        """Clear all accumulated timings."""
+        self.totals = {}
+        self.counts = {}
+        self.stats = {}
+        self._stack = []
+
+    def to_dict(self):
+        """
+        Get timings as a dictionary.
+
+        Returns
+        -------
+        dict
+            Keys are phase names, values are dictionaries with keys "total" (seconds)
+            and "count".
+        """
+        return {name: {'total': self.totals[name], 'count': self.counts[name]}
+                for name in self.totals}
+
+
+phase_timer = PhaseTimer()
+
+
+def phase(name):
+    """Time the enclosed block as phase `name` on the module phase timer."""
+    return phase_timer.phase(name)
+
+
+class TraceRecorder:
+    """
+    Record a timeline of events in the Chrome trace-event format.
+
+    The resulting events can be viewed in chrome://tracing or https://ui.perfetto.dev.
+    Each rank gets its own process track (the rank is used as the "pid").
+
+    Timestamps are in microseconds since the Unix epoch, so that events from different
+    ranks can be aligned. Merging the per-rank outputs subtracts the earliest timestamp.
+
+    Parameters
+    ----------
+    pid : int
+        Process ID for the track, usually the MPI rank.
+    process_name : str
+        Label for the track.
+    """
+
+    def __init__(self, pid=0, process_name=None):
+        self.pid = pid
+        self.events = []
+        self._wall0 = time.time()
+        self._perf0 = time.perf_counter()
+        if process_name is None:
+            process_name = "rank {}".format(pid)
+        self.events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                            'args': {'name': process_name}})
+        self.events.append({'name': 'process_sort_index', 'ph': 'M', 'pid': pid, 'tid': 0,
+                            'args': {'sort_index': pid}})
+
+    def timestamp(self, perf_time=None):
+        """
+        Convert a time.perf_counter() value to a trace timestamp.
+
+        Defaults to the current time.
+        """
+        if perf_time is None:
+            perf_time = time.perf_counter()
+        return (self._wall0 + (perf_time - self._perf0)) * 1e6
+
+    def _add(self, name, cat, ph, ts, **extra):
+        event = {'name': name, 'cat': cat, 'ph': ph, 'ts': ts, 'pid': self.pid, 'tid': 0}
+        event.update(extra)
+        self.events.append(event)
+
+    def begin(self, name, cat=''):
+        """Record the start of a duration event."""
+        self._add(name, cat, 'B', self.timestamp())
+
+    def end(self, name, cat=''):
+        """Record the end of a duration event."""
+        self._add(name, cat, 'E', self.timestamp())
+
+    def complete(self, name, cat, start, duration, args=None):
+        """
+        Record a complete duration event.
+
+        Parameters
+        ----------
+        start : float
+            Start time, as a time.perf_counter() value.
+        duration : float
+            Duration in seconds.
+        args : dict
+            Extra information to attach to the event.
+        """
+        self._add(name, cat, 'X', self.timestamp(start), dur=duration * 1e6, args=args or {})
+
+    def instant(self, name, cat='', args=None):
+        """Record an instantaneous event."""
+        self._add(name, cat, 'i', self.timestamp(), s='p', args=args or {})
+
+    def on_phase(self, event, name):
+        """Listener for the phase timer, recording each phase as a duration event."""
+        if event == 'start':
+            self.begin(name, get_phase_category(name))
+        else:
+            self.end(name, get_phase_category(name))
+
+
+tracer = None
+
+
+def start_tracing(pid=0, process_name=None):
+    """
+    Start recording trace events.
+
+    Phases timed on the module phase timer are recorded automatically.
+
+    Parameters
+    ----------
+    pid : int
+        Process ID for the track, usually the MPI rank.
+    process_name : str
+        Label for the track.
+
+    Returns
+    -------
+    TraceRecorder
+        The active trace recorder.
+    """
+    global tracer
+    stop_tracing()
+    tracer = TraceRecorder(pid=pid, process_name=process_name)
+    phase_timer.listeners.append(tracer.on_phase)
+    return tracer
+
+
+def stop_tracing():
+    """
+    Stop recording trace events.
+
+    Returns
+    -------
+    TraceRecorder or None
+        The recorder that was active, if any.
+    """
+    global tracer
+    recorder = tracer
+    if recorder is not None:
+        phase_timer.listeners.remove(recorder.on_phase)
+    tracer = None
+    return recorder
+
+
+@contextmanager
+def trace(name, cat='', **args):
+    """
+    Record the enclosed block as a trace event, if tracing is active.
+
+    Additional keyword arguments are attached to the event.
+    This does nothing (beyond a single check) when tracing is off.
+    """
+    if tracer is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        # The tracer may have been stopped within the block.
+        if tracer is not None:
+            tracer.complete(name, cat, t0, time.perf_counter() - t0, args)
+
+
+def trace_instant(name, cat='', **args):
+    """Record an instantaneous event, if tracing is active."""
+    if tracer is not None:
+        tracer.instant(name, cat, args)
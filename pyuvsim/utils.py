@@ -3,10 +3,10 @@
 # Licensed under the 3-clause BSD License
 
 import os
-import sys
 import time as pytime
 from datetime import timedelta
 
+import h5py
 import numpy as np
 try:
     import psutil
@@ -236,6 +236,78 @@ def write_uvdata(uv_obj, param_dict, return_filename=False, dryrun=False, out_fo
         return outfile_name
 
 
+def initialize_uvh5_parallel(uv_obj, filename, clobber=False, slab_size=2**24):
+    """
+    Write a UVH5 file with space for visibilities to be filled in by many processes.
+
+    The header, flags and nsamples are written from `uv_obj`. The visibilities are
+    stored without chunking or compression, so that each process can write its part
+    of them directly to the file with :func:`write_uvh5_visibilities`. The visibilities
+    keep the layout pyuvdata uses on disk, with or without the spectral window axis.
+
+    Args:
+        uv_obj: UVData object with the header, flags and nsamples to write. If it is
+            metadata only, the flags are all False and the nsamples all 1.
+        filename: Path of the file.
+        clobber: (Default False) Overwrite the file if it exists.
+        slab_size: (Default 2**24) Number of flags (and nsamples) written at a time,
+            to bound the memory used.
+
+    Returns:
+        Layout of the visibilities in the file, to pass to :func:`write_uvh5_visibilities`.
+    """
+    uv_obj.initialize_uvh5_file(filename, clobber=clobber, chunks=None,
+                                flags_compression=None, nsample_compression=None)
+    with h5py.File(filename, 'r+') as h5file:
+        data = h5file['Data']
+        shape = data['flags'].shape
+        Nblts_slab = max(int(slab_size // np.prod(shape[1:])), 1)
+        for start in range(0, shape[0], Nblts_slab):
+            slab = slice(start, min(start + Nblts_slab, shape[0]))
+            slab_shape = (slab.stop - slab.start,) + shape[1:]
+            if uv_obj.flag_array is None:
+                # The flags are filled with False where they are not written.
+                data['nsamples'][slab] = np.ones(slab_shape, dtype=np.float32)
+            else:
+                data['flags'][slab] = uv_obj.flag_array[slab].reshape(slab_shape)
+                data['nsamples'][slab] = uv_obj.nsample_array[slab].reshape(slab_shape)
+        visdata = data['visdata']
+        # Writing to a contiguous dataset allocates all of its space in the file.
+        visdata[(-1,) * visdata.ndim] = 0
+        layout = {'offset': visdata.id.get_offset(), 'dtype': visdata.dtype.str,
+                  'shape': visdata.shape}
+    return layout
+
+
+def write_uvh5_visibilities(filename, layout, blt_inds, freq_inds, data):
+    """
+    Write visibilities to a file from :func:`initialize_uvh5_parallel`.
+
+    Processes may write to the same file at the same time, if they write to different
+    baseline-times and frequencies. The file is written through memory maps, so
+    processes on different nodes need a parallel filesystem that keeps writes coherent
+    across nodes, as POSIX requires (e.g., Lustre or GPFS). NFS and other filesystems
+    that write back whole pages cached on each node may lose writes.
+
+    Args:
+        filename: Path of the file.
+        layout: Layout of the visibilities, from :func:`initialize_uvh5_parallel`.
+        blt_inds: Baseline-time index of each visibility.
+        freq_inds: Frequency index of each visibility.
+        data: Visibilities, of shape (len(blt_inds), Npols).
+    """
+    visdata = np.memmap(filename, dtype=layout['dtype'], mode='r+', offset=layout['offset'],
+                        shape=tuple(layout['shape']))
+    if len(layout['shape']) == 4:
+        # (Nblts, Nspws, Nfreqs, Npols), with a single spectral window.
+        visdata[blt_inds, 0, freq_inds, :] = data
+    else:
+        # (Nblts, Nfreqs, Npols)
+        visdata[blt_inds, freq_inds, :] = data
+    visdata.flush()
+    del visdata
+
+
 def get_avail_memory():
     """
     Method for estimating the virtual memory available (in bytes).
@@ -258,6 +330,21 @@ def get_avail_memory():
     return psutil.virtual_memory().available
 
 
+def get_current_rss():
+    """
+    Get the current resident memory of this process (in bytes).
+
+    Unlike the peak usage given by resource.getrusage, this can go down as memory is freed.
+    """
+    if not HAVE_PSUTIL:
+        raise ImportError("You need psutils to get the current memory usage. "
+                          "Install it by running pip install pyuvsim[sim] "
+                          "or pip install pyuvsim[all] if you also want "
+                          "the line_profiler installed.")
+
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
 def iter_array_split(part_index, N, M):
     """
     Returns an iterator giving the indices of `part` below:
@@ -280,14 +367,74 @@ def iter_array_split(part_index, N, M):
     return range(start, end), end - start
 
 
+def rise_set_lsts(ra, dec, latitude, horizon_buffer=0.04364):
+    """
+    Get the local sidereal times at which sources rise and set.
+
+    This is the same coarse calculation as the horizon cut in
+    :meth:`pyradiosky.SkyModel.source_cuts`, ignoring precession and nutation.
+
+    Parameters
+    ----------
+    ra, dec : array_like of float
+        Source positions in radians.
+    latitude : float
+        Telescope latitude in radians.
+    horizon_buffer : float
+        Angle in radians subtracted from the rise LSTs and added to the set LSTs,
+        so that sources near the horizon are not left out.
+
+    Returns
+    -------
+    rise_lst, set_lst : ndarray of float
+        LSTs in radians, in [0, 2pi). NaN for sources that never set. Sources that
+        never rise get a window of the buffer around their transit.
+    """
+    ra = np.asarray(ra, dtype=float)
+    tans = np.tan(latitude) * np.tan(np.asarray(dec, dtype=float))
+    # Hour angle of the horizon crossing, plus the buffer.
+    half_window = np.arccos(np.clip(-tans, -1, 1)) + horizon_buffer
+    circumpolar = half_window >= np.pi
+    rise_lst = np.mod(ra - half_window, 2 * np.pi)
+    set_lst = np.mod(ra + half_window, 2 * np.pi)
+    rise_lst[circumpolar] = np.nan
+    set_lst[circumpolar] = np.nan
+    return rise_lst, set_lst
+
+
+def active_source_inds(lst, rise_lst, set_lst):
+    """
+    Get the sources that may be above the horizon at a local sidereal time.
+
+    Parameters
+    ----------
+    lst : float
+        LST in radians.
+    rise_lst, set_lst : ndarray of float
+        Rise and set LSTs of the sources, from :func:`rise_set_lsts`.
+
+    Returns
+    -------
+    ndarray of int
+        Indices of the sources between rising and setting, or that never set.
+    """
+    lst = np.mod(lst, 2 * np.pi)
+    # Windows with rise_lst > set_lst wrap through zero.
+    up = np.where(rise_lst <= set_lst,
+                  (lst >= rise_lst) & (lst <= set_lst),
+                  (lst >= rise_lst) | (lst <= set_lst))
+    return np.nonzero(up | np.isnan(rise_lst))[0]
+
+
 def estimate_skymodel_memory_usage(Ncomponents, Nfreqs):
     """
     Estimate the memory footprint of a SkyModel by summing the sizes
-    of the data types that go into SkyModel.
+    of the arrays that go into SkyModel.
 
     This aims to anticipate the full memory required to handle a SkyModel
     class in simulation, accounting for its attributes as well as
-    intermediate data generated.
+    intermediate data generated by the engine (beam Jones matrices,
+    apparent coherencies, and fringe terms).
 
     Parameters
     ----------
@@ -302,19 +449,20 @@ def estimate_skymodel_memory_usage(Ncomponents, Nfreqs):
     mem_est : float
         Estimate of memory usage in bytes
     """
-
-    base_float = [1.5]    # A float
-    base_bool = [True]
-    base_str = ["source_name"]
+    base_float = np.dtype(float).itemsize
+    base_complex = np.dtype(complex).itemsize
+    base_bool = np.dtype(bool).itemsize
+    base_str = np.array(["source_name"]).itemsize
 
     Ncomp_attrs = {'ra': base_float, 'dec': base_float,
                    'alt_az': 2 * base_float, 'rise_lst': base_float, 'set_lst': base_float,
-                   'pos_lmn': 3 * base_float, 'name': base_str, 'horizon_mask': base_bool}
+                   'pos_lmn': 3 * base_float, 'name': base_str, 'horizon_mask': base_bool,
+                   'beam_jones': 2 * 4 * base_complex, 'apparent_coherency': 4 * base_complex,
+                   'fringe': base_complex}
     Ncomp_Nfreq_attrs = {'stokes': 4 * base_float,
-                         'coherency_radec': 4 * base_float,
-                         'coherency_local': 4 * base_float}
+                         'coherency_radec': 4 * base_complex,
+                         'coherency_local': 4 * base_complex}
 
-    mem_est = np.sum([sys.getsizeof(v) * Ncomponents for k, v in Ncomp_attrs.items()])
-    mem_est += np.sum([sys.getsizeof(v) * Ncomponents * Nfreqs
-                       for k, v in Ncomp_Nfreq_attrs.items()])
+    mem_est = float(np.sum([v * Ncomponents for k, v in Ncomp_attrs.items()]))
+    mem_est += float(np.sum([v * Ncomponents * Nfreqs for k, v in Ncomp_Nfreq_attrs.items()]))
     return mem_est
@@ -2,27 +2,36 @@
 # Copyright (c) 2018 Radio Astronomy Software Group
 # Licensed under the 3-clause BSD License
 
+import queue
+import threading
+import time as pytime
+
 import numpy as np
+import scipy.interpolate
 import yaml
-from astropy.coordinates import EarthLocation
+from astropy.coordinates import AltAz, EarthLocation
 import astropy.units as units
 from astropy.units import Quantity
 from astropy.constants import c as speed_of_light
-from pyuvdata import UVData
+from pyuvdata import UVBeam, UVData
 
 from . import mpi
 from . import simsetup
+from . import timing
 from . import utils as simutils
+from .analyticbeam import AnalyticBeam
 from .antenna import Antenna
 from .baseline import Baseline
+from .decomposition import choose_block_grid, make_block_inds
 from .telescope import Telescope
 from .simsetup import SkyModelData
+from .task_order import plan_task_order
 
-from .astropy_interface import MoonLocation, hasmoon, Time
+from .astropy_interface import LunarTopo, MoonLocation, SkyCoord, hasmoon, Time
 
 
-__all__ = ['UVTask', 'UVEngine', 'uvdata_to_task_iter', 'run_uvsim', 'run_uvdata_uvsim',
-           'serial_gather']
+__all__ = ['UVTask', 'UVEngine', 'SkyChunker', 'uvdata_to_task_iter', 'run_uvsim',
+           'run_uvdata_uvsim', 'serial_gather']
 
 
 class UVTask(object):
@@ -81,11 +90,46 @@ class UVTask(object):
 
 
 class UVEngine(object):
+    """
+    Calculate the visibility of a task.
 
-    def __init__(self, task=None, update_positions=True, update_beams=True, reuse_spline=True):
+    Parameters
+    ----------
+    task : :class:`UVTask`
+        The first task.
+    update_positions, update_beams : bool
+        Initial values of the flags marking quantities to recompute.
+    reuse_spline : bool
+        Reuse spline fits in UVBeam interpolation.
+    power_beam : bool
+        Use power beams rather than E-field Jones matrices, for unpolarized sources.
+        For each source, the apparent coherency is then half of Stokes I times the
+        power beam, which needs both antennas of each baseline to use the same beam.
+        The beams must be power beams (see :attr:`pyuvsim.BeamList.beam_type`).
+    phase_center : :class:`astropy.coordinates.SkyCoord`
+        If given, visibilities are phased to this direction rather than to zenith
+        (drift scan). The phasing term is folded into the fringe of each source, which
+        gives the same visibilities as phasing drift scans with pyuvdata.
+
+    Attributes
+    ----------
+    Ntasks, Nposition_updates, Nbeam_updates : int
+        Number of visibilities calculated, and how many of them needed the source
+        positions or the beams to be updated (see :meth:`reuse_stats`).
+    """
+
+    def __init__(self, task=None, update_positions=True, update_beams=True, reuse_spline=True,
+                 power_beam=False, phase_center=None):
         self.reuse_spline = reuse_spline  # Reuse spline fits in beam interpolation
         self.update_positions = update_positions
         self.update_beams = update_beams
+        self.power_beam = power_beam
+        self.phase_center = None
+        if phase_center is not None:
+            # The lunarsky SkyCoord also transforms to frames on the Moon.
+            self.phase_center = SkyCoord(phase_center)
+        self.phase_center_lmn = None
+        self.phase_center_time = None
 
         self.sources = None
         self.current_time = None
@@ -93,9 +137,14 @@ class UVEngine(object):
         self.current_beam_pair = None
         self.beam1_jones = None
         self.beam2_jones = None
+        self.beam_power = None
         self.local_coherency = None
         self.apparent_coherency = None
 
+        self.Ntasks = 0
+        self.Nposition_updates = 0
+        self.Nbeam_updates = 0
+
         if task is not None:
             self.set_task(task)
 
@@ -145,6 +194,10 @@ class UVEngine(object):
         if self.update_local_coherency:
             self.local_coherency = sources.coherency_calc()
 
+        if self.power_beam:
+            self._apply_power_beam()
+            return
+
         self.beam1_jones = baseline.antenna1.get_beam_jones(
             self.task.telescope, sources.alt_az[..., sources.above_horizon],
             self.task.freq, reuse_spline=self.reuse_spline
@@ -165,14 +218,87 @@ class UVEngine(object):
         # Apparent coherency gives the direction and polarization dependent baseline response to
         # a source.
 
-        coherency = self.local_coherency[:, :, self.task.freq_i, :]
+        coherency = self._coherency_at_freq()
 
         self.beam2_jones = np.swapaxes(self.beam2_jones, 0, 1).conj()  # Transpose at each component
 
-        self.apparent_coherency = np.einsum(
-            "abz,bcz,cdz->adz", self.beam1_jones, coherency, self.beam2_jones
+        beam_list = self.task.telescope.beam_list
+        if all(isinstance(beam_list[bid], AnalyticBeam) for bid in [beam1_id, beam2_id]):
+            # Analytic E-field beams have diagonal Jones matrices, so the product
+            # reduces to scaling each coherency element.
+            diag1 = self.beam1_jones[[0, 1], [0, 1]]
+            diag2 = self.beam2_jones[[0, 1], [0, 1]]
+            self.apparent_coherency = (
+                diag1[:, np.newaxis, :] * coherency * diag2[np.newaxis, :, :]
+            )
+        else:
+            self.apparent_coherency = np.einsum(
+                "abz,bcz,cdz->adz", self.beam1_jones, coherency, self.beam2_jones
+            )
+
+    def _coherency_at_freq(self):
+        # Local coherency of the sources above the horizon at the task frequency.
+        # Skies that were not evaluated at the simulation frequencies (see the lazy_spectra
+        # keyword of uvdata_to_task_iter) are evaluated here, one frequency at a time.
+        # The coherency is linear in the Stokes parameters, so this is the same as
+        # evaluating the Stokes parameters first.
+        sources = self.task.sources
+        if sources.spectral_type == 'spectral_index':
+            above_horizon = sources.above_horizon
+            if above_horizon is None:
+                above_horizon = slice(None)
+            freq = self.task.freq.to_value('Hz')
+            scale = (
+                freq / sources.reference_frequency.to_value('Hz')[above_horizon]
+            ) ** sources.spectral_index[above_horizon]
+            return self.local_coherency[:, :, 0, :] * scale
+        if sources.spectral_type == 'subband':
+            # Interpolating the identity gives the weight of each subband at this frequency.
+            weights = scipy.interpolate.interp1d(
+                sources.freq_array.to_value('Hz'), np.eye(sources.Nfreqs), axis=0,
+                kind='cubic'
+            )(self.task.freq.to_value('Hz'))
+            return np.tensordot(self.local_coherency, weights, axes=([2], [0]))
+        return self.local_coherency[:, :, self.task.freq_i, :]
+
+    def _apply_power_beam(self):
+        # Set apparent coherency from the power beam, for unpolarized sources.
+        beam1_id, beam2_id = self.current_beam_pair
+        if beam1_id != beam2_id:
+            raise ValueError("Power beams can only be used for baselines between antennas "
+                             "with the same beam.")
+        sources = self.task.sources
+
+        self.beam_power = self.task.baseline.antenna1.get_beam_power(
+            self.task.telescope, sources.alt_az[..., sources.above_horizon],
+            self.task.freq, reuse_spline=self.reuse_spline
         )
 
+        # The coherency of an unpolarized source is I/2 times the identity matrix,
+        # so only its trace (Stokes I) is needed.
+        coherency = self._coherency_at_freq()
+        stokes_I = coherency[0, 0] + coherency[1, 1]
+
+        # In the order [xx, yy, xy, yx]
+        self.apparent_coherency = self.beam_power * stokes_I / 2
+
+    def _update_phase_center(self):
+        # Direction cosines of the phase center at the task time, found as for the sources.
+        time = self.task.time
+        if self.phase_center_time == time.jd:
+            return
+        location = self.task.telescope.location
+        if isinstance(location, MoonLocation):
+            frame = LunarTopo(obstime=time, location=location)
+        else:
+            frame = AltAz(obstime=time, location=location)
+        center = self.phase_center.transform_to(frame)
+        alt, az = center.alt.rad, center.az.rad
+        self.phase_center_lmn = np.array(
+            [np.sin(az) * np.cos(alt), np.cos(az) * np.cos(alt), np.sin(alt)]
+        )
+        self.phase_center_time = time.jd
+
     def make_visibility(self):
         """ Visibility contribution from a set of source components """
         assert (isinstance(self.task.freq, Quantity))
@@ -180,66 +306,306 @@ class UVEngine(object):
         time = self.task.time
         location = self.task.telescope.location
 
+        # Time spent here is recorded directly on the phase timer, to keep overhead low.
+        timer = timing.phase_timer
+        t0 = pytime.perf_counter()
+        self.Ntasks += 1
         if self.update_positions:
+            self.Nposition_updates += 1
             srcs.update_positions(time, location)
+            t1 = pytime.perf_counter()
+            timer.add('task_loop.positions', t1 - t0)
+            t0 = t1
 
         if self.update_beams:
+            self.Nbeam_updates += 1
             self.apply_beam()
+            t1 = pytime.perf_counter()
+            timer.add('task_loop.beams', t1 - t0)
+            t0 = t1
 
         pos_lmn = srcs.pos_lmn[..., srcs.above_horizon]
 
         # need to convert uvws from meters to wavelengths
         uvw_wavelength = self.task.baseline.uvw / speed_of_light * self.task.freq.to('1/s')
-        fringe = np.exp(2j * np.pi * np.dot(uvw_wavelength, pos_lmn))
+        phase = np.dot(uvw_wavelength, pos_lmn)
+        if self.phase_center is not None:
+            # Phased visibilities are drift scan visibilities times the conjugate
+            # fringe of the phase center.
+            self._update_phase_center()
+            phase = phase - np.dot(uvw_wavelength, self.phase_center_lmn)
+        fringe = np.exp(2j * np.pi * phase)
         vij = self.apparent_coherency * fringe
 
         # Sum over source component axis:
-        vij = np.sum(vij, axis=2)
+        vij = np.sum(vij, axis=-1)
+        timer.add('task_loop.fringe', pytime.perf_counter() - t0)
+
+        if self.power_beam:
+            # Already in the order [xx, yy, xy, yx]
+            return np.asarray([vij[0], vij[1], vij[2], vij[3]])
 
         # Reshape to be [xx, yy, xy, yx]
         vis_vector = np.asarray([vij[0, 0], vij[1, 1], vij[0, 1], vij[1, 0]])
         return vis_vector
 
+    def reuse_stats(self):
+        """
+        Get the number of tasks and updates so far, with the fractions of tasks
+        that reused the positions and beams of the last task.
+
+        Returns
+        -------
+        dict
+            Keys are "Ntasks", "Nposition_updates", "Nbeam_updates", "position_reuse"
+            and "beam_reuse".
+        """
+        Ntasks = max(self.Ntasks, 1)
+        return {
+            'Ntasks': self.Ntasks,
+            'Nposition_updates': self.Nposition_updates,
+            'Nbeam_updates': self.Nbeam_updates,
+            'position_reuse': 1 - self.Nposition_updates / Ntasks,
+            'beam_reuse': 1 - self.Nbeam_updates / Ntasks,
+        }
+
 
-def _make_task_inds(Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus):
+def _make_task_inds(Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, node_ids=None, grid=None):
     """
     Make iterators defining task and sources computed on rank.
 
-       Three options ---
-           (1) Npus < Nbltf -- Split by Nbltf, split sources in the task loop for memory's sake.
-           (2) Nbltf < Npus and Nsrcs > Npus -- Split by Nsrcs only
-           (3) (Nsrcs, Nbltf) < Npus -- Split by Nbltf
-       - Split by instrument axes here.
-       - Within the task loop, decide on source chunks and make skymodels on the fly.
+    The tasks and sources are split into a 2-D grid of blocks, one per rank, with the
+    grid shape chosen from a cost model (see :mod:`pyuvsim.decomposition`). Splitting
+    only the tasks, or only the sources, are special cases of the grid.
+    Within the task loop, source chunks are chosen and skymodels are made on the fly.
+
+    Parameters
+    ----------
+    Nbls, Ntimes, Nfreqs, Nsrcs : int
+        Problem size.
+    rank, Npus : int
+        Rank of this process, and the number of processes.
+    node_ids : list
+        Node of each process, indexed by rank, so that processes on a node share
+        the same block of sources.
+    grid : tuple of int
+        (Ntask_blocks, Nsrc_blocks). Defaults to
+        :func:`pyuvsim.decomposition.choose_block_grid`. Pass it in when making the
+        indices for many ranks, to choose the grid only once.
     """
+    return make_block_inds(Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, grid=grid,
+                           node_ids=node_ids)
 
-    Nbltf = Nbls * Ntimes * Nfreqs
 
-    split_srcs = False
+class SkyChunker:
+    """
+    Split the sources into chunks to be simulated one at a time.
 
-    if (Nbltf < Npus) and (Npus < Nsrcs):
-        split_srcs = True
+    The sources are divided into `Nblocks` nearly equal blocks, and each chunk is made of
+    whole blocks. Without a memory ceiling, each chunk is one block, so there are
+    `Nsky_parts` chunks.
 
-    if split_srcs:
-        src_inds, Nsrcs_local = simutils.iter_array_split(rank, Nsrcs, Npus)
-        task_inds = range(Nbltf)
-        Ntasks_local = Nbltf
-    else:
-        task_inds, Ntasks_local = simutils.iter_array_split(rank, Nbltf, Npus)
-        src_inds = range(Nsrcs)
-        Nsrcs_local = Nsrcs
+    With a memory ceiling, the chunk size adapts during the run: at the end of each chunk
+    (see :meth:`chunk_done`), the growth in resident memory over the chunk is measured,
+    and the next chunk is made as large as fits within the ceiling.
 
-    return task_inds, src_inds, Ntasks_local, Nsrcs_local
+    Parameters
+    ----------
+    Nsrcs : int
+        Number of source components to split.
+    Nsky_parts : int
+        Number of chunks to start with (sets the size of the first chunk).
+    mem_ceiling : float
+        Maximum resident memory for this process, in bytes. If None, the chunks are fixed.
+    Nblocks : int
+        Number of blocks. Defaults to `Nsky_parts` without a memory ceiling, and to
+        the larger of 64 and 4 * `Nsky_parts` (at most `Nsrcs`) with one.
+    mem_fraction : float
+        Fraction of the memory left below the ceiling to use for each chunk.
+
+    Attributes
+    ----------
+    chunk_index : int
+        Index of the current chunk (-1 before the first).
+    chunk_blocks : int
+        Number of blocks in the current chunk.
+    blocks_per_chunk : int
+        Number of blocks to put in the next chunk.
+    mem_per_block : float
+        Estimated bytes of memory needed per block of sources.
+    """
 
+    def __init__(self, Nsrcs, Nsky_parts=1, mem_ceiling=None, Nblocks=None, mem_fraction=0.8):
+        Nsky_parts = max(int(Nsky_parts), 1)
+        if Nblocks is None:
+            if mem_ceiling is None:
+                Nblocks = Nsky_parts
+            else:
+                Nblocks = max(64, 4 * Nsky_parts)
+        self.Nsrcs = Nsrcs
+        self.Nblocks = max(min(int(Nblocks), Nsrcs), 1)
+        self.mem_ceiling = mem_ceiling
+        self.mem_fraction = mem_fraction
+        self.blocks_per_chunk = int(np.ceil(self.Nblocks / Nsky_parts))
+        self.chunk_index = -1
+        self.chunk_blocks = 0
+        self.blocks_done = 0
+        self.mem_per_block = None
+        self._rss_start = None
+
+    @property
+    def Nchunks(self):
+        """Number of chunks, including those still to come at the current chunk size."""
+        remaining = self.Nblocks - self.blocks_done - self.chunk_blocks
+        return self.chunk_index + 1 + int(np.ceil(remaining / self.blocks_per_chunk))
+
+    @property
+    def final_chunk(self):
+        """Whether the current chunk holds the last of the sources."""
+        return self.chunk_blocks > 0 and self.blocks_done + self.chunk_blocks == self.Nblocks
+
+    def _block_start(self, block):
+        if block == self.Nblocks:
+            return self.Nsrcs
+        return simutils.iter_array_split(block, self.Nsrcs, self.Nblocks)[0].start
+
+    def __iter__(self):
+        while self.blocks_done < self.Nblocks:
+            self.chunk_blocks = min(self.blocks_per_chunk, self.Nblocks - self.blocks_done)
+            self.chunk_index += 1
+            if self.mem_ceiling is not None:
+                self._rss_start = simutils.get_current_rss()
+            yield range(self._block_start(self.blocks_done),
+                        self._block_start(self.blocks_done + self.chunk_blocks))
+            self.blocks_done += self.chunk_blocks
+            self.chunk_blocks = 0
+
+    def chunk_done(self):
+        """
+        Set the size of the next chunk from the memory used by the current one.
+
+        Call this at the end of each chunk, while its sources are still in memory.
+        Does nothing without a memory ceiling.
+        """
+        if self.mem_ceiling is None:
+            return
+        growth = max(simutils.get_current_rss() - self._rss_start, 0)
+        mem_per_block = growth / self.chunk_blocks
+        if self.mem_per_block is not None:
+            # Freed memory may be kept by the allocator and reused by the next chunk, so
+            # the apparent growth can drop to zero. Only let the estimate decay gradually.
+            mem_per_block = max(mem_per_block, 0.5 * self.mem_per_block)
+        self.mem_per_block = mem_per_block
+        if mem_per_block == 0:
+            self.blocks_per_chunk = self.Nblocks
+            return
+        headroom = self.mem_fraction * (self.mem_ceiling - self._rss_start)
+        self.blocks_per_chunk = int(min(max(headroom // mem_per_block, 1), self.Nblocks))
+
+
+def _is_lazy(sky, freq_array):
+    # Whether the engine can evaluate the fluxes of this sky at each frequency.
+    if sky.spectral_type == 'spectral_index':
+        return True
+    if sky.spectral_type != 'subband':
+        return False
+    # Out of range frequencies are left for at_frequencies to raise errors on,
+    # and NaNs for it to handle.
+    sub_freqs = sky.freq_array.to_value('Hz')
+    freqs = freq_array.to_value('Hz')
+    return (np.min(freqs) >= np.min(sub_freqs) and np.max(freqs) <= np.max(sub_freqs)
+            and not np.any(np.isnan(sky.stokes)))
+
+
+def _telescope_location(input_uv):
+    # Location of the array, on the Earth or the Moon.
+    tloc = [np.float64(x) for x in input_uv.telescope_location]
 
-def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_parts=1):
+    world = input_uv.extra_keywords.get('world', 'earth')
+
+    if world.lower() == 'earth':
+        return EarthLocation.from_geocentric(*tloc, unit='m')
+    elif world.lower() == 'moon':
+        if not hasmoon:
+            raise ValueError("Need lunarsky module to simulate an array on the Moon.")
+        return MoonLocation.from_selenocentric(*tloc, unit='m')
+    raise ValueError("If world keyword is set, it must be either 'moon' or 'earth'.")
+
+
+def _use_rise_set(input_uv, horizon_buffer):
+    # Whether the tasks at each time are only given the sources that may be above the
+    # horizon. The Moon rotates about a different axis, so this is only done on the Earth.
+    return (horizon_buffer is not None and input_uv.lst_array is not None
+            and isinstance(_telescope_location(input_uv), EarthLocation))
+
+
+def _get_phase_center(phase_center, input_uv):
+    # ICRS phase center, with "zenith" meaning zenith at the first time (as for
+    # force_phase when writing uvfits files).
+    if isinstance(phase_center, str):
+        if phase_center != 'zenith':
+            raise ValueError("phase_center must be 'zenith' or a SkyCoord, got '{}'.".format(
+                phase_center))
+        location = _telescope_location(input_uv)
+        time = Time(input_uv.time_array[0], scale='utc', format='jd')
+        if isinstance(location, MoonLocation):
+            frame = LunarTopo(obstime=time, location=location)
+        else:
+            frame = AltAz(obstime=time, location=location)
+        phase_center = SkyCoord(alt=90 * units.deg, az=0 * units.deg, frame=frame)
+    return SkyCoord(phase_center).transform_to('icrs')
+
+
+def _phase_metadata(uv_obj, phase_center):
+    # Phase uv_obj to phase_center. Objects without data arrays (metadata only) only
+    # have their uvws and phase center updated.
+    ra, dec = phase_center.ra.rad, phase_center.dec.rad
+    if hasattr(uv_obj, 'phase_center_catalog'):
+        # Newer pyuvdata keeps a catalog of named phase centers.
+        uv_obj.phase(ra, dec, epoch='J2000', phase_frame='icrs', cat_name='phase_center')
+    else:
+        uv_obj.phase(ra, dec, epoch='J2000', phase_frame='icrs')
+
+
+def _make_output(input_uv, phase_center=None, lean=False, metadata_only=False):
+    # The output container for the root process. It is phased before its arrays are
+    # allocated, so that phasing does not pass over the (zero) visibilities. Outputs
+    # written in parallel stay metadata only.
+    uv_out = simsetup._complete_uvdata(input_uv, inplace=False, metadata_only=True)
+    if 'world' in input_uv.extra_keywords:
+        uv_out.extra_keywords['world'] = input_uv.extra_keywords['world']
+    if phase_center is not None:
+        _phase_metadata(uv_out, phase_center)
+    if not metadata_only:
+        simsetup._init_uvdata_arrays(uv_out, lean=lean)
+    return uv_out
+
+
+def _make_sky(catalog, inds, freq_array, lazy_spectra):
+    # SkyModel of the catalog components inds, ready for the engine.
+    sky = catalog.get_skymodel(inds)
+    if (
+        sky.spectral_type == 'flat'
+        and sky.freq_array is None
+        and sky.reference_frequency is None
+    ):
+        sky.freq_array = freq_array[0]
+    if sky.component_type == 'healpix' and hasattr(sky, 'healpix_to_point'):
+        sky.healpix_to_point()
+    if sky.spectral_type != 'flat' and not (lazy_spectra and _is_lazy(sky, freq_array)):
+        sky.at_frequencies(freq_array[0])
+    return sky
+
+
+def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_parts=1,
+                        sky_chunker=None, lazy_spectra=False, horizon_buffer=None):
     """
     Generates UVTask objects.
 
     Parameters
     ----------
-    task_ids: range
-        Task indices in the full flattened meshgrid of parameters.
+    task_ids: range or array_like of int
+        Task indices in the full flattened meshgrid of parameters, in the order to run them.
     input_uv: :class:~`pyuvdata.UVData`
         UVData object to be filled with data.
     catalog: :class:~`simsetup.SkyModelData`
@@ -248,6 +614,28 @@ def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_
         BeamList carrying beam model (in object mode).
     beam_dict: dict
         Map of antenna numbers to index in beam_list.
+    Nsky_parts: int
+        Number of chunks to split the sources into. Ignored if sky_chunker is given.
+    sky_chunker: :class:`SkyChunker`
+        Chooses the chunks of sources, e.g. adapting their size to the memory used.
+        Defaults to a SkyChunker splitting the sources into Nsky_parts fixed chunks.
+    lazy_spectra: bool
+        Keep the reference fluxes and spectral indices (or subband fluxes) of
+        "spectral_index" and "subband" catalogs, rather than evaluating the fluxes at
+        all frequencies for each chunk of sources. The engine then evaluates them at the
+        frequency of each task, so the memory used by a chunk does not depend on the
+        number of frequencies. Subband catalogs with NaN fluxes are always evaluated
+        up front.
+    horizon_buffer: float
+        For arrays on the Earth, the tasks at each time are only given the sources of
+        each chunk that may be above the horizon, from rise and set LSTs widened by this
+        angle in radians (see :func:`pyuvsim.utils.rise_set_lsts`). This saves computing
+        the positions and beam responses of sources below the horizon, and tasks at
+        times when none of the chunk's sources are up are skipped. If None (the
+        default), the tasks are given all sources of the chunk. The fraction of sources
+        given is recorded with the phase timings. The sky is rebuilt at each change of
+        time, so the tasks should run with time as the outer loop. A typical value is
+        0.04364 (10 minutes of LST).
 
     Yields
     ------
@@ -262,13 +650,8 @@ def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_
     if not isinstance(catalog, SkyModelData):
         raise TypeError("catalog must be a SkyModelData object.")
     # Splitting the catalog for memory's sake.
-    Nsrcs_total = catalog.Ncomponents
-    if Nsky_parts > 1:
-        Nsky_parts = int(Nsky_parts)
-        src_iter = [simutils.iter_array_split(s, Nsrcs_total, Nsky_parts)[0]
-                    for s in range(Nsky_parts)]
-    else:
-        src_iter = [range(Nsrcs_total)]
+    if sky_chunker is None:
+        sky_chunker = SkyChunker(catalog.Ncomponents, Nsky_parts)
     # Build the antenna list.
     antenna_names = input_uv.antenna_names
     antennas = []
@@ -288,33 +671,32 @@ def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_
     tasks_shape = (Ntimes, Nfreqs, Nbls)
     time_ax, freq_ax, bl_ax = range(3)
 
-    tloc = [np.float64(x) for x in input_uv.telescope_location]
-
-    world = input_uv.extra_keywords.get('world', 'earth')
-
-    if world.lower() == 'earth':
-        location = EarthLocation.from_geocentric(*tloc, unit='m')
-    elif world.lower() == 'moon':
-        if not hasmoon:
-            raise ValueError("Need lunarsky module to simulate an array on the Moon.")
-        location = MoonLocation.from_selenocentric(*tloc, unit='m')
-    else:
-        raise ValueError("If world keyword is set, it must be either 'moon' or 'earth'.")
+    location = _telescope_location(input_uv)
     telescope = Telescope(input_uv.telescope_name, location, beam_list)
     freq_array = input_uv.freq_array * units.Hz
     time_array = Time(input_uv.time_array, scale='utc', format='jd', location=telescope.location)
-    for src_i in src_iter:
-        sky = catalog.get_skymodel(src_i)
-        if (
-            sky.spectral_type == 'flat'
-            and sky.freq_array is None
-            and sky.reference_frequency is None
-        ):
-            sky.freq_array = freq_array[0]
-        if sky.component_type == 'healpix' and hasattr(sky, 'healpix_to_point'):
-            sky.healpix_to_point()
-        if sky.spectral_type != 'flat':
-            sky.at_frequencies(freq_array[0])
+    # The sources of each chunk are only handed to the tasks at times when they may be
+    # above the horizon, from their rise and set LSTs.
+    use_rise_set = _use_rise_set(input_uv, horizon_buffer)
+    if use_rise_set:
+        latitude = input_uv.telescope_location_lat_lon_alt[0]
+        lst_array = input_uv.lst_array
+        Nsky_updates, Nsources, Nactive = 0, 0, 0
+    for src_i in sky_chunker:
+        timing.phase_timer.start('task_loop.sky_chunk')
+        timing.trace_instant('sky_chunk_switch', cat='compute', chunk=sky_chunker.chunk_index,
+                             Nchunks=sky_chunker.Nchunks, Ncomponents=len(src_i))
+        if use_rise_set:
+            src_inds = np.asarray(src_i)
+            rise_lst, set_lst = simutils.rise_set_lsts(
+                np.radians(catalog.ra[src_inds]), np.radians(catalog.dec[src_inds]), latitude,
+                horizon_buffer=horizon_buffer
+            )
+            sky = None
+            sky_time_i = None
+        else:
+            sky = _make_sky(catalog, src_i, freq_array, lazy_spectra)
+        timing.phase_timer.stop()
 
         for task_index in task_ids:
             # Shape indicates slowest to fastest index.
@@ -334,6 +716,25 @@ def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_
                 index2 = np.where(input_uv.antenna_numbers == antnum2)[0][0]
                 baselines[bl_i] = Baseline(antennas[index1], antennas[index2])
 
+            if use_rise_set and time_i != sky_time_i:
+                # Hand this time only the sources that may be above the horizon.
+                timing.phase_timer.start('task_loop.sky_chunk')
+                active = simutils.active_source_inds(lst_array[blti], rise_lst, set_lst)
+                Nsources += src_inds.size
+                Nactive += active.size
+                del sky
+                sky = None
+                if active.size:
+                    sky = _make_sky(catalog, src_inds[active], freq_array, lazy_spectra)
+                sky_time_i = time_i
+                Nsky_updates += 1
+                timing.phase_timer.set_stats('active_sources', {
+                    'Nsky_updates': Nsky_updates, 'active_fraction': Nactive / Nsources})
+                timing.phase_timer.stop()
+            if sky is None:
+                # None of the chunk's sources are above the horizon at this time.
+                continue
+
             time = time_array[blti]
             bl = baselines[bl_i]
             freq = freq_array[0, freq_i]  # 0 = spw axis
@@ -342,6 +743,7 @@ def uvdata_to_task_iter(task_ids, input_uv, catalog, beam_list, beam_dict, Nsky_
             task.uvdata_index = (blti, 0, freq_i)    # 0 = spectral window index
 
             yield task
+        sky_chunker.chunk_done()
         del sky
 
 
@@ -354,6 +756,183 @@ def serial_gather(uvtask_list, uv_out):
     return uv_out
 
 
+def _add_task_blocks(blocks, uv_out, shape):
+    # Add (offset, block) pairs of visibilities, indexed by flat task index in the
+    # (Ntimes, Nfreqs, Nbls) grid, to the data array.
+    Nbls = shape[2]
+    for offset, block in blocks:
+        time_i, freq_i, bl_i = np.unravel_index(np.arange(offset, offset + len(block)), shape)
+        uv_out.data_array[bl_i + time_i * Nbls, 0, freq_i, :] += block
+
+    return uv_out
+
+
+class _UVH5BlockWriter:
+    # A block_writer for run_uvdata_uvsim, writing each block to a UVH5 file.
+
+    def __init__(self, filename, history):
+        self.filename = filename
+        self.history = history
+        self.initialized = False
+
+    def __call__(self, uv_header, blt_inds, data, flags, nsamples):
+        if not self.initialized:
+            uv_header.history = self.history
+            uv_header.initialize_uvh5_file(self.filename, clobber=True)
+            self.initialized = True
+        uv_header.write_uvh5_part(self.filename, data, flags, nsamples, blt_inds=blt_inds,
+                                  check_header=False)
+
+
+def _write_parallel(comm, filename, local_vis, task_block, shape, uv_out=None):
+    # Write each rank's visibilities to a UVH5 file prepared by the root (uv_out), after
+    # summing them over the ranks holding the same tasks for other sources.
+    if len(task_block):
+        task_comm = comm.Split(color=task_block.start, key=comm.rank)
+    else:
+        task_comm = comm.Split(color=mpi.MPI.UNDEFINED, key=comm.rank)
+    summed = None
+    if task_comm != mpi.MPI.COMM_NULL:
+        if task_comm.rank == 0:
+            summed = np.empty_like(local_vis)
+        with timing.trace('comm.Reduce', cat='mpi'):
+            task_comm.Reduce(local_vis, summed, op=mpi.MPI.SUM, root=0)
+        task_comm.Free()
+
+    layout = None
+    if comm.rank == 0:
+        with timing.phase('write.header'):
+            layout = simutils.initialize_uvh5_parallel(uv_out, filename, clobber=True)
+    layout = comm.bcast(layout, root=0)
+
+    if summed is not None:
+        time_i, freq_i, bl_i = np.unravel_index(np.asarray(task_block), shape)
+        simutils.write_uvh5_visibilities(filename, layout, bl_i + time_i * shape[2], freq_i,
+                                         summed)
+    with timing.trace('comm.Barrier', cat='mpi'):
+        comm.Barrier()
+
+
+# MPI tag for the blocks of visibilities sent by pipelined runs.
+_pipeline_tag = 11
+
+
+class _BlockWriter:
+    # Call block_writer on a background thread for each block put. pyuvdata's
+    # writers reshape the arrays of the object they are called on, so the thread
+    # gets its own copy of the metadata and of each block.
+
+    def __init__(self, block_writer, uv_out):
+        self.block_writer = block_writer
+        self.uv_out = uv_out
+        self.uv_header = uv_out.copy(metadata_only=True)
+        self.queue = queue.Queue()
+        self.error = None
+        self.Nblocks_written = 0
+        self.write_time = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            block = self.queue.get()
+            if block is None:
+                return
+            if self.error is not None:
+                continue
+            t0 = pytime.perf_counter()
+            try:
+                self.block_writer(self.uv_header, *block)
+            except Exception as err:
+                self.error = err
+            self.write_time += pytime.perf_counter() - t0
+            self.Nblocks_written += 1
+
+    def put(self, blt_inds):
+        self.queue.put((blt_inds, self.uv_out.data_array[blt_inds],
+                        self.uv_out.flag_array[blt_inds], self.uv_out.nsample_array[blt_inds]))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class _TimeBlockPipeline:
+    # Send the visibilities of each finished time to the root while the task loop runs.
+    # The root adds blocks to the output as they arrive, and once all the blocks of
+    # a time are in, hands its baseline-times to a _BlockWriter.
+
+    def __init__(self, comm, local_vis, task_block, shape, uv_out=None, Npending=None,
+                 block_writer=None):
+        self.comm = comm
+        self.local_vis = local_vis
+        self.task_block = task_block
+        self.shape = shape
+        self.time_size = shape[1] * shape[2]
+        self.uv_out = uv_out
+        self.Npending = Npending
+        self.requests = []
+        self.Nblocks_received = 0
+        self.writer = None
+        if block_writer is not None:
+            self.writer = _BlockWriter(block_writer, uv_out)
+        # Next time of the block to finish.
+        self.next_time = task_block.start // self.time_size
+
+    def finish_before(self, time_i):
+        # Finish the times of the block before time_i, including any that had no tasks
+        # in the last chunk of sources.
+        while self.next_time < time_i:
+            self.finish(self.next_time)
+            self.next_time += 1
+
+    def finish(self, time_i):
+        start = max(self.task_block.start, time_i * self.time_size)
+        stop = min(self.task_block.stop, (time_i + 1) * self.time_size)
+        block = self.local_vis[start - self.task_block.start:stop - self.task_block.start]
+        if self.comm.rank == 0:
+            self._add(start, block)
+        else:
+            # The block is pickled here, so the request only holds the message.
+            self.requests.append(self.comm.isend((start, block), dest=0, tag=_pipeline_tag))
+
+    def _add(self, offset, block):
+        _add_task_blocks([(offset, block)], self.uv_out, self.shape)
+        time_i = offset // self.time_size
+        self.Npending[time_i] -= 1
+        if self.Npending[time_i] == 0 and self.writer is not None:
+            Nbls = self.shape[2]
+            self.writer.put(np.arange(time_i * Nbls, (time_i + 1) * Nbls))
+
+    def _receive(self):
+        self._add(*self.comm.recv(source=mpi.MPI.ANY_SOURCE, tag=_pipeline_tag))
+        self.Nblocks_received += 1
+
+    def poll(self):
+        while self.comm.iprobe(source=mpi.MPI.ANY_SOURCE, tag=_pipeline_tag):
+            self._receive()
+
+    def close(self):
+        if len(self.task_block):
+            self.finish_before((self.task_block.stop - 1) // self.time_size + 1)
+        if self.comm.rank == 0:
+            while np.any(self.Npending > 0):
+                self._receive()
+            if self.writer is not None:
+                self.writer.close()
+        else:
+            mpi.MPI.Request.waitall(self.requests)
+
+    def stats(self):
+        stats = {'Nblocks_sent': len(self.requests), 'Nblocks_received': self.Nblocks_received}
+        if self.writer is not None:
+            stats['Nblocks_written'] = self.writer.Nblocks_written
+            stats['write_time'] = self.writer.write_time
+        return stats
+
+
 def _check_ntasks_valid(Ntasks_tot):
     """Check that the size of the task array won't overflow the gather."""
 
@@ -370,7 +949,185 @@ def _check_ntasks_valid(Ntasks_tot):
         )
 
 
-def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=False):
+def _baseline_beam_pairs(input_uv, beam_dict):
+    # Beam ids of the two antennas of each baseline (as indexed in the task grid).
+    if beam_dict is None:
+        return [(0, 0)] * input_uv.Nbls
+    names = dict(zip(input_uv.antenna_numbers, input_uv.antenna_names))
+    return [(beam_dict[names[ant1]], beam_dict[names[ant2]])
+            for ant1, ant2 in zip(input_uv.ant_1_array[:input_uv.Nbls],
+                                  input_uv.ant_2_array[:input_uv.Nbls])]
+
+
+def _spline_capacity(beam_list, spline_beams, max_bytes):
+    # Number of frequencies for which the splines of these UVBeams fit within the budget.
+    # The splines of one frequency take about as much memory as the beam data there.
+    if max_bytes is None or len(spline_beams) == 0:
+        return None
+    nbytes = sum(beam_list[ind].data_array.nbytes / beam_list[ind].Nfreqs
+                 for ind in spline_beams)
+    return int(max_bytes // nbytes)
+
+
+def _check_power_beam(input_uv, beam_dict, catalog):
+    # Power beams need an unpolarized sky and the same beam on all antennas.
+    if catalog.polarized is not None and np.any(
+        [np.any(stokes != 0) for stokes in [catalog.stokes_Q, catalog.stokes_U,
+                                            catalog.stokes_V]]
+    ):
+        raise ValueError("Power beams can only be used for unpolarized skies.")
+    if beam_dict is not None and len(
+        set(beam_dict[antname] for antname in input_uv.antenna_names)
+    ) > 1:
+        raise ValueError("Power beams can only be used if all antennas have the same beam.")
+
+
+def _set_up_beams(beam_list, input_uv, Npus_node, max_mem_per_node=None, beam_lookup=None,
+                  power_beam=False, spline_cache_mem=None, beam_cache_dir=None):
+    # Put the beams in object mode with the run's caches and evaluation options.
+    # Returns the spline cache budget of each process.
+    if spline_cache_mem is None:
+        mem_node = max_mem_per_node
+        if mem_node is None:
+            mem_node = simutils.get_avail_memory()
+        spline_cache_mem = 0.1 * mem_node / Npus_node
+
+    # Construct beam objects from strings
+    with timing.phase('beam_setup'):
+        beam_list.set_spline_cache(spline_cache_mem)
+        if beam_cache_dir is not None:
+            beam_list.set_response_cache(beam_cache_dir)
+        if beam_lookup is not None:
+            beam_list.lookup_opts = beam_lookup
+        if power_beam:
+            beam_list.beam_type = 'power'
+        beam_list.set_obj_mode(use_shared_mem=True, freq_array=input_uv.freq_array[0])
+    return spline_cache_mem
+
+
+def _record_cache_stats(timer, beam_list, engine):
+    # Record the reuse of splines, beam responses and engine results with the timings.
+    timer.set_stats('spline_cache', beam_list.spline_cache.stats())
+    timer.set_stats('engine_reuse', engine.reuse_stats())
+    if beam_list.response_cache is not None:
+        timer.set_stats('beam_response_cache', beam_list.response_cache.stats())
+
+
+def _make_sky_chunker(catalog, Nfreqs, Nsrcs_local, Npus_node, max_mem_per_node=None,
+                      adaptive_sky_chunks=False, lazy_spectra=False):
+    # Estimate the number of sky chunks from the memory available, and set up the
+    # chunker for the sources on this rank. Returns the chunker and the estimate.
+    Nsrcs = catalog.Ncomponents
+
+    # Estimating required memory to decide how to split source array.
+    mem_avail = (simutils.get_avail_memory()
+                 - mpi.get_max_node_rss(return_per_node=True) * 2**30)
+    if max_mem_per_node is not None:
+        mem_avail = min(mem_avail, max_mem_per_node)
+
+    # Unless evaluated lazily, the fluxes of each chunk are evaluated at all frequencies.
+    Nfreqs_sky = catalog.Nfreqs
+    if catalog.spectral_type in ['spectral_index', 'subband'] and not lazy_spectra:
+        Nfreqs_sky = max(Nfreqs_sky, Nfreqs)
+    skymodel_mem_footprint = (
+        simutils.estimate_skymodel_memory_usage(Nsrcs, Nfreqs_sky) * Npus_node
+    )
+
+    # Allow up to 50% of available memory for SkyModel data.
+    skymodel_mem_max = 0.5 * mem_avail
+
+    Nsky_parts = np.ceil(skymodel_mem_footprint / float(skymodel_mem_max))
+    Nsky_parts = max(Nsky_parts, 1)
+    if Nsky_parts > Nsrcs:
+        raise ValueError("Insufficient memory for simulation.")
+
+    # The chunk sizes start from the estimate above and, if adaptive, are adjusted
+    # using the memory measured on each rank.
+    mem_ceiling = None
+    if adaptive_sky_chunks:
+        if max_mem_per_node is None:
+            # The available memory excludes the memory in use, while the ceiling is
+            # compared against the resident memory of the rank.
+            mem_ceiling = (simutils.get_current_rss()
+                           + simutils.get_avail_memory() / Npus_node)
+        else:
+            mem_ceiling = max_mem_per_node / Npus_node
+    sky_chunker = SkyChunker(Nsrcs_local, Nsky_parts, mem_ceiling=mem_ceiling)
+    return sky_chunker, Nsky_parts
+
+
+def _order_local_tasks(task_inds, input_uv, beam_list, beam_dict, Nsrcs_chunk,
+                       task_order=None, spline_cache_mem=None, pipeline=False,
+                       horizon_buffer=None, verbose=False):
+    # Order the tasks of this rank. Returns the task indices and the horizon buffer for
+    # uvdata_to_task_iter (None to give the tasks all sources).
+    # The sky is rebuilt at each change of time when the tasks are only given the sources
+    # that may be above the horizon, so time is kept as the outer loop of "auto" orders,
+    # and all sources are given to the tasks with explicit orders that change the time
+    # more often.
+    rise_set = _use_rise_set(input_uv, horizon_buffer)
+    if task_order is None:
+        return task_inds, horizon_buffer
+    if rise_set and task_order != 'auto' and task_order.split(',')[0].strip() != 'time':
+        horizon_buffer = None
+        rise_set = False
+    with timing.phase('task_loop.order'):
+        spline_beams = [ind for ind, beam in enumerate(beam_list)
+                        if isinstance(beam, UVBeam) and ind not in beam_list.lookup_tables]
+        task_inds, order_report = plan_task_order(
+            task_inds, (input_uv.Ntimes, input_uv.Nfreqs, input_uv.Nbls),
+            _baseline_beam_pairs(input_uv, beam_dict), Nsrcs_chunk, order=task_order,
+            spline_beams=spline_beams,
+            spline_capacity=_spline_capacity(beam_list, spline_beams, spline_cache_mem),
+            outer_axis='time' if pipeline or rise_set else None, rebuild_sky=rise_set
+        )
+    timing.phase_timer.set_stats('task_order', order_report)
+    if verbose:
+        print("Task order: {} (predicted beam reuse {:.1%})".format(
+            order_report['order'], order_report['beam_reuse']), flush=True)
+    return task_inds, horizon_buffer
+
+
+def _pending_ranks(Nbls, Ntimes, Nfreqs, Nsrcs, Npus, grid):
+    # Number of ranks with tasks at each time. The count does not depend on which
+    # rank holds each cell of the grid, so the cells are taken in order.
+    Npending = np.zeros(Ntimes, dtype=int)
+    for cell in range(Npus):
+        other_inds = _make_task_inds(Nbls, Ntimes, Nfreqs, Nsrcs, cell, Npus, grid=grid)[0]
+        if len(other_inds):
+            Npending[other_inds.start // (Nfreqs * Nbls):
+                     (other_inds.stop - 1) // (Nfreqs * Nbls) + 1] += 1
+    return Npending
+
+
+def _collect_output(comm, local_vis, task_block, src_inds, Ntasks_local, shape, uv_out,
+                    parallel_outfile=None):
+    # Put the visibilities of all ranks into the output on the root process (uv_out),
+    # or write them to parallel_outfile.
+    if parallel_outfile is not None:
+        with timing.phase('write'):
+            _write_parallel(comm, parallel_outfile, local_vis, task_block, shape, uv_out)
+        return
+
+    # Sum the blocks of all ranks on each node in shared memory, so the root receives
+    # each summed row once. Ranks in the same source block have disjoint tasks.
+    with timing.phase('gather'):
+        node_blocks = mpi.node_block_sum(local_vis, task_block.start, group=src_inds.start)
+        with timing.trace('comm.gather', cat='mpi'):
+            localtasks_count = comm.gather(Ntasks_local, root=0)
+
+        if comm.rank == 0:
+            localtasks_count = np.sum(localtasks_count)
+            with timing.phase('gather.assemble'):
+                _add_task_blocks(node_blocks, uv_out, shape)
+
+
+def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=False,
+                     max_mem_per_node=None, adaptive_sky_chunks=False, beam_lookup=None,
+                     power_beam=False, spline_cache_mem=None, beam_cache_dir=None,
+                     lazy_spectra=False, task_order=None, pipeline=False, block_writer=None,
+                     parallel_outfile=None, phase_center=None, lean_output=False,
+                     horizon_buffer=None):
     """
     Run uvsim from UVData object.
 
@@ -388,10 +1145,88 @@ def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=Fa
         Immutable source parameters.
     quiet: bool
         Do not print anything.
+    max_mem_per_node: float
+        Memory ceiling per node in bytes, shared evenly among the processes on each node.
+        Defaults to the available memory (see :func:`pyuvsim.utils.get_avail_memory`).
+    adaptive_sky_chunks: bool
+        Adapt the number of sources simulated at a time to the memory used while running,
+        to stay within each process's share of the memory ceiling. Without
+        `max_mem_per_node`, the ceiling of each process is the memory it already uses
+        plus its share of the available memory. If False, the sources are split into a
+        fixed number of chunks, estimated before the task loop.
+    beam_lookup: dict
+        If given, evaluate UVBeams from lookup tables compiled at the simulation frequencies,
+        rather than with spline interpolation. The dictionary holds keyword arguments for
+        :meth:`pyuvsim.BeamList.compile_lookup_tables` (an empty one uses the defaults).
+    power_beam: bool
+        Simulate with power beams rather than E-field beams, which is faster. Only
+        for unpolarized skies, with all antennas using the same beam. E-field beams
+        are converted to power beams when they are set up.
+    spline_cache_mem: float
+        Memory budget in bytes for the UVBeam interpolation splines kept on each process
+        (see :meth:`pyuvsim.BeamList.set_spline_cache`). Defaults to a tenth of each
+        process's share of the memory ceiling. Hits, misses and evictions are recorded
+        with the phase timings.
+    beam_cache_dir: str
+        If given, UVBeam responses are saved in this directory and reused by later runs
+        evaluating the same beams at the same source positions
+        (see :meth:`pyuvsim.BeamList.set_response_cache`).
+    lazy_spectra: bool
+        Evaluate the fluxes of "spectral_index" and "subband" catalogs at each frequency
+        in the engine, rather than at all frequencies for each chunk of sources
+        (see :func:`uvdata_to_task_iter`). This allows larger chunks of sources when
+        there are many frequencies.
+    task_order: str
+        Order of the task loop on each process. Either "auto", to choose the order that
+        reuses the most beam evaluations, source positions and UVBeam splines according
+        to a cost model, or the axes from the outer to the inner loop, as in
+        "freq,time,baseline" (see :func:`pyuvsim.task_order.plan_task_order`).
+        Baselines are grouped by beam pair in either case. Defaults to time, frequency,
+        then baseline, in the order of the input UVData. The predicted and achieved
+        reuse are recorded with the phase timings. With `horizon_buffer` set, "auto"
+        keeps time as the outer loop, and explicit orders without time as the outer
+        loop give the tasks all sources.
+    pipeline: bool
+        Send the visibilities of each time to the root process with non-blocking
+        communication as soon as they are finished (in the last chunk of sources),
+        while the next ones are computed, rather than all at once at the end. Time is
+        kept as the outer loop of the tasks. The blocks are sent directly from each
+        process, without summing them on each node first.
+    block_writer: callable
+        Only used by pipelined runs, on the root process. Called on a background thread
+        as ``block_writer(uv_header, blt_inds, data, flags, nsamples)`` once the
+        visibilities at the baseline-times `blt_inds` of the output are final, with a
+        metadata-only copy of the output and copies of its data, flag and nsample arrays
+        at those baseline-times (e.g., to write them to file with
+        :meth:`pyuvdata.UVData.write_uvh5_part`).
+    parallel_outfile: str
+        If given, the visibilities are written to this UVH5 file by the processes that
+        computed them, rather than gathered on the root process. The root process writes
+        the header (see :func:`pyuvsim.utils.initialize_uvh5_parallel`), the visibilities
+        of each block of tasks are summed over the blocks of sources on one process, and
+        those processes then write them at the same time. Cannot be used with `pipeline`.
+    phase_center: :class:`astropy.coordinates.SkyCoord` or str
+        If given, simulate visibilities phased to this direction, or to zenith at the
+        first time if "zenith", rather than drift scan visibilities. The engine folds the
+        phasing into the fringe it computes, so the output does not need rephasing
+        before it is written (e.g., to uvfits files, which must be phased).
+    lean_output: bool
+        Make the flag and nsample arrays of the output read-only broadcasts of a single
+        value (all False and all 1), rather than full arrays, so the root process holds
+        little more than the visibilities. Meant for outputs that are only written to
+        file, since the arrays must be copied before they are modified.
+    horizon_buffer: float
+        For arrays on the Earth, only give the tasks at each time the sources that may
+        be above the horizon, from their rise and set LSTs widened by this angle in
+        radians (see :func:`uvdata_to_task_iter`). The sky is rebuilt at each change of
+        time, so this pays off for long observations of skies that are mostly below the
+        horizon at any time. Defaults to giving the tasks all sources.
 
     Returns
     -------
-    :class:~`pyuvdata.UVData` instance containing simulated visibilities.
+    :class:~`pyuvdata.UVData` instance containing simulated visibilities. If
+    `parallel_outfile` is set, the visibilities are only in the file, and the object
+    is metadata only.
     """
     if mpi is None:
         raise ImportError("You need mpi4py to use the uvsim module. "
@@ -410,6 +1245,12 @@ def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=Fa
     if not ((input_uv.Npols == 4) and (input_uv.polarization_array.tolist() == [-5, -6, -7, -8])):
         raise ValueError("input_uv must have XX,YY,XY,YX polarization")
 
+    if pipeline and parallel_outfile is not None:
+        raise ValueError("Pipelined runs cannot also write the output in parallel.")
+
+    if power_beam:
+        _check_power_beam(input_uv, beam_dict, catalog)
+
     # The root node will initialize our simulation
     # Read input file and make uvtask list
     if rank == 0 and not quiet:
@@ -417,69 +1258,127 @@ def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=Fa
         print('Ntimes:', input_uv.Ntimes, flush=True)
         print('Nfreqs:', input_uv.Nfreqs, flush=True)
         print('Nsrcs:', catalog.Ncomponents, flush=True)
+    if phase_center is not None:
+        phase_center = _get_phase_center(phase_center, input_uv)
     if rank == 0:
-        uv_container = simsetup._complete_uvdata(input_uv, inplace=False)
-        if 'world' in input_uv.extra_keywords:
-            uv_container.extra_keywords['world'] = input_uv.extra_keywords['world']
+        uv_container = _make_output(input_uv, phase_center=phase_center, lean=lean_output,
+                                    metadata_only=parallel_outfile is not None)
 
     Nbls = input_uv.Nbls
     Ntimes = input_uv.Ntimes
     Nfreqs = input_uv.Nfreqs
     Nsrcs = catalog.Ncomponents
 
+    Npus_node = mpi.node_comm.Get_size()
+    # Identify each node by the rank of its first process.
+    node_ids = comm.allgather(mpi.node_comm.bcast(rank, root=0))
+    grid = choose_block_grid(Nbls, Ntimes, Nfreqs, Nsrcs, Npus)
     task_inds, src_inds, Ntasks_local, Nsrcs_local = _make_task_inds(
-        Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus
+        Nbls, Ntimes, Nfreqs, Nsrcs, rank, Npus, node_ids=node_ids, grid=grid
     )
-
-    # Construct beam objects from strings
-    beam_list.set_obj_mode(use_shared_mem=True)
-
-    # Estimating required memory to decide how to split source array.
-    mem_avail = (simutils.get_avail_memory()
-                 - mpi.get_max_node_rss(return_per_node=True) * 2**30)
-
-    Npus_node = mpi.node_comm.Get_size()
-    skymodel_mem_footprint = (
-        simutils.estimate_skymodel_memory_usage(Nsrcs, catalog.Nfreqs) * Npus_node
+    # The tasks on each rank are contiguous in the flat task grid.
+    task_block = task_inds
+
+    Npending = None
+    if pipeline and rank == 0:
+        # Counted down as the blocks of each time arrive.
+        Npending = _pending_ranks(Nbls, Ntimes, Nfreqs, Nsrcs, Npus, grid)
+
+    spline_cache_mem = _set_up_beams(
+        beam_list, input_uv, Npus_node, max_mem_per_node=max_mem_per_node,
+        beam_lookup=beam_lookup, power_beam=power_beam, spline_cache_mem=spline_cache_mem,
+        beam_cache_dir=beam_cache_dir
     )
 
-    # Allow up to 50% of available memory for SkyModel data.
-    skymodel_mem_max = 0.5 * mem_avail
-
-    Nsky_parts = np.ceil(skymodel_mem_footprint / float(skymodel_mem_max))
-    Nsky_parts = max(Nsky_parts, 1)
-    if Nsky_parts > Nsrcs:
-        raise ValueError("Insufficient memory for simulation.")
+    sky_chunker, Nsky_parts = _make_sky_chunker(
+        catalog, Nfreqs, Nsrcs_local, Npus_node, max_mem_per_node=max_mem_per_node,
+        adaptive_sky_chunks=adaptive_sky_chunks, lazy_spectra=lazy_spectra
+    )
 
     Ntasks_tot = Ntimes * Nbls * Nfreqs * Nsky_parts
 
+    task_inds, horizon_buffer = _order_local_tasks(
+        task_inds, input_uv, beam_list, beam_dict, int(np.ceil(Nsrcs_local / Nsky_parts)),
+        task_order=task_order, spline_cache_mem=spline_cache_mem, pipeline=pipeline,
+        horizon_buffer=horizon_buffer, verbose=rank == 0 and not quiet
+    )
+
     local_task_iter = uvdata_to_task_iter(
         task_inds, input_uv, catalog.subselect(src_inds),
-        beam_list, beam_dict, Nsky_parts=Nsky_parts
+        beam_list, beam_dict, sky_chunker=sky_chunker, lazy_spectra=lazy_spectra,
+        horizon_buffer=horizon_buffer
     )
 
-    summed_task_dict = {}
+    # Visibilities are summed over the sky chunks into the rank's block of the flat
+    # task grid, whatever order the tasks run in.
+    local_vis = np.zeros((len(task_block), input_uv.Npols), dtype=complex)
+    if pipeline:
+        pipe = _TimeBlockPipeline(
+            comm, local_vis, task_block, (Ntimes, Nfreqs, Nbls),
+            uv_out=uv_container if rank == 0 else None, Npending=Npending,
+            block_writer=block_writer if rank == 0 else None
+        )
     Ntasks_tot = comm.reduce(Ntasks_tot, op=mpi.MPI.MAX, root=0)
+    # Progress is counted in tasks times blocks of sources, which does not depend on
+    # how the blocks are grouped into chunks.
+    Nprogress_tot = comm.reduce(Ntasks_local * sky_chunker.Nblocks, op=mpi.MPI.SUM, root=0)
     if rank == 0 and not quiet:
         print("Tasks: ", Ntasks_tot, flush=True)
-        pbar = simutils.progsteps(maxval=Ntasks_tot)
+        pbar = simutils.progsteps(maxval=Nprogress_tot)
 
-    engine = UVEngine()
+    engine = UVEngine(power_beam=power_beam, phase_center=phase_center)
     count = mpi.Counter()
-    for task in local_task_iter:
-        engine.set_task(task)
-        if task.uvdata_index not in summed_task_dict.keys():
-            summed_task_dict[task.uvdata_index] = task
-        if summed_task_dict[task.uvdata_index].visibility_vector is None:
-            summed_task_dict[task.uvdata_index].visibility_vector = engine.make_visibility()
-        else:
-            summed_task_dict[task.uvdata_index].visibility_vector += engine.make_visibility()
-
-        count.next()
-        if rank == 0 and not quiet:
-            pbar.update(count.current_value())
-
-    comm.Barrier()
+    timer = timing.phase_timer
+
+    from .profiling import live_metrics  # noqa
+    if live_metrics is not None:
+        live_metrics.start(Ntasks_local * sky_chunker.Nchunks, sky_chunker.Nchunks)
+    Ntasks_done = 0
+
+    with timing.phase('task_loop'):
+        for task in local_task_iter:
+            engine.set_task(task)
+            vis = engine.make_visibility()
+
+            t0 = pytime.perf_counter()
+            blti, _, freq_i = task.uvdata_index
+            task_i = ((blti // Nbls) * Nfreqs + freq_i) * Nbls + blti % Nbls
+            local_vis[task_i - task_block.start] += vis
+            timer.add('task_loop.accumulate', pytime.perf_counter() - t0)
+
+            if pipeline:
+                # Tasks run with time as the outer loop, so the earlier times are
+                # finished once a time starts in the last chunk of sources.
+                if sky_chunker.final_chunk:
+                    pipe.finish_before(blti // Nbls)
+                if rank == 0:
+                    pipe.poll()
+
+            count.next(sky_chunker.chunk_blocks)
+            if rank == 0 and not quiet:
+                pbar.update(count.current_value())
+            Ntasks_done += 1
+            if live_metrics is not None:
+                live_metrics.update(Ntasks_done, sky_chunker.chunk_index,
+                                    Ntasks=Ntasks_local * sky_chunker.Nchunks,
+                                    Nsky_chunks=sky_chunker.Nchunks)
+
+    if pipeline:
+        with timing.phase('gather'):
+            pipe.close()
+        timer.set_stats('pipeline', pipe.stats())
+
+    # Time spent waiting here reflects load imbalance among ranks.
+    if live_metrics is not None:
+        live_metrics.update(Ntasks_done, sky_chunker.chunk_index, force=True,
+                            Ntasks=Ntasks_done, Nsky_chunks=sky_chunker.chunk_index + 1)
+
+    _record_cache_stats(timer, beam_list, engine)
+
+    with timing.phase('wait'), timing.trace('comm.Barrier', cat='mpi'):
+        comm.Barrier()
+    if live_metrics is not None:
+        live_metrics.stop()
     count.free()
     if rank == 0 and not quiet:
         pbar.finish()
@@ -493,17 +1392,16 @@ def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=Fa
         # Saving axis sizes on current rank (local) and for the whole job (global).
         # These lines are affected by issue 179 of line_profiler, so the nocover
         # above will need to stay until this issue is resolved (see profiling.py).
-        task_inds = np.array(list(summed_task_dict.keys()))
-        bl_inds = task_inds[:, 0] % Nbls
-        time_inds = (task_inds[:, 0] - bl_inds) // Nbls
+        time_inds, freq_inds, bl_inds = np.unravel_index(np.asarray(task_block, dtype=int),
+                                                         (Ntimes, Nfreqs, Nbls))
         Ntimes_loc = np.unique(time_inds).size
         Nbls_loc = np.unique(bl_inds).size
-        Nfreqs_loc = np.unique(task_inds[:, 2]).size
+        Nfreqs_loc = np.unique(freq_inds).size
         axes_dict = {
             'Ntimes_loc': Ntimes_loc,
             'Nbls_loc': Nbls_loc,
             'Nfreqs_loc': Nfreqs_loc,
-            'Nsrcs_loc': Nsky_parts,
+            'Nsrcs_loc': sky_chunker.chunk_index + 1,
             'prof_rank': prof.rank
         }
 
@@ -511,32 +1409,13 @@ def run_uvdata_uvsim(input_uv, beam_list, beam_dict=None, catalog=None, quiet=Fa
             for k, v in axes_dict.items():
                 afile.write("{} \t {:d}\n".format(k, int(v)))
 
-    # All the sources in this summed list are foobar-ed
-    # Source are summed over but only have 1 name
-    # Some source may be correct
-    summed_local_task_list = list(summed_task_dict.values())
-    # Tasks contain attributes that are not pickle-able.
-    # Remove everything except uvdata_index and visibility_vector
-    for task in summed_local_task_list:
-        del task.time
-        del task.freq
-        del task.freq_i
-        del task.sources
-        del task.baseline
-        del task.telescope
-
-    # gather all the finished local tasks into a list of list of len NPUs
-    # gather is a blocking communication, have to wait for all PUs
-    full_tasklist = mpi.big_gather(comm, summed_local_task_list, root=0)
-    localtasks_count = comm.gather(Ntasks_local, root=0)
-
-    # Concatenate the list of lists into a flat list of tasks
-    if rank == 0:
-        localtasks_count = np.sum(localtasks_count)
-        uvtask_list = sum(full_tasklist, [])
-        uvdata_out = serial_gather(uvtask_list, uv_container)
+    if not pipeline:
+        _collect_output(comm, local_vis, task_block, src_inds, Ntasks_local,
+                        (Ntimes, Nfreqs, Nbls), uv_container if rank == 0 else None,
+                        parallel_outfile=parallel_outfile)
 
-        return uvdata_out
+    if rank == 0:
+        return uv_container
 
 
 def run_uvsim(params, return_uv=False, quiet=False):
@@ -571,24 +1450,29 @@ def run_uvsim(params, return_uv=False, quiet=False):
     input_uv = UVData()
     beam_list = None
     beam_dict = None
+    sim_kwargs = None
     skydata = SkyModelData()
 
     if rank == 0:
-        input_uv, beam_list, beam_dict = simsetup.initialize_uvdata_from_params(params)
-        skydata, source_list_name = simsetup.initialize_catalog_from_params(
-            params, input_uv, return_recarray=False
-        )
-        skydata = simsetup.SkyModelData(skydata)
-
-    input_uv = comm.bcast(input_uv, root=0)
-    beam_list = comm.bcast(beam_list, root=0)
-    beam_dict = comm.bcast(beam_dict, root=0)
-    skydata.share(root=0)
-
-    uv_out = run_uvdata_uvsim(
-        input_uv, beam_list, beam_dict=beam_dict, catalog=skydata, quiet=quiet
-    )
-
+        with timing.phase('config_parse'):
+            input_uv, beam_list, beam_dict = simsetup.initialize_uvdata_from_params(params)
+            sim_kwargs = simsetup.parse_simulation_params(params)
+        with timing.phase('catalog_read'):
+            skydata, source_list_name = simsetup.initialize_catalog_from_params(
+                params, input_uv, return_recarray=False
+            )
+            skydata = simsetup.SkyModelData(skydata)
+
+    with timing.trace('comm.bcast', cat='mpi'):
+        input_uv = comm.bcast(input_uv, root=0)
+        beam_list = comm.bcast(beam_list, root=0)
+        beam_dict = comm.bcast(beam_dict, root=0)
+        sim_kwargs = comm.bcast(sim_kwargs, root=0)
+    with timing.phase('sky_share'):
+        skydata.share(root=0)
+
+    block_writer = None
+    parallel_outfile = None
     if rank == 0:
         if isinstance(params, str):
             with open(params, 'r') as pfile:
@@ -613,13 +1497,43 @@ def run_uvsim(params, return_uv=False, quiet=False):
         history += ' Npus = ' + str(mpi.Npus) + '.'
 
         # add pyuvdata version info
-        history += uv_out.pyuvdata_version_str
+        history += input_uv.pyuvdata_version_str
+
+        # Pipelined runs write UVH5 files as the times are finished, and parallel
+        # writes have every process write its own visibilities.
+        filing = param_dict.get('filing', param_dict)
+        parallel_write = bool(filing.get('parallel_write', False)) and not return_uv
+        if parallel_write and filing.get('output_format', None) != 'uvh5':
+            raise ValueError("Parallel writing is only supported for the uvh5 output format.")
+        pipeline_write = (sim_kwargs.get('pipeline', False) and not return_uv
+                          and filing.get('output_format', None) == 'uvh5')
+        if parallel_write or pipeline_write:
+            with timing.phase('write'):
+                outfile_name = simutils.write_uvdata(input_uv, param_dict,
+                                                     return_filename=True, dryrun=True)
+        if parallel_write:
+            # The root process writes the header from its copy of the input.
+            input_uv.history = history
+            parallel_outfile = outfile_name
+        elif pipeline_write:
+            block_writer = _UVH5BlockWriter(outfile_name, history)
+    parallel_outfile = comm.bcast(parallel_outfile, root=0)
 
+    uv_out = run_uvdata_uvsim(
+        input_uv, beam_list, beam_dict=beam_dict, catalog=skydata, quiet=quiet,
+        block_writer=block_writer, parallel_outfile=parallel_outfile,
+        lean_output=not return_uv, **sim_kwargs
+    )
+
+    if rank == 0:
         uv_out.history = history
 
-        simutils.write_uvdata(uv_out, param_dict, dryrun=return_uv)
+        if block_writer is None and parallel_outfile is None:
+            with timing.phase('write'):
+                simutils.write_uvdata(uv_out, param_dict, dryrun=return_uv)
 
     if return_uv:
         return uv_out
 
-    comm.Barrier()
+    with timing.trace('comm.Barrier', cat='mpi'):
+        comm.Barrier()
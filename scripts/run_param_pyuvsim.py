@@ -5,6 +5,7 @@
 
 import argparse
 import os
+import sys
 import time as pytime
 from datetime import timedelta, datetime
 
@@ -18,15 +19,79 @@ parser.add_argument('--profile', type=str, help='Time profiling output file name
 parser.add_argument('--quiet', action='store_true', help='Suppress stdout printing.')
 parser.add_argument('--raw_profile', help='Also save pickled LineStats data for line profiling.',
                     action='store_true')
+parser.add_argument('--timing', type=str,
+                    help='Filename prefix for per-phase timing output (one json file per rank, '
+                         'merged by the root process into <prefix>_summary.out).')
+parser.add_argument('--trace', type=str,
+                    help='Filename prefix for a timeline trace, written to <prefix>.trace.json '
+                         'in the Chrome trace-event format (view in ui.perfetto.dev).')
+parser.add_argument('--sample_profile', type=str,
+                    help='Filename prefix for sampling profiler output, run on all ranks and '
+                         'merged into <prefix>.collapsed (flamegraph format) and '
+                         '<prefix>_frames.out.')
+parser.add_argument('--sample_frequency', type=float, default=100.,
+                    help='Sampling frequency in Hz for the sampling profiler. (Default 100)')
+parser.add_argument('--memory_profile', type=str,
+                    help='Filename prefix for per-rank memory timelines, summarized by the root '
+                         'process into <prefix>_memory.out.')
+parser.add_argument('--memory_interval', type=float, default=1.,
+                    help='Seconds between memory samples. (Default 1)')
+parser.add_argument('--trace_allocations', action='store_true',
+                    help='Use tracemalloc to find the largest allocations in each phase '
+                         '(slow). Only used with --memory_profile.')
+parser.add_argument('--live_metrics', type=str,
+                    help='File to write progress metrics to during the run. Uses the Prometheus '
+                         'text format if the name ends with .prom, JSON lines otherwise.')
+parser.add_argument('--live_metrics_interval', type=float, default=60.,
+                    help='Seconds between live metrics updates. (Default 60)')
+parser.add_argument('--plan', action='store_true',
+                    help='Do not run the simulation. Instead, predict the memory per rank and '
+                         'node, the number of sky chunks, and the runtime, and print them.')
+parser.add_argument('--plan_Npus', type=int, default=1,
+                    help='Number of MPI processes to plan for. (Default 1)')
+parser.add_argument('--plan_Npus_node', type=int,
+                    help='Number of MPI processes per node to plan for. (Default plan_Npus)')
+parser.add_argument('--plan_mem_per_node', type=float,
+                    help='Memory per node in GiB to plan for. (Default: available memory here)')
+parser.add_argument('--plan_costs', type=str,
+                    help='json file of fitted per-operation costs for the runtime estimate, '
+                         'as written by benchmarking/run_scaling.py --report.')
 
 args = parser.parse_args()
 
 if args.paramsfile is None:
     raise ValueError("Parameter file required")
 
+if args.plan:
+    costs = None
+    if args.plan_costs is not None:
+        costs = pyuvsim.planning.load_costs(args.plan_costs)
+    mem_per_node = None
+    if args.plan_mem_per_node is not None:
+        mem_per_node = args.plan_mem_per_node * 2**30
+    plan = pyuvsim.planning.plan_simulation(
+        args.paramsfile, Npus=args.plan_Npus, Npus_node=args.plan_Npus_node,
+        mem_per_node=mem_per_node, costs=costs
+    )
+    print(pyuvsim.planning.format_plan(plan), end='')
+    sys.exit(0 if plan['fits'] else 1)
+
 if args.profile is not None:
     pyuvsim.profiling.set_profiler(outfile_prefix=args.profile, dump_raw=args.raw_profile)
 
+if args.trace is not None:
+    pyuvsim.profiling.set_tracer()
+
+if args.sample_profile is not None:
+    pyuvsim.profiling.set_sampler(frequency=args.sample_frequency)
+
+if args.live_metrics is not None:
+    pyuvsim.profiling.set_live_metrics(args.live_metrics, interval=args.live_metrics_interval)
+
+if args.memory_profile is not None:
+    pyuvsim.profiling.set_memory_monitor(interval=args.memory_interval,
+                                         trace_allocations=args.trace_allocations)
+
 if not os.path.isdir(os.path.dirname(args.paramsfile)):
     args.paramsfile = os.path.join('.', args.paramsfile)
 
@@ -34,6 +99,18 @@ t0 = pytime.time()
 
 pyuvsim.uvsim.run_uvsim(args.paramsfile, quiet=args.quiet)
 
+if args.timing is not None:
+    pyuvsim.profiling.write_phase_timings(args.timing)
+
+if args.sample_profile is not None:
+    pyuvsim.profiling.write_samples(args.sample_profile)
+
+if args.memory_profile is not None:
+    pyuvsim.profiling.write_memory_timeline(args.memory_profile)
+
+if args.trace is not None:
+    pyuvsim.profiling.write_trace(args.trace)
+
 if args.profile:
     dt = pytime.time() - t0
     maxrss = pyuvsim.mpi.get_max_node_rss()
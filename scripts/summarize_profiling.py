@@ -2,14 +2,33 @@
 # Copyright (c) 2018 Radio Astronomy Software Group
 # Licensed under the 3-clause BSD License
 
-"""Summarize profiling results in a table, given a set of directories"""
+"""
+Summarize profiling results in a table.
+
+Given a csv file of benchmarking jobs (Nsrcs, Ntimes, Nfreqs, Nbls, beam, slurm_id),
+tabulate their runtimes and memory usage from SLURM.
+
+Given per-rank sampling profiler outputs (<prefix>_rank<N>.collapsed files), print
+the time spent in each function across ranks and write the merged samples.
+"""
 
 import subprocess
 import sys
 
 import numpy as np
-from matplotlib.mlab import rec2csv
-from numpy.lib.recfunctions import append_fields
+
+from pyuvsim import profiling
+
+if sys.argv[1].endswith('.collapsed'):
+    merged = profiling.merge_samples(sys.argv[1:])
+    with open('profiling_samples_merged.collapsed', 'w') as cfile:
+        for stack, counts in merged.items():
+            cfile.write("{} {:d}\n".format(stack, int(np.sum(counts))))
+    print(profiling.format_sample_table(merged))
+    sys.exit(0)
+
+from matplotlib.mlab import rec2csv  # noqa
+from numpy.lib.recfunctions import append_fields  # noqa
 
 slurmids = []
 Nall = []  # Each entry is a list of Nbl, Ntimes, Nchan, Nsrcs
@@ -4,8 +4,6 @@
 
 import argparse
 
-from pyuvdata import UVData
-
 import pyuvsim.simsetup
 
 # Take a uvfits file, and save sim parameters as a yaml file.
@@ -19,8 +17,8 @@ parser.add_argument('-l', '--layout_csv_path', default='')
 
 args = parser.parse_args()
 
-uvd = UVData()
-uvd.read(args.file_in[0])
+# Only the metadata are needed.
+uvd = pyuvsim.simsetup.read_uvdata_template(args.file_in[0])
 
 pyuvsim.simsetup.uvdata_to_config_file(uvd, param_filename=args.param_filename,
                                        telescope_config_name=args.telescope_config_path,
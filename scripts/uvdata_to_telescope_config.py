@@ -24,7 +24,8 @@ parser.add_argument('-b', '--beam_filepath', type=str,
 args = parser.parse_args()
 
 uvd = UVData()
-uvd.read(args.file_in[0])
+# Only the metadata are needed.
+uvd.read(args.file_in[0], read_data=False)
 
 pyuvsim.simsetup.uvdata_to_telescope_config(
     uvd, args.beam_filepath, layout_csv_name=args.layout_csv_name,